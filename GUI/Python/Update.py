@@ -29,6 +29,19 @@ def Update_GUI_files(repo_url, root, ID_file, repo_SHA, delete_dir_function):
         str(os.path.join(root, 'Python', 'main.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'main.py')), #Main function .py file
         str(os.path.join(root, 'Python', 'Update.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'Update.py')), #Main function .py file
         str(os.path.join(root, 'Python', 'workflows.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'workflows.py')), #Main function .py file
+        str(os.path.join(root, 'Python', 'spectral_cache.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'spectral_cache.py')), #On-disk cache of decoded spectra
+        str(os.path.join(root, 'Python', 'results_manifest.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'results_manifest.py')), #Per-file integrations for resumable runs
+        str(os.path.join(root, 'Python', 'pipeline.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'pipeline.py')), #Analysis pipeline shared by the GUI and command line
+        str(os.path.join(root, 'Python', '__main__.py')): str(os.path.join(temp_dir, 'GUI', 'Python', '__main__.py')), #Command line entry point (python -m Python)
+        str(os.path.join(root, 'Python', 'benchmark.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'benchmark.py')), #Benchmarks on synthetic mzml files
+        str(os.path.join(root, 'Python', 'instrumentation.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'instrumentation.py')), #Stage timing, run reports and profiling
+        str(os.path.join(root, 'Python', 'batch.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'batch.py')), #Batch mode over a tree of datasets
+        str(os.path.join(root, 'Python', 'raw_data_store.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'raw_data_store.py')), #Memory-mapped raw data store and its reader
+        str(os.path.join(root, 'Python', 'watch.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'watch.py')), #Watch mode during acquisition
+        str(os.path.join(root, 'Python', 'window_tuning.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'window_tuning.py')), #Interactive window tuning
+        str(os.path.join(root, 'Python', 'peak_proposal.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'peak_proposal.py')), #Window proposal from the summed spectrum
+        str(os.path.join(root, 'Python', 'bootstrap.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'bootstrap.py')), #Bootstrap confidence intervals
+        str(os.path.join(root, 'Python', 'scan_integrals.py')): str(os.path.join(temp_dir, 'GUI', 'Python', 'scan_integrals.py')), #Per-scan integral export
     }
     
     #update process for Windows users
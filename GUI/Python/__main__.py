@@ -0,0 +1,101 @@
+import os, sys, argparse, logging
+from Python.pipeline import DEFAULT_SETTINGS, load_config, validate_settings, run_analysis, parse_base_peak_range
+from Python.batch import run_batch
+from Python.watch import watch_directory
+from Python.peak_proposal import propose_windows_for_directory, windows_text
+from Python.workflows import RAW_DATA_FORMATS, MSCONVERT_PROFILES
+
+#Command line entry point - runs the same analysis as the GUI, without Qt. From the GUI directory:
+#   python -m Python D:\SampleData --base-peak 239.0,242.0 --fragments "(54.5,57.0),(114.5,116.0)" --power-data D:\SampleData\powerscan.csv
+#   python -m Python --config analysis.json
+#   python -m Python D:\CV_scan --batch ...   (every dataset directory under D:\CV_scan, see batch.py)
+#   python -m Python D:\SampleData --watch ...   (integrate the mzml files as they are written during an acquisition, see watch.py)
+#   python -m Python D:\SampleData --propose-windows   (print base peak and fragment windows found in the summed spectrum, see peak_proposal.py)
+#Settings given on the command line override the ones in the config file.
+
+logger = logging.getLogger('uvpd_analysis')
+
+def parse_arguments(argv=None):
+    '''Parses the command line, and returns the analysis settings as a dictionary (see DEFAULT_SETTINGS) along with the logging level and the parsed arguments (for the batch and watch options).'''
+    parser = argparse.ArgumentParser(prog='python -m Python', description='Calculates UVPD photofragmentation efficiencies from .wiff/.mzML files without the GUI.')
+    parser.add_argument('directory', nargs='?', help='directory containing the .wiff files (the .mzML files are read from its mzml_directory)')
+    parser.add_argument('--config', help='.json file with the analysis settings (keys: ' + ', '.join(DEFAULT_SETTINGS) + ')')
+    parser.add_argument('--base-peak', dest='base_peak_range', help='m/z range of the parent ion peak, e.g. 239.0,242.0')
+    parser.add_argument('--fragments', dest='fragment_ion_ranges', help='m/z ranges of the fragment ion peaks, e.g. "(54.5,57.0),(114.5,116.0)"')
+    parser.add_argument('--power-data', dest='power_data_file_name', help='laser power .csv file used to normalize the photofragmentation efficiency (not normalized if left out)')
+    parser.add_argument('--extract-mzml', dest='extract_mzml_from_wiff', action='store_true', default=None, help='convert the .wiff files to .mzML with msconvert first')
+    parser.add_argument('--conversion-profile', choices=list(MSCONVERT_PROFILES), help='with --extract-mzml: how msconvert writes the arrays - default (uncompressed 64-bit), compact (32-bit intensities, zlib), or numpress (smallest files)')
+    parser.add_argument('--raw-data', dest='print_raw_data', action='store_true', default=None, help='also export the averaged mass spectrum of every wavelength')
+    parser.add_argument('--raw-data-format', choices=list(RAW_DATA_FORMATS), help='file format of the exported mass spectra (default: csv)')
+    parser.add_argument('--raw-data-stdev', dest='raw_data_stdev', action='store_true', default=None, help='also export the standard deviation across the scans of every m/z point')
+    parser.add_argument('--integration-method', choices=['grid', 'raw'], help='integrate on the 0.01 Da interpolation grid (default) or on the raw profile points')
+    parser.add_argument('--workers', type=int, help='number of worker processes (default: 1)')
+    parser.add_argument('--bootstrap', dest='bootstrap_resamples', type=int, metavar='RESAMPLES', help='also write 95%% bootstrap confidence intervals of the photofragmentation efficiency from this many resamples of the scans (e.g. 1000)')
+    parser.add_argument('--scan-integrals', dest='export_scan_integrals', action='store_true', default=None, help='also save the integral of every window in every scan, with the scan start times, to a .npz next to the results')
+    parser.add_argument('--profile', dest='profile_file', metavar='MZML_FILE', help='after the run, integrate this mzml file again under cProfile and tracemalloc and write the profiles next to the results')
+    parser.add_argument('--batch', action='store_true', help='analyze every dataset (directory with an mzml_directory, or .wiff files with --extract-mzml) under the directory, and combine their results into one table')
+    parser.add_argument('--watch', action='store_true', help="integrate each mzml file as soon as it is written to the directory's mzml_directory, and keep a live photofragmentation efficiency table")
+    parser.add_argument('--expected-files', type=int, help='with --watch: stop (and write the final results) once this many files are integrated (default: the number of rows in the power data file)')
+    parser.add_argument('--idle-timeout', type=float, help='with --watch: stop after this many seconds without a new file (default: wait until --expected-files, or Ctrl+C)')
+    parser.add_argument('--propose-windows', action='store_true', help='propose the base peak and fragment windows from the spectrum summed over every wavelength, print them as --base-peak and --fragments, and stop')
+    parser.add_argument('--quiet', action='store_true', help='only log warnings and errors')
+    arguments = parser.parse_args(argv)
+
+    settings = load_config(arguments.config) if arguments.config else {}
+    settings.update({key: value for key, value in vars(arguments).items() if key in DEFAULT_SETTINGS and value is not None})
+
+    return settings, logging.WARNING if arguments.quiet else logging.INFO, arguments
+
+def log_output(text):
+    '''update_output for the command line: sends the text that the GUI would show to the log, one record per message.'''
+    text = text.strip('\n')
+    if text.strip():
+        logger.info(text)
+
+def log_progress(stage, done, total):
+    '''progress_callback for the command line'''
+    logger.debug(f'{stage}: {done}/{total} files')
+
+def cli(argv=None):
+    '''Runs the analysis from the command line, and returns the exit code (0 if the photofragmentation efficiency file - or the combined table of a batch, or the live table of a watch with no failed files - was written).'''
+    try:
+        settings, log_level, arguments = parse_arguments(argv)
+        logging.basicConfig(level=log_level, format='%(asctime)s %(message)s', datefmt='%H:%M:%S')
+
+        #the windows are what is being looked for, so they are not needed (or checked) here
+        if arguments.propose_windows:
+            if not settings.get('directory') or not os.path.isdir(os.path.join(settings['directory'], 'mzml_directory')):
+                raise ValueError('--propose-windows needs a directory with an mzml_directory.\n')
+            parent_mz = None if settings.get('base_peak_range') is None else sum(parse_base_peak_range(settings['base_peak_range'])) / 2
+            base_peak_text, fragment_text = windows_text(*propose_windows_for_directory(os.path.join(settings['directory'], 'mzml_directory'), parent_mz=parent_mz, update_output=log_output))
+            print(f'--base-peak {base_peak_text} --fragments "{fragment_text}"')
+            return 0
+
+        settings = validate_settings(settings)
+
+    except (OSError, ValueError) as e:
+        logging.basicConfig(format='%(message)s')
+        logger.error(str(e).strip('\n'))
+        return 2
+
+    if arguments.watch:
+        results = watch_directory(**settings, expected_files=arguments.expected_files, idle_timeout=arguments.idle_timeout, update_output=log_output, progress_callback=log_progress)
+        if results['live_table'] is None or len(results['failed']) > 0:
+            return 1
+        return 0
+
+    if arguments.batch:
+        results = run_batch(**settings, update_output=log_output, progress_callback=log_progress)
+        if results['combined'] is None:
+            return 1
+        return 0
+
+    results = run_analysis(**settings, update_output=log_output, progress_callback=log_progress)
+
+    if results['photofragmentation_efficiency'] is None:
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli())
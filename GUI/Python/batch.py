@@ -0,0 +1,149 @@
+import os, re, sys, time, traceback
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from Python.pipeline import run_analysis
+
+#Batch mode: runs the analysis on every dataset (a directory with an mzml_directory, or with .wiff files to convert) found under a root directory, e.g. one directory per DMS compensation voltage.
+#All of the datasets share one pool of worker processes, and the total photofragmentation efficiency of every dataset is combined into one dataset x wavelength table.
+BATCH_TABLE_NAME = 'batch_photofragmentation_efficiency'
+
+_cv_pattern = re.compile(r'CV[_\s=]?(-?\d+(?:\.\d+)?)', re.IGNORECASE)
+
+def find_datasets(root_directory, extract_mzml_from_wiff=False):
+    '''Returns the (sorted) list of dataset directories under root_directory, including root_directory itself. Usage is: root directory, and whether .wiff files will be converted.
+    A dataset is a directory with an mzml_directory containing .mzML files, or (if extract_mzml_from_wiff) a directory with .wiff files.
+    '''
+    datasets = []
+    for path, directories, files in os.walk(root_directory):
+        has_mzml = 'mzml_directory' in directories and any(f.endswith('.mzML') for f in os.listdir(os.path.join(path, 'mzml_directory')))
+        has_wiff = extract_mzml_from_wiff and any(f.endswith('.wiff') for f in files)
+        if has_mzml or has_wiff:
+            datasets.append(path)
+
+        #the mzml files themselves are never datasets
+        if 'mzml_directory' in directories:
+            directories.remove('mzml_directory')
+
+    return sorted(datasets)
+
+def dataset_cv(dataset_directory):
+    '''Returns the compensation voltage in the name of a dataset directory (e.g. -21 for "..._CV_-21"), or nan if there is none. Usage is: path of dataset directory.'''
+    cv = _cv_pattern.findall(os.path.basename(os.path.normpath(dataset_directory)))
+    return float(cv[-1]) if cv else np.nan
+
+def read_efficiency_table(efficiency_file):
+    '''Reads a photofragmentation efficiency .csv written by main(), and returns its column names and the values as a 2D array (one row per wavelength). Usage is: path of .csv file.'''
+    with open(efficiency_file, 'r') as file:
+        column_names = file.readline().strip().split(',')
+
+    return column_names, np.loadtxt(efficiency_file, delimiter=',', skiprows=1, ndmin=2)
+
+def write_combined_table(root_directory, datasets, efficiency_files, update_output=None):
+    '''Combines the photofragmentation efficiencies of every dataset into one table, and writes it next to the datasets. Usage is:
+    root directory, list of dataset directories, and the list of photofragmentation efficiency .csv files written for them (None for datasets that failed).
+    Writes BATCH_TABLE_NAME.csv (one row per dataset with its CV and the total PE at every wavelength) and BATCH_TABLE_NAME.npz with every column of every dataset:
+    'cv', 'directories', 'wavelengths', 'columns' (the column names of the .csv files, e.g. 'Total PE', 'Total PE stdev', 'PE mz 56.0', ...), and 'values' (dataset x wavelength x column, nan where a dataset has no value).
+    Datasets are sorted by CV. Returns the paths of the two files, or None if there was nothing to combine.
+    '''
+    tables = [(dataset, read_efficiency_table(efficiency_file)) for dataset, efficiency_file in zip(datasets, efficiency_files) if efficiency_file is not None]
+    if len(tables) == 0:
+        return None
+
+    #datasets that were analyzed with other windows can't share the fragment columns, so only the columns that every dataset has are combined
+    columns = [name for name in tables[0][1][0][1:] if all(name in column_names for _, (column_names, _) in tables)]
+    wavelengths = np.unique(np.concatenate([values[:, 0] for _, (_, values) in tables]))
+
+    values = np.full((len(tables), len(wavelengths), len(columns)), np.nan)
+    for row, (_, (column_names, table)) in enumerate(tables):
+        wavelength_index = np.searchsorted(wavelengths, table[:, 0])
+        values[row, wavelength_index, :] = table[:, [column_names.index(name) for name in columns]]
+
+    #rows in order of CV (datasets without a CV in their name go last, by name)
+    directories = np.array([os.path.relpath(dataset, root_directory) for dataset, _ in tables])
+    cv = np.array([dataset_cv(dataset) for dataset, _ in tables])
+    order = np.lexsort((directories, np.nan_to_num(cv), np.isnan(cv)))
+    directories, cv, values = directories[order], cv[order], values[order]
+
+    #mechanism to prevent overwriting existing output files
+    output_stem = os.path.join(root_directory, BATCH_TABLE_NAME)
+    index = 0
+    while os.path.exists(f'{output_stem}.csv') or os.path.exists(f'{output_stem}.npz'):
+        index += 1
+        output_stem = os.path.join(root_directory, f'{BATCH_TABLE_NAME}_{index}')
+
+    total_pe = values[:, :, columns.index('Total PE')]
+    with open(f'{output_stem}.csv', 'w') as file:
+        file.write('Directory,CV,' + ','.join(f'{wavelength:g}nm' for wavelength in wavelengths) + '\n')
+        for directory, dataset_cv_value, row in zip(directories, cv, total_pe):
+            file.write(f'{directory},{dataset_cv_value:g},' + ','.join(f'{value:.6f}' for value in row) + '\n')
+
+    np.savez(f'{output_stem}.npz', cv=cv, directories=directories, wavelengths=wavelengths, columns=np.array(columns), values=values)
+
+    if update_output is not None:
+        update_output(f'The combined photofragmentation efficiency of {len(tables)} datasets has been written to {output_stem}.csv and {output_stem}.npz\n\n')
+
+    return [f'{output_stem}.csv', f'{output_stem}.npz']
+
+def run_batch(directory, base_peak_range, fragment_ion_ranges, power_data_file_name=None, extract_mzml_from_wiff=False, workers=1, update_output=None, progress_callback=None, cancel_event=None, **settings):
+    '''Runs the analysis (see run_analysis in pipeline.py) on every dataset found under directory (see find_datasets), then combines the results (see write_combined_table). Usage is:
+    root directory, and the same settings as run_analysis. If a dataset directory contains its own file with the same name as the power data file, that one is used for the dataset.
+    All datasets share one pool of workers worker processes. progress_callback is called as progress_callback(stage, files done, total files), with the dataset in the name of the stage.
+    Returns a dictionary with the run_analysis results of every dataset ('datasets': {dataset directory: results}) and the combined files ('combined', None if nothing was combined).
+    '''
+    if update_output is None:
+        update_output = lambda text: sys.__stdout__.write(text)
+
+    start_time = time.time()
+    batch_results = {'datasets': {}, 'combined': None}
+
+    datasets = find_datasets(directory, extract_mzml_from_wiff=extract_mzml_from_wiff)
+    if len(datasets) == 0:
+        update_output(f'No datasets (directories with an mzml_directory{" or .wiff files" if extract_mzml_from_wiff else ""}) were found under {directory}.\n')
+        return batch_results
+
+    update_output(f'Found {len(datasets)} datasets under {directory}:\n' + '\n'.join(os.path.relpath(dataset, directory) for dataset in datasets) + '\n\n')
+
+    def dataset_progress(label):
+        if progress_callback is None:
+            return None
+        return lambda stage, done, total: progress_callback(f'{label} - {stage}', done, total)
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for dataset_number, dataset in enumerate(datasets):
+            if cancel_event is not None and cancel_event.is_set():
+                update_output(f'The batch was cancelled after {dataset_number} of {len(datasets)} datasets.\n')
+                break
+
+            label = os.path.relpath(dataset, directory)
+            update_output(f'Dataset {dataset_number + 1} of {len(datasets)}: {label}\n')
+
+            dataset_power_data_file = power_data_file_name
+            if power_data_file_name is not None and os.path.isfile(os.path.join(dataset, os.path.basename(power_data_file_name))):
+                dataset_power_data_file = os.path.join(dataset, os.path.basename(power_data_file_name))
+
+            #a dataset that fails is reported and skipped, so that one bad directory doesn't stop an overnight batch
+            try:
+                batch_results['datasets'][dataset] = run_analysis(dataset, base_peak_range, fragment_ion_ranges, dataset_power_data_file, extract_mzml_from_wiff=extract_mzml_from_wiff, workers=workers,
+                                                                  update_output=update_output, progress_callback=dataset_progress(label), cancel_event=cancel_event, executor=executor, **settings)
+            except Exception as e:
+                update_output(f'A problem was encountered when analyzing {dataset}:\n{e}\nTraceback: {traceback.format_exc()}\n')
+                batch_results['datasets'][dataset] = None
+
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    efficiency_files = [None if results is None else results['photofragmentation_efficiency'] for results in batch_results['datasets'].values()]
+    failed = [os.path.relpath(dataset, directory) for dataset, efficiency_file in zip(batch_results['datasets'], efficiency_files) if efficiency_file is None]
+    if len(failed) > 0:
+        update_output(f'No photofragmentation efficiency was written for {len(failed)} datasets:\n' + '\n'.join(failed) + '\n\n')
+
+    try:
+        batch_results['combined'] = write_combined_table(directory, list(batch_results['datasets']), efficiency_files, update_output=update_output)
+    except Exception as e:
+        update_output(f'A problem was encountered when combining the photofragmentation efficiencies of the datasets:\n{e}\nTraceback: {traceback.format_exc()}\n')
+
+    update_output(f'The batch of {len(datasets)} datasets has completed in {round((time.time() - start_time)/60,1)} minutes.\n\n')
+
+    return batch_results
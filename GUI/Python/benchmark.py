@@ -0,0 +1,397 @@
+import os, sys, time, json, zlib, base64, hashlib, platform, argparse, tempfile, tracemalloc
+import numpy as np
+from Python import workflows, spectral_cache
+from Python.main import main
+
+#Benchmarks for the analysis, run on synthetic indexedmzML files so that no instrument data is needed. From the GUI directory:
+#   python -m Python.benchmark --wavelengths 101 --scans 25 --points 100 --save-baseline baseline.json
+#   python -m Python.benchmark --wavelengths 101 --scans 25 --points 100 --baseline baseline.json
+#The second command exits with code 1 if any benchmark is slower than the baseline by more than the tolerance, so it can be used in CI.
+#With --encoding compact or numpress, the synthetic files are written with the arrays of that conversion profile (see MSCONVERT_PROFILES in workflows.py), and the photofragmentation efficiencies
+#are checked against the same files written uncompressed (exit code 1 if they differ by more than --encoding-tolerance).
+
+BENCHMARK_VERSION = 1
+ENCODING_TOLERANCE = 1e-3 #largest difference of the photofragmentation efficiencies from a compressed encoding to the uncompressed files, relative to the largest value of each column
+
+#cvParams of the arrays for each encoding of the synthetic files, like msconvert writes them with each conversion profile
+_array_params = {
+    '64-bit float': '<cvParam cvRef="MS" accession="MS:1000523" name="64-bit float" value=""/>',
+    '32-bit float': '<cvParam cvRef="MS" accession="MS:1000521" name="32-bit float" value=""/>',
+    'no compression': '<cvParam cvRef="MS" accession="MS:1000576" name="no compression" value=""/>',
+    'zlib': '<cvParam cvRef="MS" accession="MS:1000574" name="zlib compression" value=""/>',
+    'linear': '<cvParam cvRef="MS" accession="MS:1002746" name="MS-Numpress linear prediction compression followed by zlib compression" value=""/>',
+    'slof': '<cvParam cvRef="MS" accession="MS:1002748" name="MS-Numpress short logged float compression followed by zlib compression" value=""/>',
+}
+
+_mzml_header = '''<?xml version="1.0" encoding="utf-8"?>
+<indexedmzML xmlns="http://psi.hupo.org/ms/mzml" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://psi.hupo.org/ms/mzml http://psidev.info/files/ms/mzML/xsd/mzML1.1.2_idx.xsd">
+  <mzML xmlns="http://psi.hupo.org/ms/mzml" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://psi.hupo.org/ms/mzml http://psidev.info/files/ms/mzML/xsd/mzML1.1.0.xsd" id="{run_id}" version="1.1.0">
+    <cvList count="2">
+      <cv id="MS" fullName="Proteomics Standards Initiative Mass Spectrometry Ontology" version="4.0.14" URI="http://psidev.cvs.sourceforge.net/*checkout*/psidev/psi/psi-ms/mzML/controlledVocabulary/psi-ms.obo"/>
+      <cv id="UO" fullName="Unit Ontology" version="12:10:2011" URI="http://obo.cvs.sourceforge.net/*checkout*/obo/obo/ontology/phenotype/unit.obo"/>
+    </cvList>
+    <fileDescription>
+      <fileContent>
+        <cvParam cvRef="MS" accession="MS:1000579" name="MS1 spectrum" value=""/>
+      </fileContent>
+    </fileDescription>
+    <softwareList count="1">
+      <software id="uvpd_benchmark" version="{version}">
+        <cvParam cvRef="MS" accession="MS:1000799" name="custom unreleased software tool" value="uvpd benchmark"/>
+      </software>
+    </softwareList>
+    <instrumentConfigurationList count="1">
+      <instrumentConfiguration id="IC1">
+        <cvParam cvRef="MS" accession="MS:1000031" name="instrument model" value=""/>
+      </instrumentConfiguration>
+    </instrumentConfigurationList>
+    <dataProcessingList count="1">
+      <dataProcessing id="synthetic">
+        <processingMethod order="0" softwareRef="uvpd_benchmark">
+          <cvParam cvRef="MS" accession="MS:1000544" name="Conversion to mzML" value=""/>
+        </processingMethod>
+      </dataProcessing>
+    </dataProcessingList>
+    <run id="{run_id}" defaultInstrumentConfigurationRef="IC1">
+      <spectrumList count="{scans}" defaultDataProcessingRef="synthetic">
+'''
+
+_mzml_spectrum = '''        <spectrum index="{index}" id="{spectrum_id}" defaultArrayLength="{points}">
+          <cvParam cvRef="MS" accession="MS:1000511" name="ms level" value="1"/>
+          <cvParam cvRef="MS" accession="MS:1000579" name="MS1 spectrum" value=""/>
+          <cvParam cvRef="MS" accession="MS:1000128" name="profile spectrum" value=""/>
+          <scanList count="1">
+            <cvParam cvRef="MS" accession="MS:1000795" name="no combination" value=""/>
+            <scan>
+              <cvParam cvRef="MS" accession="MS:1000016" name="scan start time" value="{scan_time}" unitCvRef="UO" unitAccession="UO:0000031" unitName="minute"/>
+            </scan>
+          </scanList>
+          <binaryDataArrayList count="2">
+            <binaryDataArray encodedLength="{mz_length}">
+              {mz_params}
+              <cvParam cvRef="MS" accession="MS:1000514" name="m/z array" value="" unitCvRef="MS" unitAccession="MS:1000040" unitName="m/z"/>
+              <binary>{mz}</binary>
+            </binaryDataArray>
+            <binaryDataArray encodedLength="{intensity_length}">
+              {intensity_params}
+              <cvParam cvRef="MS" accession="MS:1000515" name="intensity array" value="" unitCvRef="MS" unitAccession="MS:1000131" unitName="number of detector counts"/>
+              <binary>{intensity}</binary>
+            </binaryDataArray>
+          </binaryDataArrayList>
+        </spectrum>
+'''
+
+def synthetic_spectrum(rng, points_per_scan, parent_mz, fragment_mzs, fragmented_fraction):
+    '''Returns the m/z and intensity arrays of one synthetic profile scan: a parent peak and fragment peaks (0.15 Da wide) on a low baseline.
+    Like the instrument data, most of the points are close to a peak, and the rest are spread between 50 and parent+10.'''
+    peak_mzs = np.array([parent_mz] + list(fragment_mzs), dtype=float)
+    peak_heights = np.concatenate([[1e6 * (1 - fragmented_fraction)], np.full(len(fragment_mzs), 1e6 * fragmented_fraction / max(len(fragment_mzs), 1))])
+    peak_heights *= rng.uniform(0.8, 1.2, len(peak_heights))
+
+    peak_points = rng.integers(0, len(peak_mzs), points_per_scan - points_per_scan // 4)
+    mz = np.concatenate([peak_mzs[peak_points] + rng.uniform(-0.5, 0.5, len(peak_points)), rng.uniform(50., parent_mz + 10., points_per_scan // 4)])
+    mz = np.sort(np.clip(mz, 50., parent_mz + 10.))
+
+    intensity = np.sum(peak_heights[:, None] * np.exp(-0.5 * np.square((mz[None, :] - peak_mzs[:, None]) / 0.15)), axis=0)
+    intensity += rng.uniform(0., 1e3, len(mz))
+
+    return mz, intensity
+
+def encode_numpress_linear(values):
+    '''Encodes an array with MS-Numpress linear prediction (the inverse of decode_numpress_linear in workflows.py), with the fixed point that the reference implementation picks. Usage is: the float array.'''
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        fixed_point = np.floor(0xFFFFFFFF / values[0]) if len(values) == 1 and values[0] > 0 else 1.
+    else:
+        largest_difference = np.max(np.ceil(np.abs(values[2:] - 2 * values[1:-1] + values[:-2]) + 1), initial=0.)
+        fixed_point = np.floor(0x7FFFFFFF / max(abs(values[0]), abs(values[1]), largest_difference))
+
+    ints = (values * fixed_point + 0.5).astype(np.int64)
+    differences = (ints[2:] - 2 * ints[1:-1] + ints[:-2]).astype(np.uint32)
+
+    #each difference is written as a head and its significant half-bytes, least significant first: leading 0 half-bytes are left out of positive numbers and leading 0xf ones out of negative numbers
+    digits = (differences[:, None] >> (4 * np.arange(8, dtype=np.uint32))[None, :]) & 0xf
+    positive = digits[:, 7] == 0
+    negative = digits[:, 7] == 0xf
+    significant = np.where(positive[:, None], digits != 0, digits != 0xf)
+    lengths = np.where(significant.any(axis=1), 8 - np.argmax(significant[:, ::-1], axis=1), 0)
+    lengths = np.where(positive, lengths, np.where(negative, np.maximum(lengths, 1), 8))
+    heads = np.where(positive, 8 - lengths, np.where(negative, 16 - lengths, 0))
+
+    half_bytes = np.column_stack([heads, digits])[np.column_stack([np.ones(len(heads), dtype=bool), np.arange(8)[None, :] < lengths[:, None]])].astype(np.uint8)
+    if len(half_bytes) % 2:
+        half_bytes = np.append(half_bytes, np.uint8(0))
+
+    return np.array([fixed_point], dtype='>f8').tobytes() + ints[:2].astype('<u4').tobytes() + ((half_bytes[0::2] << 4) | half_bytes[1::2]).astype(np.uint8).tobytes()
+
+def encode_numpress_slof(values):
+    '''Encodes an array with MS-Numpress short logged float (the inverse of decode_numpress_slof in workflows.py), with the fixed point that the reference implementation picks. Usage is: the float array (>= 0).'''
+    values = np.asarray(values, dtype=float)
+    largest = np.log1p(np.max(values, initial=0.))
+    fixed_point = np.floor(0xFFFF / largest) if largest > 0 else 1.
+    return np.array([fixed_point], dtype='>f8').tobytes() + (np.log1p(values) * fixed_point + 0.5).astype('<u2').tobytes()
+
+def encode_array(values, array_name, encoding='default'):
+    '''Encodes the m/z or intensity array of a spectrum as msconvert does with a conversion profile (see MSCONVERT_PROFILES in workflows.py). Usage is:
+    the float array, 'mz' or 'intensity', and the encoding ('default', 'compact', or 'numpress'). Returns the base64 text and the cvParams that describe it.
+    '''
+    if encoding == 'default':
+        encoded, params = np.asarray(values, dtype='<f8').tobytes(), ['64-bit float', 'no compression']
+    elif encoding == 'compact':
+        dtype = '<f8' if array_name == 'mz' else '<f4'
+        encoded, params = zlib.compress(np.asarray(values, dtype=dtype).tobytes()), ['64-bit float' if array_name == 'mz' else '32-bit float', 'zlib']
+    elif encoding == 'numpress':
+        if array_name == 'mz':
+            encoded, params = zlib.compress(encode_numpress_linear(values)), ['64-bit float', 'linear']
+        else:
+            encoded, params = zlib.compress(encode_numpress_slof(values)), ['64-bit float', 'slof']
+    else:
+        raise ValueError(f'Unknown encoding: {encoding}. Please use one of: {", ".join(workflows.MSCONVERT_PROFILES)}.\n')
+
+    return base64.b64encode(encoded).decode('ascii'), '\n              '.join(_array_params[param] for param in params)
+
+def write_synthetic_mzml(mzml_path, scans=25, points_per_scan=100, parent_mz=240.5, fragment_mzs=(), fragmented_fraction=0.1, seed=0, encoding='default'):
+    '''Writes a synthetic indexedmzML file laid out like msconvert output (spectrum offset index and SHA-1 checksum, with the arrays encoded as the conversion profile does). Usage is:
+    path of the .mzML file, number of scans, number of profile points per scan, parent m/z, list of fragment m/z, fraction of the ion signal in the fragments, the random seed,
+    and the encoding of the arrays ('default' for uncompressed 64-bit arrays, see encode_array).
+    '''
+    rng = np.random.default_rng(seed)
+    run_id = os.path.splitext(os.path.basename(mzml_path))[0]
+
+    content = bytearray(_mzml_header.format(run_id=run_id, version=BENCHMARK_VERSION, scans=scans).encode('utf-8'))
+    offsets = []
+
+    for index in range(scans):
+        mz, intensity = synthetic_spectrum(rng, points_per_scan, parent_mz, fragment_mzs, fragmented_fraction)
+        mz_binary, mz_params = encode_array(mz, 'mz', encoding)
+        intensity_binary, intensity_params = encode_array(intensity, 'intensity', encoding)
+
+        spectrum_id = f'sample=1 period=1 cycle={index + 1} experiment=1'
+        spectrum = _mzml_spectrum.format(index=index, spectrum_id=spectrum_id, points=len(mz), scan_time=f'{0.0118 * (index + 1):.12f}',
+                                         mz_length=len(mz_binary), mz_params=mz_params, mz=mz_binary,
+                                         intensity_length=len(intensity_binary), intensity_params=intensity_params, intensity=intensity_binary).encode('utf-8')
+
+        #the index points at the opening spectrum tag itself, not the indentation before it
+        offsets.append((spectrum_id, len(content) + spectrum.index(b'<spectrum')))
+        content += spectrum
+
+    content += b'      </spectrumList>\n    </run>\n  </mzML>\n  '
+    index_list_offset = len(content)
+    content += b'<indexList count="1">\n    <index name="spectrum">\n'
+    for spectrum_id, offset in offsets:
+        content += f'      <offset idRef="{spectrum_id}">{offset}</offset>\n'.encode('utf-8')
+    content += f'    </index>\n  </indexList>\n  <indexListOffset>{index_list_offset}</indexListOffset>\n  <fileChecksum>'.encode('utf-8')
+
+    #like msconvert, the checksum covers everything up to and including the opening fileChecksum tag
+    content += f'{hashlib.sha1(content).hexdigest()}</fileChecksum>\n</indexedmzML>\n'.encode('utf-8')
+
+    with open(mzml_path, 'wb') as file:
+        file.write(content)
+
+def write_synthetic_dataset(directory, wavelengths=101, scans=25, points_per_scan=100, parent_mz=240.5, fragment_windows=14, seed=0, encoding='default'):
+    '''Writes a synthetic dataset (mzml_directory with one .mzML per wavelength from 400 nm in 2 nm steps, plus a laser power .csv) into directory. Usage is:
+    output directory, number of wavelengths, scans per file, profile points per scan, parent m/z, number of fragment windows, the random seed, and the encoding of the arrays (see encode_array).
+    Returns the mzml directory, base peak range, fragment ion ranges, and the path of the laser power .csv - i.e. the inputs of main().
+    '''
+    mzml_directory = os.path.join(directory, 'mzml_directory')
+    os.makedirs(mzml_directory, exist_ok=True)
+
+    #fragment peaks spread evenly between m/z 55 and 20 below the parent
+    fragment_mzs = np.round(np.linspace(55., parent_mz - 20., fragment_windows), 1) if fragment_windows > 0 else np.array([])
+    base_peak_range = [parent_mz - 1.5, parent_mz + 1.5]
+    fragment_ion_ranges = [[fragment_mz - 0.75, fragment_mz + 0.75] for fragment_mz in fragment_mzs.tolist()]
+
+    rng = np.random.default_rng(seed)
+    power_data = []
+    for i in range(wavelengths):
+        wavelength = 400 + 2 * i
+        write_synthetic_mzml(os.path.join(mzml_directory, f'synthetic_{scans}scans_Laser_On-{wavelength}.mzML'), scans, points_per_scan, parent_mz, fragment_mzs,
+                             fragmented_fraction=0.05 + 0.1 * rng.random(), seed=seed + i + 1, encoding=encoding)
+        power_data.append([wavelength, rng.uniform(5., 10.), rng.uniform(0.1, 0.5)])
+
+    power_data_file = os.path.join(directory, 'power_data.csv')
+    np.savetxt(power_data_file, np.array(power_data), delimiter=',', fmt='%.6f')
+
+    return mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file
+
+def time_benchmark(function, repeats=3, setup=None):
+    '''Times function() repeats times (calling setup() before each run, untimed), then runs it once more under tracemalloc to measure its peak memory.
+    Returns a dictionary with the fastest time in seconds, every time, and the peak memory in MB.'''
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start_time)
+
+    #tracemalloc slows everything down, so peak memory is measured in a separate, untimed run
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': min(times), 'all_seconds': times, 'peak_memory_mb': peak_memory / 1024**2}
+
+def run_benchmarks(wavelengths=101, scans=25, points_per_scan=100, parent_mz=240.5, fragment_windows=14, repeats=3, seed=0, encoding='default', update_output=None):
+    '''Writes a synthetic dataset to a temporary directory and benchmarks integrate_spectra (with and without the spectra caches), extract_RawData, PE_calc (one value at a time and as a matrix), and main() on it. Usage is:
+    dataset size (see write_synthetic_dataset), number of timed repeats per benchmark, random seed, and the encoding of the arrays (see encode_array).
+    With a compressed encoding, the dataset is also written uncompressed and the photofragmentation efficiencies of the two are compared ('encoding_check' in the results).
+    Returns the results as a dictionary that can be saved as a JSON baseline.
+    '''
+    if update_output is None:
+        update_output = lambda text: sys.__stdout__.write(text)
+
+    def quiet(text):
+        pass
+
+    parameters = {'wavelengths': wavelengths, 'scans': scans, 'points_per_scan': points_per_scan, 'parent_mz': parent_mz, 'fragment_windows': fragment_windows, 'repeats': repeats, 'seed': seed}
+    if encoding != 'default': #so that baselines recorded before there were encodings can still be compared
+        parameters['encoding'] = encoding
+    results = {'version': BENCHMARK_VERSION, 'parameters': parameters, 'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count()}, 'benchmarks': {}}
+
+    previous_cache_directory, previous_cache_max_bytes = spectral_cache.SPECTRAL_CACHE_DIRECTORY, spectral_cache.SPECTRAL_CACHE_MAX_BYTES
+
+    with tempfile.TemporaryDirectory(prefix='uvpd_benchmark_') as directory:
+        update_output(f'Writing {wavelengths} synthetic mzml files ({scans} scans x {points_per_scan} points, {encoding} encoding) to {directory}...\n')
+        start_time = time.perf_counter()
+        mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file = write_synthetic_dataset(directory, wavelengths, scans, points_per_scan, parent_mz, fragment_windows, seed, encoding)
+        mzml_files = sorted([f for f in os.listdir(mzml_directory) if f.endswith('.mzML')])
+        results['benchmarks']['write_synthetic_dataset'] = {'seconds': time.perf_counter() - start_time}
+
+        #the benchmarks use a spectral cache of their own, so they neither read from nor fill up the user's
+        spectral_cache.configure_spectral_cache(directory=os.path.join(directory, 'spectral_cache'), max_bytes=previous_cache_max_bytes or 2 * 1024**3)
+
+        def clear_caches():
+            workflows.clear_spectra_cache()
+            spectral_cache.clear_spectral_cache()
+
+        def integrate_all(integration_method='grid'):
+            for mzml_file in mzml_files:
+                for integration_window in [base_peak_range] + fragment_ion_ranges:
+                    workflows.integrate_spectra(mzml_directory, mzml_file, integration_window, parent_mz, update_output=quiet, integration_method=integration_method)
+
+        def extract_raw_data():
+            output_file = os.path.join(directory, 'Raw_data.csv')
+            workflows.extract_RawData(mzml_directory, parent_mz, output_file, update_output=quiet)
+            os.remove(output_file)
+
+        def calculate_efficiencies():
+            for i in range(wavelengths * len(fragment_ion_ranges)):
+                workflows.PE_calc(400. + i % wavelengths, 7.5, 0.3, 1e6, 1e4, 5e4 + i, 1e3, update_output=quiet)
+
+        def calculate_efficiency_matrix():
+            W = 400. + np.arange(wavelengths, dtype=float)[:, None]
+            Frag = 5e4 + np.arange(wavelengths * len(fragment_ion_ranges), dtype=float).reshape(wavelengths, len(fragment_ion_ranges))
+            workflows.PE_calc_matrix(W, np.full((wavelengths, 1), 1e6), np.full((wavelengths, 1), 1e4), Frag, np.full_like(Frag, 1e3), P=np.full((wavelengths, 1), 7.5), dP=np.full((wavelengths, 1), 0.3))
+
+        def run_main():
+            output_file = main(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file, update_output=quiet, use_manifest=False)
+            os.remove(output_file)
+
+        benchmarks = {
+            'integrate_spectra_cold': (integrate_all, clear_caches),
+            'integrate_spectra_warm': (integrate_all, None),
+            'integrate_spectra_raw_warm': (lambda: integrate_all('raw'), None),
+            'extract_RawData': (extract_raw_data, clear_caches),
+            'PE_calc': (calculate_efficiencies, None),
+            'PE_calc_matrix': (calculate_efficiency_matrix, None),
+            'main_cold': (run_main, clear_caches),
+            'main_warm': (run_main, None),
+        }
+
+        try:
+            for name, (function, setup) in benchmarks.items():
+                results['benchmarks'][name] = time_benchmark(function, repeats, setup)
+                update_output(f'{name}: {results["benchmarks"][name]["seconds"]:.3f} s, peak memory {results["benchmarks"][name]["peak_memory_mb"]:.1f} MB\n')
+
+            #the same dataset without compression: the efficiencies should only differ by the precision that the encoding gives up
+            if encoding != 'default':
+                uncompressed_directory = os.path.join(directory, 'uncompressed')
+                uncompressed_mzml_directory = write_synthetic_dataset(uncompressed_directory, wavelengths, scans, points_per_scan, parent_mz, fragment_windows, seed)[0]
+
+                tables = []
+                for dataset_mzml_directory in (mzml_directory, uncompressed_mzml_directory):
+                    clear_caches()
+                    output_file = main(dataset_mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file, update_output=quiet, use_manifest=False)
+                    tables.append(np.atleast_2d(np.loadtxt(output_file, delimiter=',', skiprows=1)))
+
+                scale = np.maximum(np.nanmax(np.abs(tables[1]), axis=0), np.finfo(float).tiny)
+                mzml_bytes = [sum(os.path.getsize(os.path.join(d, f)) for f in mzml_files) for d in (mzml_directory, uncompressed_mzml_directory)]
+                results['encoding_check'] = {'max_relative_difference': float(np.nanmax(np.abs(tables[0] - tables[1]) / scale)), 'mzml_bytes': mzml_bytes[0], 'uncompressed_mzml_bytes': mzml_bytes[1]}
+                update_output(f'{encoding} encoding: the mzml files are {mzml_bytes[0] / mzml_bytes[1]:.2f}x the uncompressed size, and the photofragmentation efficiencies differ from the uncompressed files '
+                              f'by up to {results["encoding_check"]["max_relative_difference"]:.2e} of the largest value of each column\n')
+
+        finally:
+            clear_caches()
+            spectral_cache.configure_spectral_cache(directory=previous_cache_directory, max_bytes=previous_cache_max_bytes)
+
+    return results
+
+def compare_to_baseline(results, baseline, tolerance=1.5):
+    '''Compares benchmark results to a baseline (both dictionaries from run_benchmarks). Usage is: results, baseline, and the allowed slowdown factor.
+    Returns a list of messages, one for each benchmark that is more than tolerance times slower than the baseline (empty if there are no regressions).'''
+    regressions = []
+
+    if baseline.get('parameters') != results.get('parameters'):
+        regressions.append(f'The baseline was recorded with different parameters ({baseline.get("parameters")}), so the timings can not be compared.')
+        return regressions
+
+    for name, result in results['benchmarks'].items():
+        baseline_result = baseline.get('benchmarks', {}).get(name)
+        if baseline_result is None or name == 'write_synthetic_dataset':
+            continue
+
+        if result['seconds'] > tolerance * baseline_result['seconds']:
+            regressions.append(f'{name} took {result["seconds"]:.3f} s, {result["seconds"] / baseline_result["seconds"]:.2f}x the baseline of {baseline_result["seconds"]:.3f} s.')
+
+    return regressions
+
+def cli(argv=None):
+    '''Runs the benchmarks from the command line, and returns the exit code (1 if there is a regression compared to --baseline).'''
+    parser = argparse.ArgumentParser(prog='python -m Python.benchmark', description='Benchmarks the UVPD analysis on synthetic indexedmzML files.')
+    parser.add_argument('--wavelengths', type=int, default=101, help='number of mzml files (default: 101)')
+    parser.add_argument('--scans', type=int, default=25, help='scans per mzml file (default: 25)')
+    parser.add_argument('--points', type=int, default=100, help='profile points per scan (default: 100)')
+    parser.add_argument('--parent-mz', type=float, default=240.5, help='m/z of the parent ion (default: 240.5)')
+    parser.add_argument('--fragments', type=int, default=14, help='number of fragment windows (default: 14)')
+    parser.add_argument('--repeats', type=int, default=3, help='timed repeats of each benchmark; the fastest is kept (default: 3)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the synthetic data (default: 0)')
+    parser.add_argument('--encoding', choices=list(workflows.MSCONVERT_PROFILES), default='default', help='write the arrays as msconvert does with this conversion profile (default: uncompressed 64-bit)')
+    parser.add_argument('--encoding-tolerance', type=float, default=ENCODING_TOLERANCE, help=f'largest allowed difference of the efficiencies from the uncompressed files, relative to the largest value of each column (default: {ENCODING_TOLERANCE:g})')
+    parser.add_argument('--output', help='write the results to this .json file')
+    parser.add_argument('--save-baseline', help='write the results to this .json file to be used as a baseline later')
+    parser.add_argument('--baseline', help='compare the results to this baseline .json file')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='allowed slowdown compared to the baseline (default: 1.5x)')
+    arguments = parser.parse_args(argv)
+
+    results = run_benchmarks(arguments.wavelengths, arguments.scans, arguments.points, arguments.parent_mz, arguments.fragments, arguments.repeats, arguments.seed, arguments.encoding)
+
+    for output_file in (arguments.output, arguments.save_baseline):
+        if output_file:
+            with open(output_file, 'w') as file:
+                json.dump(results, file, indent=2)
+            print(f'Results written to {output_file}')
+
+    if arguments.baseline:
+        with open(arguments.baseline, 'r') as file:
+            baseline = json.load(file)
+
+        regressions = compare_to_baseline(results, baseline, arguments.tolerance)
+        if len(regressions) > 0:
+            print('Performance regressions compared to ' + arguments.baseline + ':\n' + '\n'.join(regressions))
+            return 1
+        print(f'No benchmark is more than {arguments.tolerance}x slower than {arguments.baseline}.')
+
+    if 'encoding_check' in results and not results['encoding_check']['max_relative_difference'] <= arguments.encoding_tolerance:
+        print(f'The photofragmentation efficiencies of the {arguments.encoding} encoding differ from the uncompressed files by more than {arguments.encoding_tolerance:g}.')
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(cli())
@@ -0,0 +1,116 @@
+import sys, time, warnings
+import numpy as np
+from Python.workflows import PE_calc_matrix
+from Python.scan_integrals import collect_scan_integrals
+
+#Bootstrap confidence intervals for the photofragmentation efficiency: the scans of each wavelength are resampled (with replacement), and the efficiencies are recalculated from the resampled averages.
+#Unlike the propagated stdev (see PE_calc_matrix), this makes no assumption about the shape of the scan-to-scan variation, or about the windows varying independently of each other.
+#Only the scans are resampled: the laser power and the bandwidth of the OPO are taken as given.
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_CONFIDENCE = 95. #percent
+BOOTSTRAP_CHUNK_VALUES = 4_000_000 #resampled scan integrations (resamples x scans x windows) held in memory at once - about 32 MB
+
+def bootstrap_efficiencies(scan_integrations, scan_counts, wavelengths, laser_power=None, resamples=BOOTSTRAP_RESAMPLES, confidence=BOOTSTRAP_CONFIDENCE, seed=None):
+    '''Calculates bootstrap confidence intervals of the photofragmentation efficiency at every wavelength, for the total PE and every fragment. Usage is:
+    (scans x windows) integrations of every scan of every wavelength (base peak window first, the scans of each wavelength one after the other), the number of scans of each wavelength,
+    the wavelengths, the laser power at each wavelength (None to skip the normalization), the number of resamples, the confidence level in percent, and the seed of the random numbers (None for a new one each time).
+    All resamples of all wavelengths are drawn and averaged as array operations, a chunk of resamples at a time (see BOOTSTRAP_CHUNK_VALUES).
+    Returns the lower and upper ends of the confidence interval and the stdev over the resamples, each (wavelengths x (fragments + 1)) with the total PE first. Values that can't be calculated are nan.
+    '''
+    rng = np.random.default_rng(seed)
+    scan_integrations = np.asarray(scan_integrations, dtype=float)
+    scan_counts = np.asarray(scan_counts)
+    num_scans, num_windows = scan_integrations.shape
+
+    scan_ends = np.cumsum(scan_counts)
+    scan_starts = scan_ends - scan_counts
+    file_index = np.repeat(np.arange(len(scan_counts)), scan_counts)
+    counts = np.maximum(scan_counts, 1)[None, :, None]
+
+    wavelengths = np.asarray(wavelengths, dtype=float)[None, :, None]
+    if laser_power is not None:
+        laser_power = np.asarray(laser_power, dtype=float)[None, :, None]
+
+    efficiencies = np.empty((resamples, len(scan_counts), num_windows))
+    chunk = max(1, BOOTSTRAP_CHUNK_VALUES // max(num_scans * num_windows, 1))
+    for first in range(0, resamples, chunk):
+        size = min(chunk, resamples - first)
+
+        #every scan of every wavelength is replaced by a random scan of the same wavelength
+        draws = scan_starts[file_index] + rng.integers(0, np.maximum(scan_counts[file_index], 1), size=(size, num_scans))
+        resampled = scan_integrations[draws]
+
+        #average of each wavelength: the scans of a wavelength are consecutive, so their sums are differences of running sums
+        running_sums = np.concatenate([np.zeros((size, 1, num_windows)), np.cumsum(resampled, axis=1)], axis=1)
+        means = (running_sums[:, scan_ends] - running_sums[:, scan_starts]) / counts
+
+        #the total fragment integration goes first, as in efficiency_table
+        fragment_integrations = np.concatenate([np.sum(means[:, :, 1:], axis=2, keepdims=True), means[:, :, 1:]], axis=2)
+        efficiencies[first:first + size] = PE_calc_matrix(wavelengths, means[:, :, 0:1], 0., fragment_integrations, 0., P=laser_power, dP=0.)[0]
+
+    #wavelengths where no resample gives a value are nan, which numpy warns about
+    tail = (100. - confidence) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        lower, upper = np.nanpercentile(efficiencies, [tail, 100. - tail], axis=0)
+        stdev = np.nanstd(efficiencies, axis=0)
+
+    return lower, upper, stdev
+
+def write_bootstrap_table(output_file, wavelengths, frag_mz, lower, upper, stdev, confidence=BOOTSTRAP_CONFIDENCE):
+    '''Writes the bootstrap confidence intervals to a .csv with one row per wavelength, and the same order of columns as the photofragmentation efficiency file. Usage is:
+    path of the .csv file, wavelengths, m/z of each fragment (for the column names), and the lower, upper, and stdev arrays from bootstrap_efficiencies.
+    '''
+    column_names = ['Wavelength']
+    for label in ['Total PE'] + [f'PE mz {mz}' for mz in frag_mz]:
+        column_names.extend([f'{label} {confidence:g}% CI low', f'{label} {confidence:g}% CI high', f'{label} bootstrap stdev'])
+
+    table = np.empty((len(wavelengths), len(column_names)))
+    table[:, 0] = wavelengths
+    table[:, 1::3] = lower
+    table[:, 2::3] = upper
+    table[:, 3::3] = stdev
+
+    np.savetxt(output_file, table, delimiter=',', fmt='%.6f', header=','.join(column_names), comments='')
+
+def bootstrap_analysis(directory, base_peak_range, fragment_ion_ranges, power_data_file_name, output_file, resamples=BOOTSTRAP_RESAMPLES, confidence=BOOTSTRAP_CONFIDENCE, integration_method='grid', seed=None,
+                       scan_data=None, update_output=None, progress_callback=None, cancel_event=None):
+    '''Integrates every scan of every mzml file in directory, and writes the bootstrap confidence intervals of the photofragmentation efficiencies to output_file (see bootstrap_efficiencies). Usage is:
+    directory containing mzml files, base peak range, fragment ion ranges, power data .csv file (None to skip the normalization), path of the .csv to write, and the bootstrap settings.
+    The files are integrated with the same method as the analysis, so the resamples are drawn from the scans that its averages came from. scan_data (optional) holds the integrals of every scan for the same windows,
+    as kept by main() during the analysis (or from collect_scan_integrals, see scan_integrals.py), which are then used instead of integrating every scan again.
+    progress_callback (optional) is called as progress_callback(files done, total files), and it stops between files once cancel_event (a threading.Event) is set. Returns output_file, or None if it was cancelled.
+    '''
+    if update_output is None:
+        update_output = lambda text: sys.__stdout__.write(text)
+
+    start_time = time.time()
+    integration_windows = [base_peak_range] + fragment_ion_ranges #The base peak is the first window
+    parent_mz = np.round(np.average(base_peak_range), 2)
+    frag_mz = [np.round(np.average(frag_ion_range), 0) for frag_ion_range in fragment_ion_ranges]
+
+    if scan_data is None:
+        scan_data = collect_scan_integrals(directory, integration_windows, parent_mz, integration_method=integration_method, update_output=update_output, progress_callback=progress_callback, cancel_event=cancel_event)
+    if scan_data is None:
+        update_output('The bootstrap was cancelled. No confidence intervals have been written.\n')
+        return None
+
+    laser_power = None
+    if power_data_file_name is not None:
+        laser_data = np.atleast_1d(np.genfromtxt(power_data_file_name, delimiter=',', dtype=None, names=['Wavelength', 'LaserPower', 'PowerStdDev'], encoding=None))
+        if len(scan_data['mzml_files']) != len(laser_data):
+            update_output(f'The number of mzml files ({len(scan_data["mzml_files"])}) does not match the number of rows in the laser power data file ({len(laser_data)}).\n')
+            raise ValueError('Laser power data mismatch')
+        laser_power = laser_data['LaserPower']
+
+    resample_start_time = time.time()
+    file_integrations = scan_data['integrations']
+    lower, upper, stdev = bootstrap_efficiencies(np.concatenate(file_integrations), [len(integrations) for integrations in file_integrations], scan_data['wavelengths'], laser_power,
+                                                 resamples=resamples, confidence=confidence, seed=seed)
+    resample_time = time.time() - resample_start_time
+
+    write_bootstrap_table(output_file, scan_data['wavelengths'], frag_mz, lower, upper, stdev, confidence=confidence)
+    update_output(f'{resamples} bootstrap resamples of {len(file_integrations)} wavelengths x {len(integration_windows)} windows took {resample_time:.2f} seconds ({time.time() - start_time:.2f} seconds in total).\n'
+                  f'The {confidence:g}% confidence intervals have been written to {output_file}\n\n')
+
+    return output_file
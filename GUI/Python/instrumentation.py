@@ -0,0 +1,100 @@
+import io, json, time, platform, tracemalloc, cProfile, pstats
+from contextlib import contextmanager
+
+#Time spent in each stage of the analysis (file open, decode, interpolation, integration, ...) and counters of the data processed (files, scans, points, bytes).
+#Each process keeps its own totals; worker processes hand theirs back with their results, and they are added to the totals of the main process with merge_stats.
+_stage_seconds = {}
+_stage_calls = {}
+_counters = {}
+
+def reset_stats():
+    '''Sets every stage time and counter back to zero (e.g. at the start of a run).'''
+    _stage_seconds.clear()
+    _stage_calls.clear()
+    _counters.clear()
+
+@contextmanager
+def timed_stage(stage):
+    '''Adds the time spent inside the with block to a stage. Usage is: with timed_stage('decode'): ...'''
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_seconds[stage] = _stage_seconds.get(stage, 0.) + time.perf_counter() - start_time
+        _stage_calls[stage] = _stage_calls.get(stage, 0) + 1
+
+def add_counts(**counts):
+    '''Adds to the counters of data processed. Usage is: add_counts(scans=25, points=2500).'''
+    for name, count in counts.items():
+        _counters[name] = _counters.get(name, 0) + int(count)
+
+def get_stats():
+    '''Returns a snapshot of the stage times and counters as a dictionary that can be pickled (for worker processes) or written to JSON.'''
+    return {'stages': {stage: {'seconds': seconds, 'calls': _stage_calls.get(stage, 0)} for stage, seconds in _stage_seconds.items()}, 'counters': dict(_counters)}
+
+def merge_stats(stats):
+    '''Adds a snapshot from get_stats (e.g. from a worker process) to the totals of this process.'''
+    for stage, values in stats['stages'].items():
+        _stage_seconds[stage] = _stage_seconds.get(stage, 0.) + values['seconds']
+        _stage_calls[stage] = _stage_calls.get(stage, 0) + values['calls']
+    add_counts(**stats['counters'])
+
+def format_stats(stats, wall_time=None):
+    '''Returns the stage times and counters as a short table for the output window. Usage is: snapshot from get_stats, and the wall time of the run in seconds (optional).'''
+    lines = ['Time spent in each stage:']
+    total_seconds = sum(values['seconds'] for values in stats['stages'].values())
+    for stage, values in sorted(stats['stages'].items(), key=lambda item: -item[1]['seconds']):
+        share = f' ({100 * values["seconds"] / total_seconds:.0f}%)' if total_seconds > 0 else ''
+        lines.append(f'  {stage}: {values["seconds"]:.3f} s{share} over {values["calls"]} calls')
+
+    if stats['counters']:
+        lines.append('Data processed: ' + ', '.join(f'{count:,} {name}' for name, count in stats['counters'].items()))
+
+    if wall_time is not None:
+        note = ' (stage times add up over worker processes, so they can exceed the wall time)' if total_seconds > wall_time else ''
+        lines.append(f'Wall time: {wall_time:.2f} s{note}')
+
+    return '\n'.join(lines) + '\n'
+
+def write_run_report(report_file, stats, **details):
+    '''Writes a machine-readable run report (.json) with the stage times, counters, and any other details of the run (settings, per-file runtimes, ...). Usage is:
+    path of the report, snapshot from get_stats, and the details as keyword arguments.
+    '''
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(), 'platform': platform.platform(), **details, **stats}
+    with open(report_file, 'w') as file:
+        json.dump(report, file, indent=2)
+
+def profile_call(output_prefix, function, *args, **kwargs):
+    '''Runs function(*args, **kwargs) under cProfile and tracemalloc, and writes what they found next to output_prefix:
+    output_prefix.prof (open with pstats or snakeviz), output_prefix_profile.txt (the 30 most expensive functions), and output_prefix_memory.txt (peak memory and the 20 largest allocation sites).
+    Returns the result of the function call and the list of files written.
+    '''
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    try:
+        profiler.enable()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            profiler.disable()
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    profile_file = f'{output_prefix}.prof'
+    profiler.dump_stats(profile_file)
+
+    profile_text = io.StringIO()
+    pstats.Stats(profiler, stream=profile_text).sort_stats('cumulative').print_stats(30)
+    profile_summary_file = f'{output_prefix}_profile.txt'
+    with open(profile_summary_file, 'w') as file:
+        file.write(profile_text.getvalue())
+
+    memory_file = f'{output_prefix}_memory.txt'
+    with open(memory_file, 'w') as file:
+        file.write(f'Peak traced memory: {peak_memory / 1024**2:.1f} MB (still allocated at the end: {current_memory / 1024**2:.1f} MB)\n\nLargest allocation sites:\n')
+        for statistic in snapshot.statistics('lineno')[:20]:
+            file.write(f'{statistic}\n')
+
+    return result, [profile_file, profile_summary_file, memory_file]
@@ -1,190 +1,189 @@
-import os, re, time, sys, traceback
+import os, re, time, traceback
 import numpy as np
-from Python.workflows import integrate_spectra, PE_calc, PE_calc_noNorm
-from PyQt6.QtWidgets import QApplication
-from io import StringIO
-
-class TextRedirect(StringIO):
-    def __init__(self, textWritten=None, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.update_output = textWritten
-
-    def write(self, text):
-        super().write(text)
-        self.update_output(text)
+from Python.workflows import integrate_mzml_files, profile_mzml_file, PE_calc_matrix
+from Python.instrumentation import reset_stats, timed_stage, get_stats, format_stats, write_run_report
+from Python.results_manifest import RESULTS_MANIFEST_VERSION, load_manifest, save_manifest, cached_integrations, cached_scan_integrations, store_integrations
+
+def efficiency_table(wavelengths, base_peaks, fragment_peaks, frag_mz, laser_power=None, laser_power_stdev=None, update_output=None):
+    '''Calculates the photofragmentation efficiency of every fragment (and the total PE) at every wavelength in one go, and returns the table written to the .csv along with its column names. Usage is:
+    wavelengths (one per row), (rows x 2) average and stdev of the base peak integration, (rows x fragments x 2) the same for each fragment, m/z of each fragment (for the column names),
+    and the laser power and its stdev at each wavelength (None to skip the normalization). Values that can't be calculated are written as nan and reported with update_output.
+    '''
+    #Since total PE is not the sum of the PE from all fragment channels, the total fragment ion integration is used as one more "fragment" (the first column).
+    #Its stdev is propagated from the stdev of each fragment ion. Since its jsut addition, proparation is the square root of the sum of squares
+    fragment_integrations = np.column_stack([np.sum(fragment_peaks[:, :, 0], axis=1), fragment_peaks[:, :, 0]])
+    fragment_integration_stdevs = np.column_stack([np.sqrt(np.sum(np.square(fragment_peaks[:, :, 1]), axis=1)), fragment_peaks[:, :, 1]])
+
+    with timed_stage('PE computation'):
+        efficiencies, efficiency_stdevs, valid = PE_calc_matrix(wavelengths[:, None], base_peaks[:, 0:1], base_peaks[:, 1:2], fragment_integrations, fragment_integration_stdevs,
+                                                                P=None if laser_power is None else laser_power[:, None], dP=None if laser_power_stdev is None else laser_power_stdev[:, None])
+
+    #the run carries on past values that can't be calculated (e.g. zero laser power or no signal at all); they are written as nan
+    column_labels = ['Total PE'] + [f'PE mz {mz}' for mz in frag_mz]
+    for row in np.flatnonzero(~np.all(valid, axis=1)):
+        laser_power_text = '' if laser_power is None else f' The laser power is {laser_power[row]}.'
+        update_output(f'At {wavelengths[row]}nm, {", ".join(column_labels[column] for column in np.flatnonzero(~valid[row]))} could not be calculated (division by zero) and have been written as nan. '
+                      f'The parent integration is {base_peaks[row, 0]} and the sum of the fragment integrations is {fragment_integrations[row, 0]}.{laser_power_text}\n')
+
+    #the table is built straight from the efficiency matrix: wavelength, then each PE (total first) followed by its stdev
+    PE_data = np.empty(shape=(len(wavelengths), len(frag_mz) * 2 + 3), dtype=float) 
+    PE_data[:, 0] = wavelengths
+    PE_data[:, 1::2] = efficiencies
+    PE_data[:, 2::2] = efficiency_stdevs
+
+    column_names = ['Wavelength']
+    for label in column_labels:
+        column_names.extend([label, f'{label} stdev'])
+
+    return PE_data, column_names
 
 # Main function (aka where the magic happens)
-def main(directory, base_peak_range, fragment_ion_ranges, power_data_file_name, update_output=None):
-    
-    # Redirect print outputs to the GUI output window
-    sys.stdout = TextRedirect(textWritten=update_output)
-
-    #print statements are now called with update_output in order for the text to be directed to the GUI window
+def main(directory, base_peak_range, fragment_ion_ranges, power_data_file_name, update_output=None, integration_method='grid', workers=1, progress_callback=None, cancel_event=None, use_manifest=True, profile_file=None, executor=None,
+         scan_data=None):
+    '''Integrates the base peak and fragment ion windows of every mzml file in directory, computes the photofragmentation efficiencies, and writes them to a .csv next to the directory.
+    progress_callback (optional) is called as progress_callback(files done, total files) after each file, and the run stops cleanly before the next file once cancel_event (a threading.Event) is set.
+    The integrations of every file are stored in a results manifest next to the .csv (see results_manifest.py). With use_manifest, files that have not changed since they were integrated with the same windows are not integrated again, so reruns (and runs that were interrupted) only process what is new.
+    The time spent in each stage (see instrumentation.py) is printed at the end and written to a run report (.json) next to the .csv. profile_file (optional) is the name of one of the mzml files,
+    which is then integrated again under cProfile and tracemalloc (with the caches bypassed), and the profiles are written next to the .csv too.
+    executor (optional) is a ProcessPoolExecutor shared with other runs (see batch.py) that the files are integrated on instead of a pool of their own.
+    scan_data (optional) is a dictionary that the integrals and start times of every scan are added to, as the files are integrated ('mzml_files', 'wavelengths', 'integrations', and 'scan_start_times',
+    see collect_scan_integrals in scan_integrals.py). They are kept in the results manifest too, so files loaded from it do not have to be integrated again either.
+    Returns the path of the .csv file that was written, or None if the run failed or was cancelled.
+    '''
+
+    run_start_time = time.perf_counter()
+    reset_stats()
+
+    #messages are sent to update_output, which shows them in the GUI window (or the log on the command line)
     update_output('\nStarting interpolation and integration of mass spectra and calculation of photogragmentaion efficiency...\n\n')
-    QApplication.processEvents()  # Allow the GUI to update
 
     '''Step 1: Get list of mzml files'''
-    mzml_files = [f for f in os.listdir(directory) if f.endswith('.mzML')]
+    #sorted so that the row order (and the alignment with the laser power file) is the same on every operating system
+    mzml_files = sorted([f for f in os.listdir(directory) if f.endswith('.mzML')])
 
     if len(mzml_files) == 0:
         update_output(f'There are no mzml files in {directory}. Were they deleted?\n')
-        QApplication.processEvents()  # Allow the GUI to update  
         return     
 
-    '''Step 2: Parse power_data.csv file (if present), and assign corresponding photofragmentation efficiency function depending on its presence.'''
-    #empty array for PE_calc_NoNorm functions that requires these arguements because ... reasons. Don't worry about it future reader. This is the way. 
-    laser_data = np.empty(shape=(len(mzml_files), 3), dtype=[('Wavelength', None),('LaserPower', None), ('PowerStdDev', None)]) 
-
-    #Assisgn method to calcualte photofragmentation efficiency depending on if Power normalization is used or not
-    PE_function = PE_calc_noNorm 
+    '''Step 2: Parse power_data.csv file (if present). Without it, the photofragmentation efficiency is not normalized to laser power.'''
+    laser_power = None
+    laser_power_stdev = None
     if power_data_file_name is not None: 
         # Load laser data from a CSV file into a structured NumPy array
-        laser_data = np.genfromtxt(power_data_file_name, delimiter=',', dtype=None, names=['Wavelength', 'LaserPower', 'PowerStdDev'], encoding=None)
-        PE_function = PE_calc
+        laser_data = np.atleast_1d(np.genfromtxt(power_data_file_name, delimiter=',', dtype=None, names=['Wavelength', 'LaserPower', 'PowerStdDev'], encoding=None))
+        laser_power = laser_data['LaserPower']
+        laser_power_stdev = laser_data['PowerStdDev']
     
-    #check to see if the number of mzml files (ie. the number of wavelengths scanned) matches the number of rows in the laser power data file. If not, we'll have index errors!
-    if len(mzml_files) != len(laser_data['Wavelength']):
-        update_output(f'The number of mzml files ({len(mzml_files)}) does not match the number of rows in the laser power data file ({len(laser_data["Wavelength"])}).\n')
-        QApplication.processEvents()  # Allow the GUI to update  
-        return
+        #check to see if the number of mzml files (ie. the number of wavelengths scanned) matches the number of rows in the laser power data file. If not, we'll have index errors!
+        if len(mzml_files) != len(laser_data['Wavelength']):
+            update_output(f'The number of mzml files ({len(mzml_files)}) does not match the number of rows in the laser power data file ({len(laser_data["Wavelength"])}).\n')
+            return
     
-    '''Step3: Get the m/z of each fragmentation channel and create arrays for PE data to be written to'''
+    '''Step3: Get the m/z of each fragmentation channel and create arrays for the integrations to be written to'''
     #Get central value of fragment ion ranges and mass of parent peak
     parent_mz = (np.round(np.average(base_peak_range),2))
     frag_mz = []
     for frag_ion_range in fragment_ion_ranges:
         frag_mz.append(np.round(np.average(frag_ion_range),0))  
 
-    # Create an empty NumPy array for the final results to be written to
     num_fragment_ions = len(fragment_ion_ranges)
-    
-    #array size (rows x columns) to store photofragmentation efficiency (PE) data should be number of wavelengths x number of fragment ions * 2 (PE + stdev) + 2 (total PE + stdev) +1 (wavelengths)
-    PE_data = np.empty(shape=(len(mzml_files), num_fragment_ions * 2 + 3), dtype=float) 
 
-    '''Step4: Loop through each mzml file in the directory and calculate the fragmentation efficiency for each fragment specified'''
-    wavelengths = [] #empty list to store wavlengths to - wavelength written as last characters in each .mzML file
+    #integrations (average, stdev) of every window of every file, one row per wavelength. The photofragmentation efficiencies are calculated from these all at once after the loop.
+    wavelengths = np.empty(len(mzml_files), dtype=float)
+    base_peaks = np.empty((len(mzml_files), 2), dtype=float)
+    fragment_peaks = np.empty((len(mzml_files), num_fragment_ions, 2), dtype=float)
+
+    '''Step3.1: Look up the integrations stored by earlier runs, so that only new or changed files (or files with new windows) are integrated'''
+    integration_windows = [base_peak_range] + fragment_ion_ranges #The base peak is the first window
+    manifest = load_manifest(directory) if use_manifest else {'version': RESULTS_MANIFEST_VERSION, 'files': {}}
+    manifest['files'] = {f: entry for f, entry in manifest['files'].items() if f in mzml_files} #forget files that are no longer in the directory
+
+    keep_scans = scan_data is not None
+    stored_peaks = {f: cached_integrations(manifest, directory, f, integration_windows, integration_method) for f in mzml_files}
+    stored_scans = {f: cached_scan_integrations(manifest, directory, f, integration_windows, integration_method) if keep_scans else None for f in mzml_files}
+    pending_files = [f for f in mzml_files if any(peak is None for peak in stored_peaks[f]) or (keep_scans and stored_scans[f] is None)]
+
+    if len(pending_files) < len(mzml_files):
+        update_output(f'{len(mzml_files) - len(pending_files)} of {len(mzml_files)} mzml files were already integrated with these windows and will be loaded from the results manifest.\n')
+
+    '''Step4: Loop through each mzml file in the directory and integrate the base peak and each fragment specified'''
     i = 0 #index to keep track of which row of the power normalization file that we are in
+    manifest_saved = True #set to False once the manifest can't be written, so the user is only told once
+    file_runtimes = {} #integration runtime of each file for the run report (None if it was loaded from the manifest)
+
+    #The integrations come back in the same order as pending_files (from a pool of worker processes if workers > 1).
+    #With scan_data, the integrals of every scan come back with them, so the per-scan export and the bootstrap need no second pass over the files.
+    integration_results = integrate_mzml_files(directory, pending_files, integration_windows, parent_mz, update_output=update_output, integration_method=integration_method, workers=workers, executor=executor,
+                                               keep_scans=keep_scans)
+    pending_files = set(pending_files)
+    if keep_scans:
+        scan_data.update({'mzml_files': mzml_files, 'wavelengths': wavelengths, 'integrations': [], 'scan_start_times': []})
 
     for mzml_file in mzml_files: #Each mzML file is data taken at a specific laser wavelength
+
+        #stop between files if the user has cancelled the run
+        if cancel_event is not None and cancel_event.is_set():
+            update_output(f'The analysis was cancelled after {i} of {len(mzml_files)} mzml files. No photofragmentation efficiency file has been written.\n')
+            return
         
         #get laser wavelength from mzml filename and append to list - need that for writing to the final .csv later
         try:
             wavelength = float(re.findall(r'\d+',mzml_file.split('Laser')[-1])[-1]) 
-            wavelengths.append(wavelength)
+            wavelengths[i] = wavelength
         except ValueError as ve:
             update_output(f'Could not extract the wavelength from the .mzml file name. This is what the code has found: {wavelength}.\n\nDoes the filename contain the text: "Laser"?\n')
             update_output(f'Error: {ve}\nTraceback: {traceback.format_exc()}\n')
-            QApplication.processEvents()  # Allow the GUI to update        
             return     
 
-        #empty lists to store the average integrations and their stdev for each fragment - we need these to calcualte the total PE later.  
-        fragment_ion_integrations = [] 
-        fragment_ion_integrations_stdevs = []
-
-        fragment_ion_efficiencies = [] #empty list to store PE for each fragmentation channel
-        fragment_ion_efficiency_stdevs = [] #empty list to store PE stdev for each fragmentation channel
-
-        mzml_start_time = time.time() #timer to keep track of mzml processing
-
-        #get integration for base peak (parent ion)
+        '''Step4.1: Integrate the mass spectrum to get the integrations of the parent ion peak and each fragment ion peak'''
+        #all windows are integrated in a single pass, so each mzml file is only parsed and interpolated once.
         try:
-            base_peak = integrate_spectra(directory, mzml_file, base_peak_range, parent_mz)
+            if mzml_file in pending_files:
+                integrated_peaks, mzml_runtime, scans = next(integration_results)
+
+                #store the integrations straight away, so that they are not lost if a later file fails or the run is cancelled
+                store_integrations(manifest, directory, mzml_file, integration_windows, integrated_peaks, integration_method, scans=scans)
+                if use_manifest and manifest_saved:
+                    try:
+                        save_manifest(directory, manifest)
+                    except OSError as oe:
+                        update_output(f'The results manifest could not be written next to {directory}, so this run can not be resumed if it is interrupted:\n{oe}\n')
+                        manifest_saved = False
+
+                #print runtime to GUI window        
+                file_runtimes[mzml_file] = mzml_runtime
+                mzml_runtime = np.round(mzml_runtime,2)
+                update_output(f'Integration for {np.round((wavelength),0)}nm has completed in {mzml_runtime} seconds.\n')
+
+            else:
+                integrated_peaks = stored_peaks[mzml_file]
+                scans = stored_scans[mzml_file]
+                file_runtimes[mzml_file] = None
+                update_output(f'Integration for {np.round((wavelength),0)}nm has been loaded from the results manifest.\n')
+
+            base_peaks[i] = integrated_peaks[0]
+            fragment_peaks[i] = integrated_peaks[1:]
+
+            if keep_scans:
+                scan_data['integrations'].append(scans['integrations'])
+                scan_data['scan_start_times'].append(scans['scan_start_times'])
 
         except Exception as e:
-            update_output(f'Problem encountered when integrating the base peak in {mzml_file}:\n{e}\nTraceback: {traceback.format_exc()}\n')
-            QApplication.processEvents()  # Allow the GUI to update        
+            update_output(f'Problem encountered when integrating the base peak and fragment ions in {mzml_file}:\n{e}\nTraceback: {traceback.format_exc()}\n')
             return     
         
-        '''Step4.1: Integrate the mass spectrum to get the integrations of the parent ion peak and each fragment ion peak'''
-        for fragment_ion_range in fragment_ion_ranges:
-            try:
-                fragment_peak = integrate_spectra(directory, mzml_file, fragment_ion_range, parent_mz)
-            except Exception as e:
-                update_output(f'Problem encountered when integrating the fragment m/z={np.round(np.mean(fragment_ion_range),1)}) in {mzml_file}:\n{e}\nTraceback: {traceback.format_exc()}\n')
-                QApplication.processEvents()  # Allow the GUI to update        
-                return     
-
-        #print runtime to GUI window        
-        mzml_runtime = np.round((time.time() - mzml_start_time),2)
-        update_output(f'Integration for {np.round((wavelength),0)}nm has completed in {mzml_runtime} seconds.\n')
-        QApplication.processEvents()  # Allow the GUI to update
-        
-        '''Step 4.2: Calculate PE for each fragment ion, then append PE to the fragment_ion_efficiencies list'''
-        
-        for fragment_ion_range in fragment_ion_ranges:    
-            try:
-                PE = PE_function(wavelength, laser_data['LaserPower'][i], laser_data['PowerStdDev'][i], base_peak[0], base_peak[1], fragment_peak[0], fragment_peak[1]) # W, P, dP, Par, dPar, Frag, dFrag
-            
-            except IndexError:
-                update_output('The number of wavelengths sampled in your powerdata.csv file does not match the number of .mzML files extracted. These need to be the same.\n')
-                update_output(f"There are {len(mzml_files)} .mzML files in {directory} and {len(laser_data['LaserPower'])} wavelengths in {power_data_file_name}.\nTraceback: {traceback.format_exc()}\n")
-                QApplication.processEvents()  # Allow the GUI to update       
-                return
-            
-            except Exception as e:
-                update_output(f'Problem encountered when calculating the photofragmentation efficiency of m/z={np.round(np.mean(fragment_ion_range),1)}) in {mzml_file}:\n{e}\nTraceback: {traceback.format_exc()}\n')
-                QApplication.processEvents()  # Allow the GUI to update        
-                return     
-
-            #Since there are multiple fragmentation channels, append the PE from each channel to a list
-            #The PE_function returns a list - the first entry is the photofragmentation efficiency averaged over N spectra; the second entry is the associated stdev
-            fragment_ion_efficiencies.append(PE[0]) 
-            fragment_ion_efficiency_stdevs.append(PE[1])
-
-            #Since total PE is not the sum of the PE from all fragment channels, we need to store the total integration of all fragment ion peaks and their stdevs
-            fragment_ion_integrations.append(fragment_peak[0]) #storing total fragment ion area to calculate total PE later
-            fragment_ion_integrations_stdevs.append(fragment_peak[1]) #storing total fragment ion area stdev to calculate total PE stdev later
-
-        '''Step4.3: Compute the total photofragmentation efficiency'''    
-        #get total fragment ion integration 
-        total_fragment_ion_integration = np.sum(fragment_ion_integrations)
-
-        #propagate stdev of each fragment ion uncertainty together. Since its jsut addition, proparation is the square root of the sum of squares
-        total_fragment_ion_integration_stdev = np.sqrt(np.sum(np.square(fragment_ion_integrations_stdevs)))
-
-        #compute total PE for each mzml file
-        try:
-            Total_PE = PE_function(wavelength, laser_data['LaserPower'][i], laser_data['PowerStdDev'][i], base_peak[0], base_peak[1], total_fragment_ion_integration, total_fragment_ion_integration_stdev) # W, P, dP, Par, dPar, Frag, dFrag
-        
-        except IndexError:
-            update_output('The number of wavelengths sampled in your powerdata.csv file does not match the number of .mzML files extracted. These need to be the same.\n')
-            update_output(f"There are {len(mzml_files)} .mzML files in {directory} and {len(laser_data['LaserPower'])} wavelengths in {power_data_file_name}.\n")
-            QApplication.processEvents()  # Allow the GUI to update       
-            return
-        
-        except Exception as e:
-            update_output(f'Problem encountered when calculating the TOTAL photofragmentation efficiency in {mzml_file}:\n{e}\n')
-            QApplication.processEvents()  # Allow the GUI to update        
-            return   
-
-        '''Step4.3: Store calculated efficiencies in the result_data array. row index = i'''  
-        PE_data[i, 0] = wavelengths[i] #wavelengths in first column
-        PE_data[i, 1] = Total_PE[0] # Store total_efficiency in the second column
-        PE_data[i, 2] = Total_PE[1] # Store total_efficiency stdev in the third column       
-        PE_data[i, 3:num_fragment_ions*2 + 3:2] = fragment_ion_efficiencies # Store fragment ion efficiency in the 4, 6, 8, 10, .... columns
-        PE_data[i, 4:num_fragment_ions*2 + 3:2] = fragment_ion_efficiency_stdevs # Store fragment ion efficiency stdev in the 5, 7, 9, 11, .... columns
-
         i+=1 #update index to start next row of laser data file when the next mzml file is read in
 
-    '''Step5: Create an array to write PE data to'''
-    # Create a structured array for results
-    dtype = [('Wavelength', float)]
-    dtype.extend([('Total PE', float)])
-    dtype.extend([('Total PE stdev', float)])
-
-    #Alternate labels for Frag PE and Frag PE stdev
-    for i in range(num_fragment_ions): 
-        dtype.extend([(f'PE mz {frag_mz[i]}', float)])
-        dtype.extend([(f'PE mz {frag_mz[i]} stdev', float)])
+        if progress_callback is not None:
+            progress_callback(i, len(mzml_files))
 
-    #python magic that I figured out at one point to make a structured data array, but I forget how this works now, so good luck. 
+    '''Step5: Calculate the photofragmentation efficiency of every fragment at every wavelength in one go, then the total PE'''
     try:
-        result_structured = np.array(list(zip(*[PE_data[:, i] for i in range(PE_data.shape[1])])), dtype=dtype)
+        PE_data, column_names = efficiency_table(wavelengths, base_peaks, fragment_peaks, frag_mz, laser_power, laser_power_stdev, update_output=update_output)
 
     except Exception as e:
-        update_output(f'Problem encountered when creating structured data array in main.py:\n{e}\nTraceback: {traceback.format_exc()}')
-        QApplication.processEvents()  # Allow the GUI to update        
-        return    
+        update_output(f'Problem encountered when calculating the photofragmentation efficiencies:\n{e}\nTraceback: {traceback.format_exc()}\n')
+        return
 
     '''Step6: Write the PE data to a .csv file'''
     output_file = os.path.join(os.path.dirname(directory),'photofragmentation_efficiency.csv')
@@ -196,12 +195,39 @@ def main(directory, base_peak_range, fragment_ion_ranges, power_data_file_name,
         output_file = os.path.join(os.path.dirname(directory),f'photofragmentation_efficiency_{index}.csv')
 
     try:
-        np.savetxt(output_file, result_structured, delimiter=',', fmt='%.6f', header=','.join(result_structured.dtype.names), comments='')
+        with timed_stage('output write'):
+            np.savetxt(output_file, PE_data, delimiter=',', fmt='%.6f', header=','.join(column_names), comments='')
         update_output(f'The photofragmentation efficiency data has been succesfully written to {output_file}\n\n')
-        return
 
     except PermissionError: #this should never proc because we check for existing files and change the ending index to make sure the file is new, but you never know...
-        print(f'Python is trying to write to {output_file}, but it is open. Please close it and then rerun the code.')
-        QApplication.processEvents()  # Allow the GUI to update       
+        update_output(f'Python is trying to write to {output_file}, but it is open. Please close it and then rerun the code.\n')
         return
 
+    '''Step7: Report where the time went, and profile a single file if asked to'''
+    run_time = time.perf_counter() - run_start_time
+    stats = get_stats()
+    update_output(format_stats(stats, wall_time=run_time))
+
+    report_file = f'{os.path.splitext(output_file)[0]}_run_report.json'
+    settings = {'directory': directory, 'base_peak_range': list(base_peak_range), 'fragment_ion_ranges': [list(fragment_ion_range) for fragment_ion_range in fragment_ion_ranges],
+                'power_data_file_name': power_data_file_name, 'integration_method': integration_method, 'workers': workers, 'use_manifest': use_manifest}
+    try:
+        write_run_report(report_file, stats, output_file=output_file, wall_time=run_time, settings=settings, file_runtimes=file_runtimes)
+        update_output(f'The run report has been written to {report_file}\n\n')
+    except (OSError, TypeError) as e: #the report is only for diagnostics, so failing to write it never fails the run
+        update_output(f'The run report could not be written to {report_file}: {e}\n\n')
+
+    if profile_file is not None:
+        profile_file = os.path.basename(profile_file)
+        if profile_file not in mzml_files:
+            update_output(f'{profile_file} is not one of the mzml files in {directory}, so it has not been profiled.\n\n')
+        else:
+            update_output(f'Profiling the integration of {profile_file}...\n')
+            try:
+                profile_files = profile_mzml_file(directory, profile_file, integration_windows, parent_mz, f'{os.path.splitext(output_file)[0]}_{os.path.splitext(profile_file)[0]}', update_output=update_output, integration_method=integration_method)
+                update_output('The profiles have been written to:\n' + '\n'.join(profile_files) + '\n\n')
+            except Exception as e:
+                update_output(f'Problem encountered when profiling {profile_file}:\n{e}\nTraceback: {traceback.format_exc()}\n')
+
+    return output_file
+
@@ -0,0 +1,144 @@
+import os, sys, time
+import numpy as np
+from Python.workflows import get_spectra
+
+#Proposes the base peak and fragment ion windows from the spectrum summed over every wavelength, so that weak fragment channels are not missed when the windows are typed by hand.
+#   from Python.peak_proposal import summed_spectrum, propose_windows
+#   mz, intensity = summed_spectrum('D:/SampleData/mzml_directory')
+#   base_peak_range, fragment_ion_ranges = propose_windows(mz, intensity)
+PROPOSAL_MZ_STEP = 0.02          #narrowest bin of the summed spectrum (it is widened to the spacing of the raw profile points, so that every bin has signal)
+PROPOSAL_MIN_RELATIVE_HEIGHT = 1e-3 #peaks smaller than this fraction of the parent peak are not proposed
+PROPOSAL_NOISE_FACTOR = 5.       #peaks must also stand this many noise levels (median absolute deviation) above the baseline
+PROPOSAL_EDGE_FRACTION = 0.002    #a window ends where the signal falls below this fraction of its peak, or at the valley to the next peak
+PROPOSAL_MAX_HALF_WIDTH = 3.     #m/z - no window reaches further than this from its peak
+
+def summed_spectrum(mzml_directory, mz_step=PROPOSAL_MZ_STEP, update_output=None, progress_callback=None, cancel_event=None):
+    '''Sums the scans of every mzml file in mzml_directory into one spectrum (the mean intensity over all scans of all wavelengths). Usage is:
+    directory containing mzml files, the narrowest m/z bin, and optionally progress_callback(files done, total files) and cancel_event (a threading.Event).
+    The area of every trapezoid between neighbouring profile points goes into the bin of its midpoint (one np.bincount per file), so the integral of the spectrum is kept.
+    The bins are at least as wide as the spacing of the profile points. Returns the m/z at the centre of each bin and the intensity, or None if it was cancelled.
+    '''
+    if update_output is None:
+        update_output = lambda text: sys.__stdout__.write(text)
+
+    start_time = time.time()
+    mzml_files = sorted([f for f in os.listdir(mzml_directory) if f.endswith('.mzML')])
+    if len(mzml_files) == 0:
+        update_output(f'There are no mzml files in {mzml_directory}.\n')
+        raise FileNotFoundError(f'No mzml files in {mzml_directory}')
+
+    binned_areas = np.zeros(0)
+    num_scans = 0
+    for i, mzml_file in enumerate(mzml_files):
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+
+        spectra = get_spectra(mzml_directory, mzml_file, update_output=update_output)
+        mz = spectra['mz']
+        intensity = spectra['intensity']
+        offsets = spectra['offsets']
+
+        #trapezoids that would bridge two scans are zeroed, as in build_cumulative_index
+        areas = 0.5 * (intensity[1:] + intensity[:-1]) * np.diff(mz)
+        areas[offsets[1:-1][offsets[1:-1] > 0] - 1] = 0.
+
+        #the bin width is set by the first file with profile points
+        if len(binned_areas) == 0 and len(areas) > 0:
+            spacing = np.diff(mz)
+            mz_step = max(mz_step, float(np.median(spacing[spacing > 0])))
+
+        if len(areas) > 0:
+            file_areas = np.bincount(np.floor(0.5 * (mz[1:] + mz[:-1]) / mz_step).astype(int), weights=areas)
+            if len(file_areas) > len(binned_areas):
+                binned_areas = np.pad(binned_areas, (0, len(file_areas) - len(binned_areas)))
+            binned_areas[:len(file_areas)] += file_areas
+
+        num_scans += len(offsets) - 1
+
+        if progress_callback is not None:
+            progress_callback(i + 1, len(mzml_files))
+
+    update_output(f'The spectra of {len(mzml_files)} mzml files ({num_scans:,} scans) have been summed in {time.time() - start_time:.2f} seconds.\n')
+
+    return (np.arange(len(binned_areas)) + 0.5) * mz_step, binned_areas / (mz_step * max(num_scans, 1))
+
+def propose_windows(mz, intensity, parent_mz=None, min_relative_height=PROPOSAL_MIN_RELATIVE_HEIGHT, noise_factor=PROPOSAL_NOISE_FACTOR, edge_fraction=PROPOSAL_EDGE_FRACTION, max_half_width=PROPOSAL_MAX_HALF_WIDTH):
+    '''Finds the peaks of a summed spectrum (see summed_spectrum) and proposes an integration window for the parent and for every fragment below it. Usage is:
+    m/z and intensity of the spectrum, the m/z of the parent ion (default: the most intense peak), and the detection settings (see the PROPOSAL_ constants).
+    Each window runs from where the signal falls below edge_fraction of its peak (or the valley to the next peak) on one side to the same on the other, rounded outwards to 0.1 m/z (or split halfway where two windows would overlap).
+    Returns the base peak range [lower, upper] and the fragment ion ranges [[lower, upper], ...] in order of m/z.
+    '''
+    if len(intensity) < 3 or np.max(intensity) <= 0:
+        raise ValueError('The summed spectrum is empty, so no windows can be proposed.\n')
+
+    #light smoothing so that single noisy bins don't make peaks or valleys
+    smoothed = np.convolve(intensity, np.ones(3) / 3, mode='same')
+
+    #local maxima that stand out of the noise
+    baseline = np.median(smoothed)
+    noise = 1.4826 * np.median(np.abs(smoothed - baseline))
+    maxima = np.flatnonzero((smoothed[1:-1] > smoothed[:-2]) & (smoothed[1:-1] >= smoothed[2:]) & (smoothed[1:-1] > baseline + noise_factor * noise)) + 1
+    if len(maxima) == 0:
+        raise ValueError('No peaks stand out of the noise in the summed spectrum, so no windows can be proposed.\n')
+
+    if parent_mz is None:
+        parent_peak = maxima[np.argmax(smoothed[maxima])]
+    else:
+        parent_peak = maxima[np.argmin(np.abs(mz[maxima] - parent_mz))]
+
+    peaks = maxima[smoothed[maxima] >= min_relative_height * smoothed[parent_peak]]
+
+    #walk outwards from every peak at once (peaks x steps): a window ends at the first bin below edge_fraction of its peak, or where the signal starts rising again
+    step = mz[1] - mz[0]
+    steps = np.arange(1, max(int(max_half_width / step), 1) + 1)
+    edges = []
+    for direction in (-1, 1):
+        index = np.clip(peaks[:, None] + direction * steps[None, :], 0, len(smoothed) - 1)
+        ended = (smoothed[index] <= edge_fraction * smoothed[peaks][:, None]) | (smoothed[np.clip(index + direction, 0, len(smoothed) - 1)] > smoothed[index])
+        ended[:, -1] = True #no further than max_half_width
+        edges.append(index[np.arange(len(peaks)), np.argmax(ended, axis=1)])
+
+    lower = np.floor(np.round(mz[edges[0]] * 10, 6)) / 10
+    upper = np.ceil(np.round(mz[edges[1]] * 10, 6)) / 10
+
+    #maxima within one peak (e.g. a flat top) give the same window, which is only proposed once
+    windows = np.unique(np.column_stack([lower, upper]), axis=0)
+
+    #neighbouring peaks that share a valley would both count it after rounding, so they are split halfway instead
+    overlap = np.flatnonzero(windows[1:, 0] < windows[:-1, 1])
+    split = np.round(0.5 * (windows[overlap, 1] + windows[overlap + 1, 0]), 2)
+    windows[overlap, 1] = split
+    windows[overlap + 1, 0] = split
+
+    #a narrow window between two neighbours that both overlap it can be split down to nothing (e.g. a noise spike on the flank of a peak); it is dropped
+    windows = windows[windows[:, 1] > windows[:, 0]]
+
+    parent = int(np.flatnonzero((windows[:, 0] <= mz[parent_peak]) & (windows[:, 1] >= mz[parent_peak]))[0])
+    base_peak_range = [float(windows[parent, 0]), float(windows[parent, 1])]
+
+    #fragments are lighter than the parent; the parent window itself (and anything overlapping it) is left out
+    fragment_ion_ranges = [[float(window_lower), float(window_upper)] for window_lower, window_upper in windows if window_upper <= base_peak_range[0]]
+
+    return base_peak_range, fragment_ion_ranges
+
+def windows_text(base_peak_range, fragment_ion_ranges):
+    '''Returns the windows as the text of the base peak and fragment ion fields of the GUI (and of --base-peak and --fragments), e.g. '239.7,241.2' and '(54.9,57.0),(114.6,115.6)'.'''
+    return f'{base_peak_range[0]},{base_peak_range[1]}', ','.join(f'({lower},{upper})' for lower, upper in fragment_ion_ranges)
+
+def propose_windows_for_directory(mzml_directory, parent_mz=None, update_output=None, progress_callback=None, cancel_event=None):
+    '''Sums the spectra of every mzml file in mzml_directory and proposes the windows for them (see summed_spectrum and propose_windows). Usage is:
+    directory containing mzml files, the m/z of the parent ion (default: the most intense peak), and optionally progress_callback(files done, total files) and cancel_event (a threading.Event).
+    Returns the base peak range and the fragment ion ranges, or None if it was cancelled.
+    '''
+    if update_output is None:
+        update_output = lambda text: sys.__stdout__.write(text)
+
+    spectrum = summed_spectrum(mzml_directory, update_output=update_output, progress_callback=progress_callback, cancel_event=cancel_event)
+    if spectrum is None:
+        return None
+
+    base_peak_range, fragment_ion_ranges = propose_windows(*spectrum, parent_mz=parent_mz)
+    base_peak_text, fragment_text = windows_text(base_peak_range, fragment_ion_ranges)
+    update_output(f'Proposed windows ({len(fragment_ion_ranges)} fragments):\nBase peak: {base_peak_text}\nFragment ions: {fragment_text}\n\n')
+
+    return base_peak_range, fragment_ion_ranges
@@ -0,0 +1,297 @@
+import os, sys, time, json, traceback
+from Python.workflows import convert_wiff_files, extract_RawData, RAW_DATA_FORMATS, MSCONVERT_PROFILES
+from Python.main import main
+from Python.bootstrap import bootstrap_analysis
+from Python.scan_integrals import write_scan_integrals
+
+#The whole analysis (msconvert, photofragmentation efficiency, per-scan integrals, bootstrap confidence intervals, raw data export) without any Qt, so that it can run on machines without a display.
+#The GUI and the command line (python -m Python, see __main__.py) are both thin clients of run_analysis.
+
+#Settings accepted by run_analysis (and config files), with their defaults. directory, base_peak_range, and fragment_ion_ranges are required.
+DEFAULT_SETTINGS = {
+    'directory': None,
+    'base_peak_range': None,
+    'fragment_ion_ranges': None,
+    'power_data_file_name': None,
+    'extract_mzml_from_wiff': False,
+    'conversion_profile': 'default', #how msconvert writes the arrays of the mzml files: 'default' (uncompressed 64-bit), 'compact' (32-bit intensities, zlib), or 'numpress' (see MSCONVERT_PROFILES)
+    'print_raw_data': False,
+    'raw_data_format': 'csv',
+    'raw_data_stdev': False, #also export the standard deviation across the scans of every m/z point
+    'integration_method': 'grid',
+    'workers': 1,
+    'profile_file': None, #name of one mzml file to profile with cProfile and tracemalloc after the run (see main)
+    'bootstrap_resamples': 0, #number of bootstrap resamples for confidence intervals of the photofragmentation efficiency (0 skips the bootstrap, see bootstrap.py)
+    'export_scan_integrals': False, #also save the integral of every window in every scan, with the scan start times (see scan_integrals.py)
+}
+
+def parse_base_peak_range(base_peak_input):
+    '''Parses the base peak range from text ('239.0, 242.0') or a sequence of two numbers, and returns it as [lower, upper]. Raises ValueError with a message for the user if it is not valid.'''
+    if not isinstance(base_peak_input, str):
+        base_peak_input = ','.join(str(value) for value in base_peak_input)
+
+    base_peak_input = base_peak_input.replace(' ','').strip() #strip any whitespace within, before, or after the input
+
+    #check that base peak range is not empty
+    if not base_peak_input:
+        raise ValueError('The field for the base peak range is empty! Please populate it with two comma separated values.\n')
+
+    #check that there is at least one comma in the base peak range
+    if ',' not in base_peak_input:
+        raise ValueError('No commas were found in the base peak range input. This needs to be two, comma separated numbers!\n')
+
+    try:
+        base_peak_range = list(map(float, base_peak_input.split(','))) #if there is at least 1 comma in the function, this shouldn't fail unless there are non-numeric characters
+    except ValueError:
+        raise ValueError('Base peak input contains non-numeric characters!\n') #will throw value error because you cant float, for example, a100
+
+    #check that base peak range contains only two comma separated values
+    if len(base_peak_range) != 2:
+        raise ValueError(f'You have specified {len(base_peak_range)} comma separated values for the base peak range.\nThe input for the base peak range can only be exactly two numbers separated by a comma (upper and lower limit of the m/z that surrounds the parent ion peak).\n')
+
+    return base_peak_range
+
+def parse_fragment_ion_ranges(fragment_ion_input):
+    '''Parses the fragment ion ranges from text ('(54.5,57.0),(114.5,116.0)') or a sequence of pairs of numbers, and returns them as [[lower, upper], ...]. Raises ValueError with a message for the user if they are not valid.'''
+    if not isinstance(fragment_ion_input, str):
+        fragment_ion_input = ','.join(f'({",".join(str(value) for value in pair)})' for pair in fragment_ion_input)
+
+    fragment_ion_input = fragment_ion_input.replace(' ','').strip() #strip any whitespace within, before, or after the input
+
+    #check that fragment peak range is not empty
+    if not fragment_ion_input:
+        raise ValueError('The field for the fragment peak range is empty! Please populate it using the proper format.\n')
+
+    # Check if the input contains any commas
+    if ',' not in fragment_ion_input:
+        raise ValueError('No commas were found in the fragment peak range input. Please use the specified format!\n')
+
+    if '(' not in fragment_ion_input or ')' not in fragment_ion_input:
+        raise ValueError('No brackets were found in the fragment peak range input. Please use the specified format!\n')
+
+    # Check if the input is in the form (number,number),(number,number),...
+    try:
+        fragment_ion_ranges = [list(map(float, pair.strip('()').split(','))) for pair in fragment_ion_input.split('),(')]
+
+    except ValueError as ve:
+        raise ValueError(f'Error parsing fragment ion input: {ve}\nFragment peak input likely contains non-numeric characters\n') #will throw value error because you cant float, for example, a100
+
+    # Check if each bracket in the fragment ion input has exactly two numbers
+    if any(len(pair) != 2 for pair in fragment_ion_ranges):
+        raise ValueError('The input for each fragment ion (ie. the contents within each bracket) can only be exactly two numbers separated by a comma (upper and lower limit of the m/z that surrounds the fragment ion peak).\n')
+
+    return fragment_ion_ranges
+
+def check_power_data_file(power_data_file_name):
+    '''Checks that the power data file exists and is a .csv with three numeric columns (Wavelength(nm), Laser power, StDev of the laser power). Raises ValueError with a message for the user if it is not.'''
+
+    #function to check if entires in the .csv are numeric
+    def is_numeric_list(row):
+        try:
+            # Try to convert each entry in the row to a float
+            for entry in row:
+                float(entry)
+            return True
+        except ValueError:
+            return False
+
+    # Check if the file exists
+    if not os.path.isfile(power_data_file_name):
+        raise ValueError('The power data file could not be found. Please eheck that you have specified the directory and file name (with its extension!) properly.')
+
+    # Check if the file has a .csv extension
+    if not power_data_file_name.lower().endswith('.csv'):
+        raise ValueError('The power data file specified is not a .csv. Please ensure it is a comma separated value file (.csv).\n')
+
+    #Check that the .csv is the correct format before starting the calculation.
+    try:
+        # Read the first row of the CSV to check the number of columns
+        with open(power_data_file_name, 'r') as file:
+            first_row = file.readline().strip().split(',')
+
+            # Check if the .csv contains three columns
+            if len(first_row) != 3:
+                raise ValueError(f'The power data file .csv contains {len(first_row)} columns! Each row must only contain three numeric values with the following format:\nWavelength(nm), Laser power, and the StDev of the laser power.')
+
+            # Read the remaining rows to check if all entries are numeric
+            for line in file:
+                row = line.strip().split(',')
+                if len(row) != 3 or not is_numeric_list(row):
+                    raise ValueError(f'This line in the .csv file: {line}\ndoes not meet the required format. Each row must only contain three numeric values with the following format:\nWavelength(nm), Laser power, and the StDev of the laser power.')
+
+    except OSError as e:
+        raise ValueError(f'Error encounters when attempting to open {power_data_file_name}:\n {e}\nTraceback: {traceback.format_exc()}')
+
+def load_config(config_file):
+    '''Reads analysis settings from a .json config file, and returns them as a dictionary (see DEFAULT_SETTINGS for the keys). Usage is: path to config file.
+    Ranges can be given as lists ([239.0, 242.0] and [[54.5, 57.0], ...]) or as the same text that is typed into the GUI. Relative paths are taken relative to the config file.
+    '''
+    with open(config_file, 'r') as file:
+        config = json.load(file)
+
+    if not isinstance(config, dict):
+        raise ValueError(f'The config file {config_file} must contain a single JSON object with the analysis settings.\n')
+
+    unknown_settings = [key for key in config if key not in DEFAULT_SETTINGS]
+    if len(unknown_settings) > 0:
+        raise ValueError(f'Unknown setting(s) in {config_file}: {", ".join(unknown_settings)}. The available settings are: {", ".join(DEFAULT_SETTINGS)}.\n')
+
+    config_directory = os.path.dirname(os.path.abspath(config_file))
+    for key in ('directory', 'power_data_file_name'):
+        if config.get(key) is not None:
+            config[key] = os.path.join(config_directory, os.path.expanduser(config[key]))
+
+    return config
+
+def validate_settings(settings):
+    '''Fills in the defaults of any missing settings and checks them, returning a new dictionary of settings that run_analysis accepts. Raises ValueError with a message for the user if a setting is not valid.'''
+    settings = {**DEFAULT_SETTINGS, **{key: value for key, value in settings.items() if value is not None}}
+
+    if settings['directory'] is None or not os.path.isdir(settings['directory']):
+        raise ValueError('The directory specified does not exist. Please provide a valid file path.\n')
+
+    if settings['base_peak_range'] is None:
+        raise ValueError('The field for the base peak range is empty! Please populate it with two comma separated values.\n')
+    settings['base_peak_range'] = parse_base_peak_range(settings['base_peak_range'])
+
+    if settings['fragment_ion_ranges'] is None:
+        raise ValueError('The field for the fragment peak range is empty! Please populate it using the proper format.\n')
+    settings['fragment_ion_ranges'] = parse_fragment_ion_ranges(settings['fragment_ion_ranges'])
+
+    if settings['power_data_file_name'] is not None:
+        check_power_data_file(settings['power_data_file_name'])
+
+    if settings['raw_data_format'] not in RAW_DATA_FORMATS:
+        raise ValueError(f'Unknown raw data format: {settings["raw_data_format"]}. Please use one of: {", ".join(RAW_DATA_FORMATS)}.\n')
+
+    if settings['conversion_profile'] not in MSCONVERT_PROFILES:
+        raise ValueError(f'Unknown conversion profile: {settings["conversion_profile"]}. Please use one of: {", ".join(MSCONVERT_PROFILES)}.\n')
+
+    if settings['integration_method'] not in ('grid', 'raw'):
+        raise ValueError(f'Unknown integration method: {settings["integration_method"]}. Please use grid or raw.\n')
+
+    if int(settings['workers']) < 1:
+        raise ValueError('The number of worker processes must be at least 1.\n')
+    settings['workers'] = int(settings['workers'])
+
+    if int(settings['bootstrap_resamples']) < 0:
+        raise ValueError('The number of bootstrap resamples can not be negative (0 skips the bootstrap).\n')
+    settings['bootstrap_resamples'] = int(settings['bootstrap_resamples'])
+
+    return settings
+
+def run_analysis(directory, base_peak_range, fragment_ion_ranges, power_data_file_name=None, extract_mzml_from_wiff=False, conversion_profile='default', print_raw_data=False, raw_data_format='csv', raw_data_stdev=False,
+                 integration_method='grid', workers=1, profile_file=None, bootstrap_resamples=0, export_scan_integrals=False, update_output=None, progress_callback=None, cancel_event=None, executor=None):
+    '''Runs the whole analysis: msconvert (if extract_mzml_from_wiff), photofragmentation efficiency calculation, per-scan integral export (if export_scan_integrals), bootstrap confidence intervals (if bootstrap_resamples),
+    and raw data export (if print_raw_data). Usage is:
+    directory containing the .wiff files (the mzml files are in its mzml_directory), base peak range [lower, upper], fragment ion ranges [[lower, upper], ...], power data .csv file (None to skip the laser power normalization), and the options described in DEFAULT_SETTINGS.
+    update_output is called with the text to show the user, progress_callback (optional) is called as progress_callback(stage, files done, total files), and the analysis stops between files once cancel_event (a threading.Event) is set.
+    executor (optional) is a ProcessPoolExecutor shared with other runs (see batch.py) that the mzml files are integrated on.
+    Returns a dictionary with the msconvert results ('conversions') and the files that were written ('photofragmentation_efficiency', 'scan_integrals', 'bootstrap', and 'raw_data'), which are None for steps that were skipped, failed, or cancelled.
+    '''
+    if update_output is None:
+        update_output = lambda text: sys.__stdout__.write(text)
+
+    def is_cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def stage_progress(stage):
+        if progress_callback is None:
+            return None
+        return lambda done, total: progress_callback(stage, done, total)
+
+    start_time = time.time() #get the time to determine overall calculation time.
+    mzml_directory = os.path.join(directory, 'mzml_directory') #directory for mzml files to be written to / where they are stored
+    results = {'conversions': None, 'photofragmentation_efficiency': None, 'scan_integrals': None, 'bootstrap': None, 'raw_data': None}
+
+    # Convert contents of each wiff file into an mzml (if requested)
+    if extract_mzml_from_wiff:
+        update_output('Starting extraction of .wiff files. You may see a command prompt interface show up.\n\n')
+        # List .wiff Files in the Directory and
+        wiff_files = sorted([f for f in os.listdir(directory) if f.endswith('.wiff')])
+
+        if len(wiff_files) == 0:
+            update_output(f'There are no .wiff files present in {directory} to extract! Please specify a directory that contains .wiff files if you wish to extract them.\n')
+            return results
+
+        # Convert the files with several msconvert processes at once. Files that were already converted (e.g. by an earlier run that was cancelled) are skipped.
+        try:
+            conversions = convert_wiff_files(directory, mzml_directory, wiff_files, workers=workers, update_output=update_output,
+                                             progress_callback=stage_progress('Converting .wiff files'), cancel_event=cancel_event, conversion_profile=conversion_profile)
+
+        except Exception as e:
+            #I don't really know how this can break, so we're using a broad exception. Surprise me, users!
+            update_output(f'A problem was encountered when converting the .wiff files in {directory}.\nError: {e}\nTraceback: {traceback.format_exc()}\n')
+            return results
+
+        results['conversions'] = conversions
+
+        if is_cancelled():
+            update_output('The analysis was cancelled during the extraction of the .wiff files. Files that were already converted will be skipped next time.\n')
+            return results
+
+        failed = [conversion['wiff_file'] for conversion in conversions if conversion['status'] == 'failed']
+        if len(failed) > 0:
+            update_output(f'{len(failed)} of {len(wiff_files)} .wiff files could not be converted:\n' + '\n'.join(failed) + '\nThe photofragmentation efficiency will not be calculated from an incomplete set of files. Fix the problem(s) above and re-run - the files that did convert will be skipped.\n')
+            return results
+
+    if not os.path.isdir(mzml_directory):
+        update_output(f'There is no mzml_directory in {directory}. Please extract the .mzml files from the .wiff files first.\n')
+        return results
+
+    # The integral of every scan (for the per-scan export and the bootstrap) is kept by main() as it integrates each file, so it costs no extra pass over the files
+    scan_data = {} if export_scan_integrals or bootstrap_resamples > 0 else None
+
+    # Execute the main function, which computes photofragmentation efficiency and writes the data to a file
+    results['photofragmentation_efficiency'] = main(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file_name, update_output=update_output,
+                                                    integration_method=integration_method, workers=workers, profile_file=profile_file, executor=executor,
+                                                    progress_callback=stage_progress('Integrating mzml files'), cancel_event=cancel_event, scan_data=scan_data)
+
+    # The per-scan integrals and the bootstrap are written next to the photofragmentation efficiency file
+    if results['photofragmentation_efficiency'] is None or is_cancelled():
+        scan_data = None
+    else:
+        output_stem = os.path.splitext(results['photofragmentation_efficiency'])[0]
+        integration_windows = [base_peak_range] + fragment_ion_ranges
+
+    if export_scan_integrals and scan_data is not None:
+        try:
+            results['scan_integrals'] = write_scan_integrals(f'{output_stem}_scan_integrals.npz', scan_data, integration_windows, integration_method=integration_method, update_output=update_output)
+        except Exception as e:
+            update_output(f'A problem was encountered when writing the per-scan integrals:\n{e}\nTraceback: {traceback.format_exc()}\n')
+
+    # Confidence intervals from resampling the scans of each wavelength
+    if bootstrap_resamples > 0 and scan_data is not None:
+        update_output(f'User has requested bootstrap confidence intervals. Resampling the scans of every wavelength {bootstrap_resamples} times now...\n\n')
+        try:
+            results['bootstrap'] = bootstrap_analysis(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file_name, f'{output_stem}_bootstrap.csv',
+                                                      resamples=bootstrap_resamples, integration_method=integration_method, scan_data=scan_data, update_output=update_output)
+        except Exception as e:
+            update_output(f'A problem was encountered when calculating the bootstrap confidence intervals:\n{e}\nTraceback: {traceback.format_exc()}\n')
+
+    # Prints mass spectra to a file if user requests raw data
+    if print_raw_data and not is_cancelled():
+        update_output('User has requested generation of raw data. Exporting mass spectra now...\n\n')
+
+        rawdata_file_stem = 'Raw_data_sparse' if raw_data_format == 'sparse' else 'Raw_data'
+        rawdata_file_name = os.path.join(directory,f'{rawdata_file_stem}{RAW_DATA_FORMATS[raw_data_format]}')
+
+        #mechanism to prevent overwriting existing output files
+        index = 0
+
+        while os.path.exists(rawdata_file_name):
+            index += 1
+            rawdata_file_name = os.path.join(directory,f'{rawdata_file_stem}_{index}{RAW_DATA_FORMATS[raw_data_format]}')
+
+        parent_mz = round(sum(base_peak_range) / 2, 2)  # get parent mass - needed for the upper end of mz window for interpolation
+        results['raw_data'] = extract_RawData(mzml_directory, parent_mz, rawdata_file_name, update_output=update_output,
+                                              progress_callback=stage_progress('Exporting raw data'), cancel_event=cancel_event, output_format=raw_data_format, include_stdev=raw_data_stdev)
+
+    run_time = round((time.time() - start_time)/60,1)
+
+    if is_cancelled():
+        update_output(f'UVPD photofragmentation efficiency calculation was cancelled after {run_time} minutes.\n\n')
+    else:
+        update_output(f'UVPD photofragmentation efficiency calculation has completed in {run_time} minutes.\n\n')
+
+    return results
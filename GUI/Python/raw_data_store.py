@@ -0,0 +1,87 @@
+import os, json, time
+import numpy as np
+
+#Memory-mapped raw data store, written by extract_RawData with output_format='mmap' (see workflows.py).
+#Raw_data.npy holds the averaged spectra as a (wavelength x m/z) float64 matrix, and Raw_data.json next to it holds the axes and the details of the export.
+#Opening a store only reads the .json and maps the .npy, so a slice (one wavelength, or an m/z range at every wavelength) only reads the part of the file it needs.
+#   from Python.raw_data_store import open_raw_data, action_spectrum
+#   store = open_raw_data('D:/SampleData/Raw_data.npy')
+#   wavelengths, intensity = action_spectrum(store, 54.5, 57.0)
+RAW_DATA_STORE_VERSION = 1
+
+def metadata_path(spectra_file):
+    '''Returns the path of the metadata (.json) file of a raw data store. Usage is: path of the .npy file.'''
+    return f'{os.path.splitext(spectra_file)[0]}.json'
+
+def write_raw_data_metadata(spectra_file, wavelengths, wavelength_titles, mz_min, mz_max, mz_points, parent_mz, mzml_files, stdev_file=None):
+    '''Writes the metadata of a raw data store next to its .npy file. Usage is:
+    path of the .npy file, list of wavelengths (nm), their titles (e.g. '400nm'), the first and last m/z of the grid and its number of points, the m/z of the parent ion,
+    the mzml file of each wavelength, and the path of the .npy file of standard deviations (if there is one).
+    '''
+    metadata = {
+        'version': RAW_DATA_STORE_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'spectra_file': os.path.basename(spectra_file),
+        'stdev_file': None if stdev_file is None else os.path.basename(stdev_file),
+        'wavelengths': [float(wavelength) for wavelength in wavelengths],
+        'wavelength_titles': list(wavelength_titles),
+        'mz_min': float(mz_min),
+        'mz_max': float(mz_max),
+        'mz_points': int(mz_points),
+        'parent_mz': float(parent_mz),
+        'mzml_files': list(mzml_files),
+    }
+
+    with open(metadata_path(spectra_file), 'w') as file:
+        json.dump(metadata, file, indent=1)
+
+def open_raw_data(spectra_file):
+    '''Opens a raw data store without reading the spectra into memory. Usage is: path of the .npy file (or its .json).
+    Returns a dictionary with 'spectra' (memory-mapped wavelength x m/z matrix), 'stdev' (the same for the standard deviations, or None), 'wavelengths' and 'mz' (the axes), and 'metadata'.
+    '''
+    spectra_file = f'{os.path.splitext(spectra_file)[0]}.npy'
+
+    with open(metadata_path(spectra_file), 'r') as file:
+        metadata = json.load(file)
+
+    if metadata.get('version') != RAW_DATA_STORE_VERSION:
+        raise ValueError(f'{metadata_path(spectra_file)} is not a raw data store that this version can read (version {metadata.get("version")}).')
+
+    directory = os.path.dirname(spectra_file)
+    spectra = np.load(spectra_file, mmap_mode='r')
+    stdev = None if metadata['stdev_file'] is None else np.load(os.path.join(directory, metadata['stdev_file']), mmap_mode='r')
+
+    #the grid is rebuilt exactly as extract_RawData built it
+    mz = np.round(np.linspace(metadata['mz_min'], metadata['mz_max'], metadata['mz_points']), 2)
+    wavelengths = np.array(metadata['wavelengths'])
+
+    if spectra.shape != (len(wavelengths), len(mz)):
+        raise ValueError(f'{spectra_file} has shape {spectra.shape}, but its metadata describes {len(wavelengths)} wavelengths and {len(mz)} m/z points.')
+
+    return {'spectra': spectra, 'stdev': stdev, 'wavelengths': wavelengths, 'mz': mz, 'metadata': metadata}
+
+def wavelength_index(store, wavelength):
+    '''Returns the row of a wavelength in a raw data store (the closest one that was measured). Usage is: store from open_raw_data, wavelength in nm.'''
+    return int(np.argmin(np.abs(store['wavelengths'] - wavelength)))
+
+def mz_range_columns(store, lower_mz, upper_mz):
+    '''Returns the slice of m/z columns from lower_mz to upper_mz (inclusive) in a raw data store. Usage is: store from open_raw_data, lower and upper m/z.'''
+    return slice(int(np.searchsorted(store['mz'], lower_mz, side='left')), int(np.searchsorted(store['mz'], upper_mz, side='right')))
+
+def wavelength_spectrum(store, wavelength, stdev=False):
+    '''Returns the m/z axis and the averaged spectrum (or its standard deviation, with stdev) at one wavelength. Usage is: store from open_raw_data, wavelength in nm.'''
+    values = store['stdev'] if stdev else store['spectra']
+    return store['mz'], np.array(values[wavelength_index(store, wavelength)])
+
+def mz_slice(store, lower_mz, upper_mz, stdev=False):
+    '''Returns the m/z points from lower_mz to upper_mz, and the (wavelength x m/z) block of spectra (or standard deviations, with stdev) over that range. Usage is: store from open_raw_data, lower and upper m/z.'''
+    columns = mz_range_columns(store, lower_mz, upper_mz)
+    values = store['stdev'] if stdev else store['spectra']
+    return store['mz'][columns], np.array(values[:, columns])
+
+def action_spectrum(store, lower_mz, upper_mz):
+    '''Returns the wavelengths and the intensity integrated (trapezoid rule) from lower_mz to upper_mz at each of them, e.g. the action spectrum of one fragment. Usage is:
+    store from open_raw_data, lower and upper m/z of the window.
+    '''
+    mz, values = mz_slice(store, lower_mz, upper_mz)
+    return store['wavelengths'], np.trapz(values, x=mz, axis=1)
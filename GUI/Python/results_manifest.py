@@ -0,0 +1,96 @@
+import os, json
+import numpy as np
+
+#The results manifest stores the integrations of every mzml file of a dataset, so that a rerun only integrates files (or windows) that are new or have changed.
+#It is written next to photofragmentation_efficiency.csv after every file, so an interrupted run picks up where it stopped.
+#Layout: {'version': 1, 'files': {mzml file name: {'fingerprint': [size, mtime_ns], 'windows': {window key: [average integration, stdev]}}}}
+#Runs that keep the integral of every scan (for the per-scan export or the bootstrap) also store 'scans': {window key: [integral of each scan]} and 'scan_start_times': [minutes] in the entry of each file.
+RESULTS_MANIFEST_NAME = 'photofragmentation_manifest.json'
+RESULTS_MANIFEST_VERSION = 1
+
+def manifest_path(directory):
+    '''Returns the path of the results manifest of a directory of mzml files (stored next to photofragmentation_efficiency.csv). Usage is: directory containing mzml files.'''
+    return os.path.join(os.path.dirname(directory), RESULTS_MANIFEST_NAME)
+
+def file_fingerprint(mzml_path):
+    '''Returns [size, modification time in ns] of a file - if either changes, its stored integrations are no longer used. Usage is: path to mzml file.'''
+    file_stats = os.stat(mzml_path)
+    return [file_stats.st_size, file_stats.st_mtime_ns]
+
+def window_key(integration_window, integration_method):
+    '''Returns the key that the integration of a window is stored under. Usage is: [lower, upper] integration bounds, integration method ('grid' or 'raw').'''
+    return f'{integration_method}:{float(integration_window[0])!r}:{float(integration_window[1])!r}'
+
+def load_manifest(directory):
+    '''Returns the results manifest of a directory of mzml files, or an empty manifest if there is none (or it can't be read). Usage is: directory containing mzml files.'''
+    try:
+        with open(manifest_path(directory), 'r') as file:
+            manifest = json.load(file)
+
+    except (OSError, ValueError): #a missing or corrupted manifest just means everything is integrated again
+        return {'version': RESULTS_MANIFEST_VERSION, 'files': {}}
+
+    if not isinstance(manifest, dict) or manifest.get('version') != RESULTS_MANIFEST_VERSION or not isinstance(manifest.get('files'), dict):
+        return {'version': RESULTS_MANIFEST_VERSION, 'files': {}}
+
+    return manifest
+
+def save_manifest(directory, manifest):
+    '''Writes the results manifest of a directory of mzml files. The manifest is written to a temporary file first, so a crash never leaves a half written manifest behind. Usage is:
+    directory containing mzml files, manifest dictionary (from load_manifest).
+    '''
+    path = manifest_path(directory)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file)
+
+    os.replace(temp_path, path)
+
+def cached_integrations(manifest, directory, mzml_file, integration_windows, integration_method):
+    '''Returns the stored [average integration, stdev] of every window for an mzml file, with None for windows that have to be integrated (all of them if the file has changed). Usage is:
+    manifest dictionary, directory containing mzml files, name of mzml file, list of integration bounds [[lower, upper], ...], integration method.
+    '''
+    entry = manifest['files'].get(mzml_file)
+    if entry is None or entry.get('fingerprint') != file_fingerprint(os.path.join(directory, mzml_file)):
+        return [None] * len(integration_windows)
+
+    return [entry['windows'].get(window_key(integration_window, integration_method)) for integration_window in integration_windows]
+
+def cached_scan_integrations(manifest, directory, mzml_file, integration_windows, integration_method):
+    '''Returns the stored integrals of every scan of an mzml file as a dictionary with the (scans x windows) 'integrations' and the 'scan_start_times' (see integrate_mzml_file in workflows.py),
+    or None if they are not stored for every window (or the file has changed). Usage is: as cached_integrations.
+    '''
+    entry = manifest['files'].get(mzml_file)
+    if entry is None or 'scans' not in entry or entry.get('fingerprint') != file_fingerprint(os.path.join(directory, mzml_file)):
+        return None
+
+    keys = [window_key(integration_window, integration_method) for integration_window in integration_windows]
+    if any(key not in entry['scans'] for key in keys):
+        return None
+
+    #json has no nan, so missing start times are stored as null
+    integrations = np.array([entry['scans'][key] for key in keys], dtype=float).reshape(len(keys), -1).T
+    scan_start_times = np.array([np.nan if time is None else time for time in entry['scan_start_times']], dtype=float)
+    return {'integrations': integrations, 'scan_start_times': scan_start_times}
+
+def store_integrations(manifest, directory, mzml_file, integration_windows, integrated_peaks, integration_method, scans=None):
+    '''Adds the integrations of an mzml file to the manifest. The integrations of other windows are kept as long as the file has not changed. Usage is:
+    manifest dictionary, directory containing mzml files, name of mzml file, list of integration bounds, list of [average integration, stdev] for each window, integration method,
+    and optionally the integrals of every scan (see cached_scan_integrations).
+    '''
+    fingerprint = file_fingerprint(os.path.join(directory, mzml_file))
+    entry = manifest['files'].get(mzml_file)
+
+    if entry is None or entry.get('fingerprint') != fingerprint:
+        entry = {'fingerprint': fingerprint, 'windows': {}}
+        manifest['files'][mzml_file] = entry
+
+    for integration_window, integrated_peak in zip(integration_windows, integrated_peaks):
+        entry['windows'][window_key(integration_window, integration_method)] = [float(integrated_peak[0]), float(integrated_peak[1])]
+
+    if scans is not None:
+        entry.setdefault('scans', {})
+        for j, integration_window in enumerate(integration_windows):
+            entry['scans'][window_key(integration_window, integration_method)] = [float(value) for value in scans['integrations'][:, j]]
+        entry['scan_start_times'] = [None if np.isnan(time) else float(time) for time in scans['scan_start_times']]
@@ -0,0 +1,74 @@
+import os, re, sys
+import numpy as np
+from Python.workflows import integrate_mzml_file
+
+#The integral of every window in every scan, kept for quality control: drift during a wavelength, dropouts, and outlier scans can be looked at without parsing the mzml files again.
+#   from Python.scan_integrals import load_scan_integrals
+#   scans = load_scan_integrals('D:/SampleData/photofragmentation_efficiency_scan_integrals.npz')
+#   scans['integrals'][wavelength, scan, window], scans['scan_start_times'][wavelength, scan]
+#Wavelengths with fewer scans than the longest one are padded with nan.
+#During an analysis, main() keeps the integrals of every scan as it integrates each file (scan_data), so they cost no extra pass over the files.
+#collect_scan_integrals is for integrating them on their own, outside of an analysis.
+
+def collect_scan_integrals(directory, integration_windows, parent_mz, integration_method='grid', update_output=None, progress_callback=None, cancel_event=None):
+    '''Integrates every window in every scan of every mzml file in directory, and reads the start time of every scan. Usage is:
+    directory containing mzml files, list of integration bounds [[lower, upper], ...] (base peak first), the m/z of the parent ion, and the integration method ('grid' or 'raw', as for the analysis).
+    progress_callback (optional) is called as progress_callback(files done, total files), and it stops between files once cancel_event (a threading.Event) is set.
+    Returns a dictionary with 'mzml_files', 'wavelengths', 'integrations' (a (scans x windows) array per file), and 'scan_start_times' (an array per file, nan where the file has none), or None if it was cancelled.
+    main() fills in the same dictionary during an analysis (see its scan_data argument).
+    '''
+    if update_output is None:
+        update_output = lambda text: sys.__stdout__.write(text)
+
+    mzml_files = sorted([f for f in os.listdir(directory) if f.endswith('.mzML')])
+    scan_data = {'mzml_files': mzml_files, 'wavelengths': np.empty(len(mzml_files), dtype=float), 'integrations': [], 'scan_start_times': []}
+
+    for i, mzml_file in enumerate(mzml_files):
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+
+        try:
+            scan_data['wavelengths'][i] = float(re.findall(r'\d+', mzml_file.split('Laser')[-1])[-1])
+        except IndexError:
+            update_output(f'Could not extract the wavelength from {mzml_file}. Does the filename contain the text: "Laser"?\n')
+            raise
+
+        scans = integrate_mzml_file(directory, mzml_file, integration_windows, parent_mz, update_output=update_output, integration_method=integration_method, keep_scans=True)[1]
+
+        scan_data['integrations'].append(scans['integrations'])
+        scan_data['scan_start_times'].append(scans['scan_start_times'])
+
+        if progress_callback is not None:
+            progress_callback(i + 1, len(mzml_files))
+
+    return scan_data
+
+def write_scan_integrals(output_file, scan_data, integration_windows, integration_method='grid', update_output=None):
+    '''Writes the integrals of every scan to a compressed .npz. Usage is: path of the .npz, scan_data from main() (or collect_scan_integrals), the integration windows (base peak first), and the integration method.
+    The file holds 'integrals' (wavelength x scan x window), 'scan_start_times' (wavelength x scan, minutes), 'scan_counts', 'wavelengths', 'windows' (window x [lower, upper]), 'mzml_files', and 'integration_method'.
+    '''
+    scan_counts = np.array([len(integrations) for integrations in scan_data['integrations']], dtype=np.int64)
+    max_scans = int(np.max(scan_counts, initial=0))
+
+    #wavelengths with fewer scans are padded with nan, so the scans of every wavelength line up from the first one
+    integrals = np.full((len(scan_counts), max_scans, len(integration_windows)), np.nan)
+    scan_start_times = np.full((len(scan_counts), max_scans), np.nan)
+    for i, (integrations, times) in enumerate(zip(scan_data['integrations'], scan_data['scan_start_times'])):
+        integrals[i, :len(integrations)] = integrations
+        scan_start_times[i, :len(times)] = times
+
+    np.savez_compressed(output_file, integrals=integrals, scan_start_times=scan_start_times, scan_counts=scan_counts, wavelengths=scan_data['wavelengths'],
+                        windows=np.asarray(integration_windows, dtype=float), mzml_files=np.array(scan_data['mzml_files']), integration_method=np.array(integration_method))
+
+    if update_output is not None:
+        update_output(f'The integrals of {int(np.sum(scan_counts)):,} scans ({len(scan_counts)} wavelengths x up to {max_scans} scans x {len(integration_windows)} windows) have been written to {output_file}\n\n')
+
+    return output_file
+
+def load_scan_integrals(scan_integrals_file):
+    '''Reads a file written by write_scan_integrals into a dictionary of arrays (see write_scan_integrals for the keys). Usage is: path of the .npz.'''
+    with np.load(scan_integrals_file) as data:
+        scan_integrals = {key: data[key] for key in data.files}
+
+    scan_integrals['integration_method'] = str(scan_integrals['integration_method'])
+    return scan_integrals
@@ -0,0 +1,163 @@
+import os, shutil, hashlib
+import numpy as np
+from contextlib import contextmanager
+
+#Decoding mzml files (XML + base64) is the slowest part of an analysis, so the decoded m/z and intensity arrays are kept on disk between runs.
+#Each cached file is a directory holding flat .npy arrays (m/z, intensity, and scan offsets) that are opened memory-mapped.
+#Entries are keyed by the path, size and modification time of the mzml file, so a changed file is never read from the cache.
+SPECTRAL_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.uvpd_analysis_cache', 'spectra')
+SPECTRAL_CACHE_MAX_BYTES = 2 * 1024**3 #least recently used entries are evicted beyond this size. Set to 0 to disable the cache.
+
+_cached_arrays = ('mz', 'intensity', 'offsets')
+_cache_bytes = None #running estimate of the size of the cache, so that the cache directory is only scanned when it might be over its limit
+
+def configure_spectral_cache(directory=None, max_bytes=None):
+    '''Changes where the spectral cache is stored and/or its maximum size in bytes. Usage is:
+    cache directory, maximum size of the cache in bytes (0 disables the cache). Arguments left as None are not changed.
+    '''
+    global SPECTRAL_CACHE_DIRECTORY, SPECTRAL_CACHE_MAX_BYTES, _cache_bytes
+
+    if directory is not None:
+        SPECTRAL_CACHE_DIRECTORY = directory
+        _cache_bytes = None
+
+    if max_bytes is not None:
+        SPECTRAL_CACHE_MAX_BYTES = int(max_bytes)
+
+        #shrink the cache straight away if the new limit is lower
+        evict_spectral_cache()
+
+@contextmanager
+def spectral_cache_disabled():
+    '''Turns the spectral cache off inside a with block (without deleting any entries), e.g. so that a file can be profiled from a cold start. Usage is: with spectral_cache_disabled(): ...'''
+    global SPECTRAL_CACHE_MAX_BYTES
+
+    max_bytes = SPECTRAL_CACHE_MAX_BYTES
+    SPECTRAL_CACHE_MAX_BYTES = 0
+    try:
+        yield
+    finally:
+        SPECTRAL_CACHE_MAX_BYTES = max_bytes
+
+def cache_key(mzml_path):
+    '''Returns the cache key of an mzml file, built from its absolute path, size, and modification time. Usage is: path to mzml file.'''
+    file_stats = os.stat(mzml_path)
+    key = f'{os.path.abspath(mzml_path)}|{file_stats.st_size}|{file_stats.st_mtime_ns}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def read_cached_spectra(mzml_path):
+    '''Returns the cached spectra of an mzml file as a dictionary of memory-mapped arrays ('mz', 'intensity', 'offsets'), or None if the file is not in the cache (or has changed). Usage is:
+    path to mzml file.
+    '''
+    if SPECTRAL_CACHE_MAX_BYTES <= 0:
+        return None
+
+    entry_directory = os.path.join(SPECTRAL_CACHE_DIRECTORY, cache_key(mzml_path))
+    if not os.path.isdir(entry_directory):
+        return None
+
+    try:
+        spectra = {name: np.load(os.path.join(entry_directory, f'{name}.npy'), mmap_mode='r') for name in _cached_arrays}
+
+    except (OSError, ValueError): #a partially written or corrupted entry is treated as a cache miss
+        return None
+
+    #mark the entry as recently used
+    try:
+        os.utime(entry_directory)
+    except OSError:
+        pass
+
+    return spectra
+
+def write_cached_spectra(mzml_path, spectra):
+    '''Stores the spectra of an mzml file in the cache, then evicts the least recently used entries if the cache is over its size limit. Usage is:
+    path to mzml file, and dictionary of spectra from load_spectra.
+    Failing to write to the cache is never fatal - the analysis just carries on without it.
+    '''
+    global _cache_bytes
+
+    if SPECTRAL_CACHE_MAX_BYTES <= 0:
+        return
+
+    try:
+        key = cache_key(mzml_path)
+        entry_directory = os.path.join(SPECTRAL_CACHE_DIRECTORY, key)
+        if os.path.isdir(entry_directory):
+            return
+
+        #write to a temporary directory first, so that other readers never see a half written entry
+        os.makedirs(SPECTRAL_CACHE_DIRECTORY, exist_ok=True)
+        temp_directory = os.path.join(SPECTRAL_CACHE_DIRECTORY, f'{key}.{os.getpid()}.tmp')
+        os.makedirs(temp_directory, exist_ok=True)
+
+        for name in _cached_arrays:
+            np.save(os.path.join(temp_directory, f'{name}.npy'), np.ascontiguousarray(spectra[name]))
+
+        try:
+            os.replace(temp_directory, entry_directory)
+        except OSError: #another process has written the same entry in the meantime
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            return
+
+    except OSError:
+        return
+
+    if _cache_bytes is None:
+        _cache_bytes = sum(size for _, size, _ in spectral_cache_entries())
+    else:
+        _cache_bytes += sum(np.asarray(spectra[name]).nbytes for name in _cached_arrays)
+
+    if _cache_bytes > SPECTRAL_CACHE_MAX_BYTES:
+        evict_spectral_cache(keep=key)
+
+def spectral_cache_entries():
+    '''Returns a list of (last used time, size in bytes, path) for every entry in the cache, least recently used first.'''
+    entries = []
+    if not os.path.isdir(SPECTRAL_CACHE_DIRECTORY):
+        return entries
+
+    for name in os.listdir(SPECTRAL_CACHE_DIRECTORY):
+        entry_directory = os.path.join(SPECTRAL_CACHE_DIRECTORY, name)
+        if name.endswith('.tmp') or not os.path.isdir(entry_directory):
+            continue
+
+        try:
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_directory))
+            entries.append((os.stat(entry_directory).st_mtime, size, entry_directory))
+        except OSError:
+            continue
+
+    return sorted(entries)
+
+def evict_spectral_cache(keep=None):
+    '''Deletes the least recently used cache entries until the cache fits within SPECTRAL_CACHE_MAX_BYTES. Usage is:
+    cache key of an entry that should never be evicted (e.g. the one that was just written).
+    '''
+    global _cache_bytes
+
+    entries = spectral_cache_entries()
+    total_bytes = sum(size for _, size, _ in entries)
+
+    for _, size, entry_directory in entries:
+        if total_bytes <= SPECTRAL_CACHE_MAX_BYTES:
+            break
+
+        if os.path.basename(entry_directory) == keep:
+            continue
+
+        #entries that are still memory-mapped can't be deleted on Windows - skip them and try again next time
+        try:
+            shutil.rmtree(entry_directory)
+            total_bytes -= size
+        except OSError:
+            continue
+
+    _cache_bytes = total_bytes
+
+def clear_spectral_cache():
+    '''Deletes every entry in the spectral cache.'''
+    global _cache_bytes
+
+    shutil.rmtree(SPECTRAL_CACHE_DIRECTORY, ignore_errors=True)
+    _cache_bytes = None
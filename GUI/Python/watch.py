@@ -0,0 +1,176 @@
+import os, re, sys, time, traceback
+import numpy as np
+from Python.workflows import integrate_windows
+from Python.results_manifest import load_manifest, save_manifest, cached_integrations, store_integrations, file_fingerprint
+from Python.main import efficiency_table
+from Python.pipeline import run_analysis
+
+#Watch mode: integrates each mzml file as soon as it has been completely written during an acquisition, and keeps a live photofragmentation efficiency table up to date.
+#The integrations go into the results manifest (see results_manifest.py), so the final run at the end of the acquisition only has to load them.
+WATCH_POLL_INTERVAL = 2.0 #seconds between looks at the mzml directory
+LIVE_TABLE_NAME = 'photofragmentation_efficiency_live.csv'
+
+_closing_tags = (b'</indexedmzML>', b'</mzML>')
+
+def mzml_is_complete(mzml_path):
+    '''Returns True if an mzml file ends with its closing tag, i.e. the writer (msconvert or an export) has finished with it. Usage is: path to mzml file.'''
+    try:
+        with open(mzml_path, 'rb') as file:
+            file.seek(max(os.path.getsize(mzml_path) - 512, 0))
+            tail = file.read()
+
+    except OSError: #e.g. still locked by the writer on Windows
+        return False
+
+    return any(tag in tail for tag in _closing_tags)
+
+def find_complete_files(directory, last_fingerprints, done_fingerprints):
+    '''Returns the mzml files in directory that are ready to be integrated: complete (see mzml_is_complete), the same size and modification time as at the previous look, and not integrated yet in their current state. Usage is:
+    directory containing mzml files, {mzml file: fingerprint} from the previous look (updated in place), and {mzml file: fingerprint} of the files already integrated.
+    '''
+    ready = []
+    for mzml_file in sorted(f for f in os.listdir(directory) if f.endswith('.mzML')):
+        try:
+            fingerprint = file_fingerprint(os.path.join(directory, mzml_file))
+        except OSError: #deleted or renamed in the meantime
+            continue
+
+        #a file is only trusted once it has stopped changing between two looks
+        stable = last_fingerprints.get(mzml_file) == fingerprint
+        last_fingerprints[mzml_file] = fingerprint
+
+        if stable and done_fingerprints.get(mzml_file) != fingerprint and mzml_is_complete(os.path.join(directory, mzml_file)):
+            ready.append(mzml_file)
+
+    return ready
+
+def write_live_table(output_file, integrations, frag_mz, laser_data=None, update_output=None):
+    '''Writes the photofragmentation efficiencies of the files integrated so far, sorted by wavelength. Usage is:
+    path of the .csv file, {wavelength: integrated peaks of the file (base peak first)}, m/z of each fragment, and the laser power data (structured array with Wavelength, LaserPower, PowerStdDev; None to skip the normalization).
+    The laser power of each file is looked up by its wavelength, since the row order of the power data file is only known once every file is there. The table is replaced in one step, so it can be opened at any time.
+    '''
+    wavelengths = np.array(sorted(integrations), dtype=float)
+    peaks = np.array([integrations[wavelength] for wavelength in sorted(integrations)], dtype=float)
+
+    laser_power = laser_power_stdev = None
+    if laser_data is not None:
+        rows = [np.flatnonzero(np.isclose(laser_data['Wavelength'], wavelength)) for wavelength in wavelengths]
+        laser_power = np.array([laser_data['LaserPower'][row[0]] if len(row) else np.nan for row in rows], dtype=float)
+        laser_power_stdev = np.array([laser_data['PowerStdDev'][row[0]] if len(row) else np.nan for row in rows], dtype=float)
+
+    PE_data, column_names = efficiency_table(wavelengths, peaks[:, 0], peaks[:, 1:], frag_mz, laser_power, laser_power_stdev, update_output=update_output)
+
+    temp_file = f'{output_file}.{os.getpid()}.tmp'
+    np.savetxt(temp_file, PE_data, delimiter=',', fmt='%.6f', header=','.join(column_names), comments='')
+    os.replace(temp_file, output_file)
+
+def watch_directory(directory, base_peak_range, fragment_ion_ranges, power_data_file_name=None, integration_method='grid', expected_files=None, idle_timeout=None, poll_interval=WATCH_POLL_INTERVAL,
+                    update_output=None, progress_callback=None, cancel_event=None, **settings):
+    '''Watches the mzml_directory of directory during an acquisition, integrates each mzml file as soon as it is complete, and rewrites LIVE_TABLE_NAME next to it after every file. Usage is:
+    directory containing the mzml_directory (which may still be empty), base peak range, fragment ion ranges, power data .csv file (None to skip the normalization), and integration method,
+    the number of files to wait for (default: the number of rows in the power data file, or until stopped), the seconds to wait without a new file before stopping (None waits forever), and the seconds between looks.
+    Stops once expected_files have been integrated or have failed, after idle_timeout, or when cancel_event (a threading.Event) is set. A file that fails is reported and counted, and is tried again if it is rewritten.
+    If every expected file was integrated, the full analysis (run_analysis, with the other settings given) is then run to write photofragmentation_efficiency.csv (and the raw data, if requested),
+    which loads the integrations from the results manifest instead of integrating again.
+    Returns a dictionary with the number of files integrated ('integrated'), the files that could not be integrated ('failed'), the path of the live table ('live_table'),
+    and the results of the final run_analysis ('results', None if it was not run).
+    '''
+    if update_output is None:
+        update_output = lambda text: sys.__stdout__.write(text)
+
+    mzml_directory = os.path.join(directory, 'mzml_directory')
+    os.makedirs(mzml_directory, exist_ok=True)
+    live_table = os.path.join(directory, LIVE_TABLE_NAME)
+    watch_results = {'integrated': 0, 'failed': [], 'live_table': None, 'results': None}
+
+    laser_data = None
+    if power_data_file_name is not None:
+        laser_data = np.atleast_1d(np.genfromtxt(power_data_file_name, delimiter=',', dtype=None, names=['Wavelength', 'LaserPower', 'PowerStdDev'], encoding=None))
+        if expected_files is None:
+            expected_files = len(laser_data)
+
+    integration_windows = [base_peak_range] + fragment_ion_ranges #The base peak is the first window
+    parent_mz = np.round(np.average(base_peak_range), 2)
+    frag_mz = [np.round(np.average(frag_ion_range), 0) for frag_ion_range in fragment_ion_ranges]
+
+    manifest = load_manifest(mzml_directory)
+    integrations = {} #wavelength: integrated peaks
+    last_fingerprints = {}
+    done_fingerprints = {}
+    failed_files = {} #mzml file: why it could not be integrated (until it is rewritten and integrates)
+    last_new_file_time = time.time()
+
+    update_output(f'Watching {mzml_directory} for new mzml files' + (f' (waiting for {expected_files} files)' if expected_files else '') + '. The live photofragmentation efficiency table is written to ' + live_table + '\n\n')
+
+    try:
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                update_output(f'Watching was stopped after {len(integrations)} files.\n')
+                break
+
+            for mzml_file in find_complete_files(mzml_directory, last_fingerprints, done_fingerprints):
+                try:
+                    wavelength = float(re.findall(r'\d+', mzml_file.split('Laser')[-1])[-1])
+                except IndexError:
+                    update_output(f'Could not extract the wavelength from {mzml_file}. Does the filename contain the text: "Laser"? It has been skipped.\n')
+                    failed_files[mzml_file] = 'no wavelength in the file name'
+                    done_fingerprints[mzml_file] = last_fingerprints[mzml_file]
+                    continue
+
+                #files that were integrated before the watch started (e.g. it was restarted) come straight from the results manifest
+                integrated_peaks = cached_integrations(manifest, mzml_directory, mzml_file, integration_windows, integration_method)
+                try:
+                    if any(peak is None for peak in integrated_peaks):
+                        mzml_start_time = time.time()
+                        integrated_peaks = integrate_windows(mzml_directory, mzml_file, integration_windows, parent_mz, update_output=update_output, integration_method=integration_method)
+                        store_integrations(manifest, mzml_directory, mzml_file, integration_windows, integrated_peaks, integration_method)
+                        save_manifest(mzml_directory, manifest)
+                        update_output(f'Integration for {wavelength:.0f}nm has completed in {time.time() - mzml_start_time:.2f} seconds.\n')
+                    else:
+                        update_output(f'Integration for {wavelength:.0f}nm has been loaded from the results manifest.\n')
+
+                    integrations[wavelength] = [[float(value) for value in peak] for peak in integrated_peaks]
+                    failed_files.pop(mzml_file, None)
+                    write_live_table(live_table, integrations, frag_mz, laser_data, update_output=update_output)
+                    watch_results['live_table'] = live_table
+
+                #a bad file is reported (so problems show up during the acquisition) without stopping the watch
+                except Exception as e:
+                    update_output(f'Problem encountered when integrating {mzml_file}:\n{e}\nTraceback: {traceback.format_exc()}\n')
+                    failed_files[mzml_file] = str(e)
+
+                done_fingerprints[mzml_file] = last_fingerprints[mzml_file]
+                last_new_file_time = time.time()
+                watch_results['integrated'] = len(integrations)
+
+                if progress_callback is not None:
+                    progress_callback('Watching for mzml files', len(integrations) + len(failed_files), max(expected_files or 0, len(integrations) + len(failed_files)))
+
+            #files that failed count towards the expected files too, otherwise the watch would wait for them forever
+            if expected_files is not None and len(integrations) + len(failed_files) >= expected_files:
+                if len(failed_files) == 0:
+                    update_output(f'All {expected_files} expected mzml files have been integrated.\n\n')
+                else:
+                    update_output(f'All {expected_files} expected mzml files have arrived, but {len(failed_files)} could not be integrated:\n'
+                                  + '\n'.join(f'{mzml_file}: {error}' for mzml_file, error in sorted(failed_files.items()))
+                                  + '\nThe photofragmentation efficiency will not be calculated from an incomplete set of files. Fix or replace them and run the analysis again.\n\n')
+                break
+
+            if idle_timeout is not None and time.time() - last_new_file_time > idle_timeout:
+                update_output(f'No new mzml files for {idle_timeout} seconds - watching has stopped after {len(integrations)} files.\n')
+                break
+
+            time.sleep(poll_interval)
+
+    except KeyboardInterrupt:
+        update_output(f'Watching was stopped after {len(integrations)} files.\n')
+
+    watch_results['failed'] = sorted(failed_files)
+
+    #the final table (and raw data, if requested) once everything has arrived; the integrations are all in the results manifest by now
+    if expected_files is not None and len(integrations) >= expected_files and len(failed_files) == 0 and not (cancel_event is not None and cancel_event.is_set()):
+        settings.pop('extract_mzml_from_wiff', None)
+        watch_results['results'] = run_analysis(directory, base_peak_range, fragment_ion_ranges, power_data_file_name, integration_method=integration_method,
+                                                update_output=update_output, progress_callback=progress_callback, cancel_event=cancel_event, **settings)
+
+    return watch_results
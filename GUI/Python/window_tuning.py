@@ -0,0 +1,118 @@
+import os, re, sys, time
+import numpy as np
+from Python.workflows import get_spectra, average_spectra, integrate_cumulative
+from Python.main import efficiency_table
+
+#Interactive tuning of the integration windows (see the "Tune windows" button of the GUI).
+#Every mzml file is read once and all of their scans are kept in memory as one set of spectra with its cumulative integral index (see build_cumulative_index in workflows.py),
+#so moving a window only costs two lookups per scan and window - a few milliseconds for a whole wavelength scan - instead of reading and interpolating every file again.
+#The windows are integrated on the raw profile points (the 'raw' integration method), so the values can differ very slightly from a run with the default 'grid' method.
+TUNING_DISPLAY_STEP = 0.02 #m/z step of the averaged spectrum that is drawn behind the windows
+
+def load_tuning_data(mzml_directory, power_data_file_name=None, update_output=None, progress_callback=None, cancel_event=None):
+    '''Reads every mzml file in mzml_directory once and prepares everything that window_tuning_table needs. Usage is:
+    directory containing mzml files, power data .csv file (None to skip the normalization), and optionally progress_callback(files done, total files) and cancel_event (a threading.Event).
+    Returns a dictionary with the 'mzml_files', their 'wavelengths', the 'spectra' of every scan of every file (one set, with the cumulative integral index), the number of scans of each file ('scan_counts'),
+    the averaged spectrum of all files to draw ('display_mz', 'display_intensity'), and 'laser_power' and 'laser_power_stdev' (None without a power data file). Returns None if loading was cancelled.
+    '''
+    if update_output is None:
+        update_output = lambda text: sys.__stdout__.write(text)
+
+    start_time = time.time()
+
+    #sorted, as in main(), so that the rows line up with the laser power data file
+    mzml_files = sorted([f for f in os.listdir(mzml_directory) if f.endswith('.mzML')])
+    if len(mzml_files) == 0:
+        update_output(f'There are no mzml files in {mzml_directory}.\n')
+        raise FileNotFoundError(f'No mzml files in {mzml_directory}')
+
+    laser_power = None
+    laser_power_stdev = None
+    if power_data_file_name is not None:
+        laser_data = np.atleast_1d(np.genfromtxt(power_data_file_name, delimiter=',', dtype=None, names=['Wavelength', 'LaserPower', 'PowerStdDev'], encoding=None))
+        if len(mzml_files) != len(laser_data):
+            update_output(f'The number of mzml files ({len(mzml_files)}) does not match the number of rows in the laser power data file ({len(laser_data)}).\n')
+            raise ValueError('Laser power data mismatch')
+        laser_power = np.asarray(laser_data['LaserPower'], dtype=float)
+        laser_power_stdev = np.asarray(laser_data['PowerStdDev'], dtype=float)
+
+    wavelengths = np.empty(len(mzml_files), dtype=float)
+    file_spectra = []
+    for i, mzml_file in enumerate(mzml_files):
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+
+        try:
+            wavelengths[i] = float(re.findall(r'\d+', mzml_file.split('Laser')[-1])[-1])
+        except IndexError:
+            update_output(f'Could not extract the wavelength from {mzml_file}. Does the filename contain the text: "Laser"?\n')
+            raise
+
+        file_spectra.append(get_spectra(mzml_directory, mzml_file, update_output=update_output))
+
+        if progress_callback is not None:
+            progress_callback(i + 1, len(mzml_files))
+
+    #one set of spectra for every scan of every file; the cumulative integral restarts with each scan, so the files can simply be put one after the other
+    scan_counts = np.array([len(spectra['offsets']) - 1 for spectra in file_spectra])
+    point_counts = np.array([len(spectra['mz']) for spectra in file_spectra])
+    point_starts = np.concatenate([[0], np.cumsum(point_counts)[:-1]])
+    spectra = {
+        'mz': np.concatenate([spectra['mz'] for spectra in file_spectra]),
+        'intensity': np.concatenate([spectra['intensity'] for spectra in file_spectra]),
+        'cumulative': np.concatenate([spectra['cumulative'] for spectra in file_spectra]),
+        'offsets': np.concatenate([[0]] + [spectra['offsets'][1:] + start for spectra, start in zip(file_spectra, point_starts)]),
+    }
+
+    #the spectrum that is drawn: the scans of each file averaged on a common grid, then averaged over the files
+    max_mz = np.ceil(np.max(spectra['mz'], initial=0.)) + 1.
+    display_mz = np.round(np.linspace(0., max_mz, int(max_mz / TUNING_DISPLAY_STEP + 1)), 2)
+    display_intensity = np.zeros(len(display_mz))
+    for mzml_file, file_spectrum in zip(mzml_files, file_spectra):
+        if len(file_spectrum['offsets']) > 1:
+            display_intensity += average_spectra(file_spectrum, display_mz, mzml_file, update_output=update_output)[0]
+    display_intensity /= len(mzml_files)
+
+    update_output(f'{len(mzml_files)} mzml files ({int(np.sum(scan_counts)):,} scans) have been loaded for window tuning in {time.time() - start_time:.2f} seconds.\n')
+
+    return {'mzml_files': mzml_files, 'wavelengths': wavelengths, 'spectra': spectra, 'scan_counts': scan_counts,
+            'display_mz': display_mz, 'display_intensity': display_intensity, 'laser_power': laser_power, 'laser_power_stdev': laser_power_stdev}
+
+def window_integrals(tuning_data, integration_windows):
+    '''Integrates every window in every scan of every file, and averages the scans of each file. Usage is: dictionary from load_tuning_data, list of integration bounds [[lower, upper], ...].
+    Returns a (files x windows x 2) array with the average integration and its stdev, the same values as integrate_windows with the 'raw' method gives for each file.
+    '''
+    integrations = integrate_cumulative(tuning_data['spectra'], integration_windows)
+
+    #mean and (population) stdev of the scans of each file, all files at once; the scans of a file are consecutive rows, so their sums are differences of running sums
+    scan_counts = tuning_data['scan_counts']
+    scan_ends = np.cumsum(scan_counts)
+    file_index = np.repeat(np.arange(len(scan_counts)), scan_counts)
+    counts = np.maximum(scan_counts, 1)[:, None]
+
+    def file_sums(values):
+        running_sums = np.concatenate([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+        return running_sums[scan_ends] - running_sums[scan_ends - scan_counts]
+
+    means = file_sums(integrations) / counts
+    sum_squares = file_sums(np.square(integrations - means[file_index]))
+
+    peaks = np.empty((len(scan_counts), integrations.shape[1], 2))
+    peaks[:, :, 0] = means
+    peaks[:, :, 1] = np.sqrt(sum_squares / counts)
+    peaks[scan_counts == 0] = np.nan #a file without scans has no average, as in integrate_windows
+
+    return peaks
+
+def window_tuning_table(tuning_data, base_peak_range, fragment_ion_ranges):
+    '''Calculates the photofragmentation efficiency table for a set of windows from data loaded with load_tuning_data. Usage is: dictionary from load_tuning_data, base peak range, and fragment ion ranges.
+    Returns the table and its column names (as efficiency_table in main.py does), and the messages about values that could not be calculated.
+    '''
+    peaks = window_integrals(tuning_data, [base_peak_range] + fragment_ion_ranges)
+    frag_mz = [np.round(np.average(frag_ion_range), 0) for frag_ion_range in fragment_ion_ranges]
+
+    #the windows change many times a second while they are dragged, so problems are collected here for the caller to show rather than printed
+    messages = []
+    PE_data, column_names = efficiency_table(tuning_data['wavelengths'], peaks[:, 0], peaks[:, 1:], frag_mz, tuning_data['laser_power'], tuning_data['laser_power_stdev'], update_output=messages.append)
+
+    return PE_data, column_names, messages
@@ -1,27 +1,78 @@
-import os, re, sys, traceback, subprocess
+import os, re, sys, time, traceback, subprocess, base64, mmap, shutil, zipfile, zlib
 import numpy as np
-import pyteomics.mzml as mzml
-import pandas as pd
-from PyQt6.QtWidgets import QApplication
-from io import StringIO
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from Python.spectral_cache import read_cached_spectra, write_cached_spectra, spectral_cache_disabled
+from Python.raw_data_store import write_raw_data_metadata
+from Python.instrumentation import timed_stage, add_counts, reset_stats, get_stats, merge_stats, profile_call
 
-class TextRedirect(StringIO):
-    def __init__(self, textWritten=None, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.update_output = textWritten
+#pyteomics (only needed for mzml files the native reader can't decode) and pandas (only needed for the raw data .csv) are slow to import, so they are imported on first use.
 
-    def write(self, text):
-        super().write(text)
-        self.update_output(text)
+#Decoded spectra (with their cumulative integral index) are kept in memory between runs, so re-integrating the same dataset with new windows does not re-parse it.
+#Least recently used files are dropped once the total number of stored m/z points exceeds this limit (~24 bytes per point, so ~120 MB for the default; see configure_spectra_memory_cache).
+#Each worker process of a shared pool (see batch.py) keeps a cache of its own.
+SPECTRA_MEMORY_CACHE_MAX_POINTS = 5_000_000
+_spectra_memory_cache = OrderedDict()
+_spectra_memory_cache_points = 0 #running total of the m/z points in _spectra_memory_cache
 
-def convert_wiff_to_mzml(wiff_file, directory, mzml_directory, update_output=None):
+#Patterns and controlled vocabulary accessions used by the native indexedmzML reader (read_indexed_mzml)
+_index_list_offset_pattern = re.compile(rb'<indexListOffset>\s*(\d+)\s*</indexListOffset>')
+_spectrum_index_pattern = re.compile(rb'<index\s+name="spectrum"\s*>(.*?)</index>', re.S)
+_offset_pattern = re.compile(rb'<offset\b[^>]*>\s*(\d+)\s*</offset>')
+_binary_data_array_pattern = re.compile(rb'<binaryDataArray\b[^>]*>(.*?)</binaryDataArray>', re.S)
+_accession_pattern = re.compile(rb'accession="(MS:\d+)"')
+_binary_pattern = re.compile(rb'<binary>(.*?)</binary>|<binary\s*/>', re.S)
+_default_array_length_pattern = re.compile(rb'defaultArrayLength="(\d+)"')
+_scan_start_time_pattern = re.compile(rb'<cvParam[^>]*accession="MS:1000016"[^>]*>')
+_value_pattern = re.compile(rb'\svalue="([^"]*)"')
+_unit_name_pattern = re.compile(rb'\sunitName="([^"]*)"')
+
+_float_dtypes = {b'MS:1000523': '<f8', b'MS:1000521': '<f4'} #64-bit float, 32-bit float
+_array_names = {b'MS:1000514': 'mz', b'MS:1000515': 'intensity'} #m/z array, intensity array
+
+#Compressions the native reader decodes: (zlib compressed, MS-Numpress encoding). MS-Numpress positive integer (pic) arrays are left to pyteomics.
+_compressions = {
+    b'MS:1000576': (False, None),     #no compression
+    b'MS:1000574': (True, None),      #zlib compression
+    b'MS:1002312': (False, 'linear'), #MS-Numpress linear prediction compression
+    b'MS:1002314': (False, 'slof'),   #MS-Numpress short logged float compression
+    b'MS:1002746': (True, 'linear'),  #MS-Numpress linear prediction compression followed by zlib compression
+    b'MS:1002748': (True, 'slof'),    #MS-Numpress short logged float compression followed by zlib compression
+}
+
+#Conversion profiles: the options passed to msconvert for each one. All of them are decoded by the native reader (read_indexed_mzml).
+#   default:  uncompressed 64-bit arrays - the largest files, but decoding is only base64 and np.frombuffer
+#   compact:  64-bit m/z and 32-bit intensities, zlib compressed - lossless for the m/z, and the intensities keep ~7 significant digits
+#   numpress: MS-Numpress linear (m/z) and slof (intensity) encodings, zlib compressed - the smallest files; the m/z are kept to ~2e-9 and the intensities to ~1e-4 (relative),
+#             which moves the photofragmentation efficiencies by less than 1e-4 of their largest value (see python -m Python.benchmark --encoding numpress)
+MSCONVERT_PROFILES = {
+    'default': ['--mzML', '--64'],
+    'compact': ['--mzML', '--mz64', '--inten32', '--zlib'],
+    'numpress': ['--mzML', '--numpressLinear', '--numpressSlof', '--zlib'],
+}
+MSCONVERT_OPTIONS = MSCONVERT_PROFILES['default']
+
+#Output formats of the raw data export (extract_RawData) and the file extension each one is written with
+RAW_DATA_FORMATS = {'csv': '.csv', 'sparse': '.csv', 'npz': '.npz', 'mmap': '.npy'}
+RAW_DATA_CSV_CHUNK_ROWS = 50_000 #number of m/z points written to the .csv at a time
+RAW_DATA_STREAM_POINTS = 4_000_000 #interpolated grid points (scans x m/z) held in memory at once when averaging the scans of a file - about 32 MB
+
+def convert_wiff_to_mzml(wiff_file, directory, mzml_directory, update_output=None, conversion_profile='default'):
     ''' Function to convert .wiff files to .mzml using msconvert
-    input is .wiff file, directory that contains .wiff files, and directory to output mzml files to'''
-    
-    # Redirect print outputs to the GUI output window
-    sys.stdout = TextRedirect(textWritten=update_output)
+    input is .wiff file, directory that contains .wiff files, directory to output mzml files to, and the conversion profile (see MSCONVERT_PROFILES)'''
 
     #check if required files are present
+    check_wiff_files(wiff_file, directory)
+
+    result = convert_wiff_file(wiff_file, directory, mzml_directory, conversion_profile=conversion_profile)
+
+    if result['status'] == 'failed':
+        raise Exception(result['error'])
+
+    return result['mzml_file']
+
+def check_wiff_files(wiff_file, directory):
+    '''Raises FileNotFoundError if the .wiff file or its .wiff.scan file is missing from directory. Usage is: name of .wiff file, directory that contains .wiff files.'''
     wiff_file_check = os.path.join(directory, wiff_file)
     scan_file_check = f'{os.path.join(directory, wiff_file)}.scan'
 
@@ -31,127 +82,780 @@ def convert_wiff_to_mzml(wiff_file, directory, mzml_directory, update_output=Non
     if not os.path.exists(scan_file_check):
         raise FileNotFoundError(f'The corresponding .scan file is missing from the directory. Please add the following file to the directory, and re-run the code:\n{os.path.basename(scan_file_check)}\n\n')
 
-    mzml_file = f'{os.path.splitext(wiff_file)[0]}.mzml'
+def mzml_is_up_to_date(wiff_file, directory, mzml_directory):
+    '''Returns True if the .mzML file converted from a .wiff file exists, is not empty, and is newer than both the .wiff and .wiff.scan files. Usage is:
+    name of .wiff file, directory that contains .wiff files, directory the mzml files are written to.
+    '''
+    mzml_path = os.path.join(mzml_directory, f'{os.path.splitext(wiff_file)[0]}.mzML')
+
+    try:
+        mzml_stats = os.stat(mzml_path)
+        source_mtime = max(os.stat(os.path.join(directory, wiff_file)).st_mtime_ns, os.stat(f'{os.path.join(directory, wiff_file)}.scan').st_mtime_ns)
+    except OSError:
+        return False
+
+    return mzml_stats.st_size > 0 and mzml_stats.st_mtime_ns >= source_mtime
+
+def convert_wiff_file(wiff_file, directory, mzml_directory, msconvert='msconvert', conversion_profile='default'):
+    '''Converts a single .wiff file to .mzML with msconvert and reports how it went. Usage is:
+    name of .wiff file, directory that contains .wiff files, directory to output mzml files to, the msconvert executable, and the conversion profile (see MSCONVERT_PROFILES).
+    msconvert writes into a temporary directory first, and the .mzML is only moved into mzml_directory once msconvert has exited successfully, so an interrupted conversion never looks finished.
+    Returns a dictionary with the wiff_file, mzml_file, status ('converted' or 'failed'), msconvert exit code (None if it never ran), runtime in seconds, and an error message (None on success).
+    '''
+    mzml_file = f'{os.path.splitext(wiff_file)[0]}.mzML'
+    result = {'wiff_file': wiff_file, 'mzml_file': mzml_file, 'status': 'failed', 'returncode': None, 'runtime': 0., 'error': None}
+    start_time = time.time()
+
+    try:
+        check_wiff_files(wiff_file, directory)
+    except FileNotFoundError as fnfe:
+        result['error'] = str(fnfe)
+        return result
+
+    temp_directory = os.path.join(mzml_directory, f'.{mzml_file}.partial')
+    os.makedirs(temp_directory, exist_ok=True)
 
     try:
-        subprocess.run(['msconvert', os.path.join(directory, wiff_file), '-o', mzml_directory, '--mzML', '--64'])
-        return mzml_file
+        completed = subprocess.run([msconvert, os.path.join(directory, wiff_file), '-o', temp_directory] + MSCONVERT_PROFILES[conversion_profile], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        result['returncode'] = completed.returncode
+
+        if completed.returncode != 0:
+            result['error'] = f'msconvert exited with code {completed.returncode} when converting {wiff_file} to mzML:\n{completed.stdout.decode(errors="replace")}\n'
+
+        elif not os.path.isfile(os.path.join(temp_directory, mzml_file)):
+            result['error'] = f'msconvert finished converting {wiff_file}, but {mzml_file} was not written.\n'
+
+        else:
+            os.replace(os.path.join(temp_directory, mzml_file), os.path.join(mzml_directory, mzml_file))
+            result['status'] = 'converted'
 
     except FileNotFoundError:
-        raise FileNotFoundError("msconvert (Part of proteowizard) could not be found. Did you add the required directories to your system's PATH?\n")
-    
-    except subprocess.CalledProcessError as cpe:    
-        raise subprocess.CalledProcessError(f'Subprocess error converting {wiff_file} to mzML: {cpe}\nTraceback: {traceback.format_exc()}\n')
+        result['error'] = "msconvert (Part of proteowizard) could not be found. Did you add the required directories to your system's PATH?\n"
 
     except Exception as e: 
-        raise Exception(f'Unexpected error converting {wiff_file} to mzML: {e}\nTraceback: {traceback.format_exc()}\n')
-    
+        result['error'] = f'Unexpected error converting {wiff_file} to mzML: {e}\nTraceback: {traceback.format_exc()}\n'
+
+    finally:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+
+    result['runtime'] = time.time() - start_time
+    return result
+
+def convert_wiff_files(directory, mzml_directory, wiff_files=None, workers=1, update_output=None, progress_callback=None, cancel_event=None, msconvert='msconvert', conversion_profile='default'):
+    '''Converts .wiff files to .mzML with up to `workers` msconvert processes running at the same time. Usage is:
+    directory that contains .wiff files, directory to output mzml files to (created if needed), list of .wiff files (all .wiff files in directory if None), the number of concurrent msconvert processes,
+    and the conversion profile (see MSCONVERT_PROFILES).
+    Files whose .mzML is already in mzml_directory and newer than the .wiff/.wiff.scan files are skipped, so an interrupted extraction can just be run again.
+    progress_callback (optional) is called as progress_callback(files done, total files), and conversions that have not started yet are abandoned once cancel_event (a threading.Event) is set.
+    Returns a list with the result of every file (see convert_wiff_file), in the same order as wiff_files. Skipped files have the status 'skipped' and abandoned ones 'cancelled'.
+    '''
+    if update_output is None:
+        update_output = lambda text: sys.__stdout__.write(text)
+
+    if wiff_files is None:
+        wiff_files = sorted([f for f in os.listdir(directory) if f.endswith('.wiff')])
+
+    os.makedirs(mzml_directory, exist_ok=True)
+
+    results = [None] * len(wiff_files)
+    to_convert = []
+    for i, wiff_file in enumerate(wiff_files):
+        if mzml_is_up_to_date(wiff_file, directory, mzml_directory):
+            results[i] = {'wiff_file': wiff_file, 'mzml_file': f'{os.path.splitext(wiff_file)[0]}.mzML', 'status': 'skipped', 'returncode': None, 'runtime': 0., 'error': None}
+        else:
+            to_convert.append(i)
+
+    files_done = len(wiff_files) - len(to_convert)
+    if files_done > 0:
+        update_output(f'{files_done} of {len(wiff_files)} .wiff files have already been converted and will be skipped.\n')
+    if progress_callback is not None:
+        progress_callback(files_done, len(wiff_files))
+
+    def convert(i):
+        #conversions still waiting in the pool when the run is cancelled are not started
+        if cancel_event is not None and cancel_event.is_set():
+            return {'wiff_file': wiff_files[i], 'mzml_file': f'{os.path.splitext(wiff_files[i])[0]}.mzML', 'status': 'cancelled', 'returncode': None, 'runtime': 0., 'error': None}
+        return convert_wiff_file(wiff_files[i], directory, mzml_directory, msconvert=msconvert, conversion_profile=conversion_profile)
+
+    #msconvert does the work in its own process, so threads are enough to keep several conversions going at once
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(convert, i): i for i in to_convert}
+
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            files_done += 1
+
+            if result['status'] == 'converted':
+                update_output(f'The wiff file:\n{result["wiff_file"]}\nhas been successfully extracted in {round(result["runtime"], 1)}s.\n')
+            elif result['status'] == 'failed':
+                update_output(result['error'])
+
+            if progress_callback is not None:
+                progress_callback(files_done, len(wiff_files))
+
+    return results
+
 # Function to integrate mass spectra within specified bounds using NumPy
-def integrate_spectra(directory, mzml_file, integration_bounds, parent_mz, update_output=None):
+def integrate_spectra(directory, mzml_file, integration_bounds, parent_mz, update_output=None, integration_method='grid'):
     '''Integrates the mass spectra from mzml files and averages them across all scans. Interpolation on a common mz grid for all mzml files provided is used. Usage is:
     directory containing mzml files, name of mzml file, integration bounds [as a list], and the m/z of the parent ion (needed for interpolation).
+    See integrate_windows for the available integration methods.
     '''
-    # Redirect print outputs to the GUI output window
-    sys.stdout = TextRedirect(textWritten=update_output)
+    #a single window is just a special case of the multi-window integration
+    return integrate_windows(directory, mzml_file, [integration_bounds], parent_mz, update_output=update_output, integration_method=integration_method)[0]
 
-    #Initialize lists to integrations, and variables for minimum and maximum m/z values
-    integrations = []
-    min_mz = 0.
-    max_mz = parent_mz + 50.  #adding 50 mass units to the parent ion
+def integrate_windows(directory, mzml_file, integration_windows, parent_mz, update_output=None, integration_method='grid'):
+    '''Integrates the mass spectra from an mzml file within every window provided and averages each window across all scans. The file is parsed (and interpolated) only once, no matter how many windows are given. Usage is:
+    directory containing mzml files, name of mzml file, list of integration bounds [[lower, upper], ...], the m/z of the parent ion (needed for interpolation), and the integration method.
+    integration_method is either 'grid' (interpolate onto a common 0.01 Da grid from 0 to parent+50, then integrate) or 'raw' (integrate directly on the raw profile points using the cumulative integral index, interpolating only at the window edges).
+    Returns a list of [average integration, stdev] for each window, in the same order as the windows were given.
+    '''
+    integrations = integrate_scans(directory, mzml_file, integration_windows, parent_mz, update_output=update_output, integration_method=integration_method)
+    return average_integrations(integrations)
+
+def average_integrations(integrations):
+    '''Returns [average integration, stdev] across all scans for each window. Usage is: 2D array of integrations from integrate_scans (one row per scan, one column per window).'''
+    # Calculate the average integration value of each window across all scans. Doing it this way because we need to get standard deviations
+    avg_integrations = np.mean(integrations, axis=0)
+    std_devs = np.std(integrations, axis=0)
+    
+    return [[avg_integration, std_dev] for avg_integration, std_dev in zip(avg_integrations, std_devs)]
+
+def integrate_mzml_file(directory, mzml_file, integration_windows, parent_mz, update_output=None, integration_method='grid', keep_scans=False):
+    '''Integrates every window of an mzml file (see integrate_windows), and optionally keeps the integrations of every scan. Usage is:
+    directory containing mzml files, name of mzml file, list of integration bounds [[lower, upper], ...], the m/z of the parent ion, the integration method, and whether to keep the scans.
+    Returns the list of [average integration, stdev] for each window, and a dictionary with the (scans x windows) 'integrations' and the 'scan_start_times' of the file (None unless keep_scans).
+    '''
+    integrations = integrate_scans(directory, mzml_file, integration_windows, parent_mz, update_output=update_output, integration_method=integration_method)
+
+    scans = None
+    if keep_scans:
+        #the times only line up with the scans if every spectrum has one
+        scan_start_times = read_scan_start_times(os.path.join(directory, mzml_file))
+        if len(scan_start_times) != len(integrations):
+            scan_start_times = np.full(len(integrations), np.nan)
+        scans = {'integrations': integrations, 'scan_start_times': scan_start_times}
+
+    return average_integrations(integrations), scans
+
+def integrate_scans(directory, mzml_file, integration_windows, parent_mz, update_output=None, integration_method='grid'):
+    '''Integrates every scan of an mzml file within every window provided, without averaging them (see integrate_windows). Usage is:
+    directory containing mzml files, name of mzml file, list of integration bounds [[lower, upper], ...], the m/z of the parent ion (needed for interpolation), and the integration method ('grid' or 'raw').
+    Returns a 2D array with one row per scan and one column per window.
+    '''
+    if integration_method not in ('grid', 'raw'):
+        update_output(f'Unknown integration method "{integration_method}". Please use either "grid" or "raw".\n')
+        raise ValueError('Value error!')
+
+    #read all scans of the file (or reuse them if this file has already been read and has not changed since)
+    spectra = get_spectra(directory, mzml_file, update_output=update_output)
+    offsets = spectra['offsets']
+
+    #Initialize array for integrations; one row per scan, one column per window
+    integrations = np.empty(shape=(len(offsets) - 1, len(integration_windows)), dtype=float)
+
+    if integration_method == 'grid':
+        #variables for minimum and maximum m/z values
+        min_mz = 0.
+        max_mz = parent_mz + 50.  #adding 50 mass units to the parent ion
+
+        #define common mz grid for interpolation
+        common_mz_grid = np.round(np.linspace(min_mz, max_mz, int((max_mz - min_mz) / 0.01 + 1)),2) #0.01 Da incremenets for mz grid
+
+        #interpolate all scans onto the common grid in one go (rows = scans, columns = common_mz_grid)
+        with timed_stage('interpolation'):
+            interp_intensities = interpolate_spectra(spectra, common_mz_grid, mzml_file, update_output=update_output)
+
+    #Integrate every window from the same spectra
+    try:
+        with timed_stage('integration'):
+            if integration_method == 'grid':
+                for j, integration_bounds in enumerate(integration_windows):
+
+                    #Define integration bounds as the indicies within the common m/z grid 
+                    lower_bound = np.round(integration_bounds[0],2)
+                    upper_bound = np.round(integration_bounds[1],2)
+                    filter = (common_mz_grid >= lower_bound) & (common_mz_grid <= upper_bound)
+
+                    # Integrate within specified bounds using NumPy trapz - all scans at once; its not a trap, I swear. 
+                    integrations[:, j] = np.trapz(interp_intensities[:, filter], x = common_mz_grid[filter], axis=1)
+
+            else:
+                #every window of every scan is the difference of two lookups in the cumulative integral
+                integrations[:, :] = integrate_cumulative(spectra, integration_windows)
+
+    except ValueError as ve:
+        update_output(f'ValueError encountered during integration of the spectra within {mzml_file}: {ve}\nTraceback: {traceback.format_exc()}\n')
+        raise ValueError('Integration error')    
+            
+    except Exception as e:
+        update_output(f'Error encountered during integration of the spectra within {mzml_file}: {e}\nTraceback: {traceback.format_exc()}\n')
+        raise Exception('Integration error')
+
+    return integrations
 
-    #define common mz grid for interpolation
-    common_mz_grid = np.round(np.linspace(min_mz, max_mz, int((max_mz - min_mz) / 0.01 + 1)),2) #0.01 Da incremenets for mz grid
+def integrate_mzml_files(directory, mzml_files, integration_windows, parent_mz, update_output=None, integration_method='grid', workers=1, executor=None, keep_scans=False):
+    '''Integrates every window (see integrate_mzml_file) for each mzml file in a list, optionally spread over a pool of worker processes. Usage is:
+    directory containing mzml files, list of mzml file names, list of integration bounds [[lower, upper], ...], m/z of the parent ion, integration method, and the number of worker processes (1 = run in this process).
+    executor (optional) is a ProcessPoolExecutor to use instead of starting a new pool, so that several directories can share one pool (see batch.py). It is left running afterwards.
+    With keep_scans, the integrations and start times of every scan are handed back too (for the per-scan export and the bootstrap), so the files never have to be integrated a second time.
+    This is a generator that yields (integrated peaks, runtime in seconds, scans) for each file in the same order as mzml_files, no matter which worker finishes first, so the results line up with the rows of the laser power file.
+    scans is None unless keep_scans (see integrate_mzml_file).
+    The stage times and counters of the worker processes (see instrumentation.py) are added to the ones of this process.
+    '''
+    #no pool needed for a single worker - everything runs in this process and messages go straight to the output window
+    if executor is None and (workers <= 1 or len(mzml_files) <= 1):
+        for mzml_file in mzml_files:
+            mzml_start_time = time.time()
+            integrated_peaks, scans = integrate_mzml_file(directory, mzml_file, integration_windows, parent_mz, update_output=update_output, integration_method=integration_method, keep_scans=keep_scans)
+            yield integrated_peaks, time.time() - mzml_start_time, scans
+        return
+
+    shared_executor = executor is not None
+    if not shared_executor:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(mzml_files)))
+
+    futures = []
+    try:
+        futures = [executor.submit(_integrate_mzml_file, directory, mzml_file, integration_windows, parent_mz, integration_method, keep_scans) for mzml_file in mzml_files]
+
+        #collect the results in submission order
+        for future in futures:
+            integrated_peaks, scans, mzml_runtime, worker_output, worker_stats = future.result()
+            merge_stats(worker_stats)
+            if worker_output:
+                update_output(worker_output)
+            yield integrated_peaks, mzml_runtime, scans
+
+    finally:
+        #stop any outstanding work if the caller stops early (e.g. because of an error in one of the files)
+        if shared_executor:
+            for future in futures:
+                future.cancel()
+        else:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def _integrate_mzml_file(directory, mzml_file, integration_windows, parent_mz, integration_method, keep_scans=False):
+    '''Runs integrate_mzml_file in a worker process. The GUI output window can't be reached from here, so anything printed is collected and handed back with the result
+    (or added to the error message if the integration fails). The stage times and counters of this file are handed back too.
+    '''
+    worker_output = []
+    mzml_start_time = time.time()
+    reset_stats() #worker processes are reused, so only count this file
+
+    try:
+        integrated_peaks, scans = integrate_mzml_file(directory, mzml_file, integration_windows, parent_mz, update_output=worker_output.append, integration_method=integration_method, keep_scans=keep_scans)
+
+    except Exception as e:
+        raise Exception(f'{"".join(worker_output)}{e}')
+
+    return integrated_peaks, scans, time.time() - mzml_start_time, ''.join(worker_output), get_stats()
+
+def profile_mzml_file(directory, mzml_file, integration_windows, parent_mz, output_prefix, update_output=None, integration_method='grid'):
+    '''Integrates a single mzml file under cProfile and tracemalloc (see profile_call in instrumentation.py) to find out where the time and memory go. Usage is:
+    directory containing mzml files, name of mzml file, list of integration bounds, m/z of the parent ion, and the path (without extension) that the profile files are written to.
+    The in-memory and on-disk spectral caches are bypassed, so the profile always covers decoding the file. Returns the list of files written.
+    '''
+    _forget_spectra(os.path.abspath(os.path.join(directory, mzml_file)))
+
+    with spectral_cache_disabled():
+        _, profile_files = profile_call(output_prefix, integrate_windows, directory, mzml_file, integration_windows, parent_mz, update_output=update_output, integration_method=integration_method)
+
+    #the next run should not reuse the uncached spectra that were just loaded
+    _forget_spectra(os.path.abspath(os.path.join(directory, mzml_file)))
+
+    return profile_files
+
+def get_spectra(directory, mzml_file, update_output=None):
+    '''Returns the spectra of an mzml file (see load_spectra) together with their cumulative integral index (see build_cumulative_index). Usage is:
+    directory containing mzml files and name of mzml file.
+    Results are kept in memory and reused for as long as the size and modification time of the file do not change.
+    '''
+    global _spectra_memory_cache_points
+
+    path = os.path.abspath(os.path.join(directory, mzml_file))
+    file_stats = os.stat(path)
+    fingerprint = (file_stats.st_size, file_stats.st_mtime_ns)
+
+    cached = _spectra_memory_cache.get(path)
+    if cached is not None and cached[0] == fingerprint:
+        _spectra_memory_cache.move_to_end(path)
+        add_counts(memory_cache_hits=1)
+        return cached[1]
+
+    spectra = load_spectra(directory, mzml_file, update_output=update_output)
+    with timed_stage('cumulative index'):
+        spectra = build_cumulative_index(spectra)
+
+    _forget_spectra(path)
+    _spectra_memory_cache[path] = (fingerprint, spectra)
+    _spectra_memory_cache_points += len(spectra['mz'])
+    _evict_spectra_memory_cache()
+
+    return spectra
+
+def _forget_spectra(path):
+    '''Drops the spectra of one file from the in-memory cache (if they are there).'''
+    global _spectra_memory_cache_points
+
+    cached = _spectra_memory_cache.pop(path, None)
+    if cached is not None:
+        _spectra_memory_cache_points -= len(cached[1]['mz'])
+
+def _evict_spectra_memory_cache():
+    '''Drops the least recently used files once the memory limit has been reached (but always keeps the newest one).'''
+    global _spectra_memory_cache_points
+
+    while len(_spectra_memory_cache) > 1 and _spectra_memory_cache_points > SPECTRA_MEMORY_CACHE_MAX_POINTS:
+        _, (_, spectra) = _spectra_memory_cache.popitem(last=False)
+        _spectra_memory_cache_points -= len(spectra['mz'])
+
+def configure_spectra_memory_cache(max_points=None):
+    '''Changes the maximum number of m/z points held in memory by get_spectra. Usage is:
+    maximum number of points (0 keeps only the most recently used file). Left as None, the limit is not changed.
+    '''
+    global SPECTRA_MEMORY_CACHE_MAX_POINTS
 
-    with mzml.read(os.path.join(directory, mzml_file)) as spectra:
-        i = 0        
+    if max_points is not None:
+        SPECTRA_MEMORY_CACHE_MAX_POINTS = int(max_points)
+
+        #shrink the cache straight away if the new limit is lower
+        _evict_spectra_memory_cache()
+
+def clear_spectra_cache():
+    '''Forgets all of the spectra that are held in memory by get_spectra.'''
+    global _spectra_memory_cache_points
+
+    _spectra_memory_cache.clear()
+    _spectra_memory_cache_points = 0
+
+def build_cumulative_index(spectra):
+    '''Adds the per-scan cumulative trapezoid integral over m/z to a dictionary of spectra from load_spectra. Usage is:
+    dictionary of spectra from load_spectra.
+    The 'cumulative' array has the same layout as 'mz'; each entry is the integral of its scan from the first m/z point of that scan up to that point.
+    '''
+    mz = spectra['mz']
+    intensity = spectra['intensity']
+    offsets = spectra['offsets']
+
+    #area of every trapezoid between neighbouring points; trapezoids that would bridge two scans are zeroed
+    areas = 0.5 * (intensity[1:] + intensity[:-1]) * np.diff(mz)
+    areas[offsets[1:-1][offsets[1:-1] > 0] - 1] = 0.
+
+    #running sum over all points, then restart the sum at the first point of each scan
+    cumulative = np.zeros(len(mz), dtype=float)
+    cumulative[1:] = np.cumsum(areas)
+    cumulative -= np.repeat(cumulative[np.minimum(offsets[:-1], max(len(mz) - 1, 0))], np.diff(offsets))
+
+    spectra['cumulative'] = cumulative
+    return spectra
+
+def cumulative_integral_at(spectra, mz_values):
+    '''Evaluates the cumulative integral of every scan at the m/z values given. Usage is:
+    dictionary of spectra that has been through build_cumulative_index, and an array of m/z values.
+    The intensity is interpolated linearly between raw profile points and taken to be zero outside of each scan's m/z range, so the result is the exact integral of the profile.
+    Returns a 2D array with one row per scan and one column per m/z value.
+    '''
+    mz = spectra['mz']
+    intensity = spectra['intensity']
+    cumulative = spectra['cumulative']
+    offsets = spectra['offsets']
+    num_scans = len(offsets) - 1
+    mz_values = np.asarray(mz_values, dtype=float)
+
+    if len(mz) == 0:
+        return np.zeros(shape=(num_scans, len(mz_values)), dtype=float)
+
+    starts = offsets[:-1, None]
+    ends = offsets[1:, None]
+    empty = (ends == starts)[:, 0]
+
+    #clip each value to the m/z range of each scan - there is no signal outside of it
+    first_mz = mz[np.minimum(offsets[:-1], len(mz) - 1)][:, None]
+    last_mz = mz[np.maximum(offsets[1:] - 1, 0)][:, None]
+    x = np.minimum(np.maximum(mz_values[None, :], first_mz), last_mz)
+
+    #binary search for the profile point to the left of each value; scans are shifted onto their own stretch of the m/z axis so that one search covers all of them
+    span = np.max(mz) - np.min(mz) + np.max(np.abs(mz_values), initial=0.) + 1.
+    scan_shift = np.arange(num_scans) * span
+    scan_index = np.repeat(np.arange(num_scans), np.diff(offsets))
+    k = np.searchsorted(mz + scan_shift[scan_index], x + scan_shift[:, None], side='right') - 1
+    k = np.minimum(np.maximum(k, starts), np.maximum(ends - 2, starts))
+    k = np.minimum(k, len(mz) - 1)
+    k1 = np.minimum(k + 1, np.maximum(ends - 1, starts))
+    k1 = np.minimum(k1, len(mz) - 1)
+
+    #interpolate the intensity at each value, then add the partial trapezoid from the profile point on its left
+    dmz = mz[k1] - mz[k]
+    fraction = np.divide(x - mz[k], dmz, out=np.zeros(dmz.shape), where=dmz > 0)
+    intensity_x = intensity[k] + fraction * (intensity[k1] - intensity[k])
+    values = cumulative[k] + 0.5 * (x - mz[k]) * (intensity[k] + intensity_x)
+    values[empty] = 0.
+
+    return values
+
+def integrate_cumulative(spectra, integration_windows):
+    '''Integrates every scan within every window using the cumulative integral index (two lookups per window and scan). Usage is:
+    dictionary of spectra that has been through build_cumulative_index, and a list of integration bounds [[lower, upper], ...].
+    Returns a 2D array with one row per scan and one column per window.
+    '''
+    bounds = np.asarray(integration_windows, dtype=float).reshape(-1, 2)
+    values = cumulative_integral_at(spectra, bounds.ravel()).reshape(len(spectra['offsets']) - 1, -1, 2)
+
+    return values[:, :, 1] - values[:, :, 0]
+
+def load_spectra(directory, mzml_file, update_output=None):
+    '''Reads the m/z and intensity arrays of every scan in an mzml file. Usage is:
+    directory containing mzml files and name of mzml file.
+    Returns a dictionary with the flat 'mz' and 'intensity' arrays of all scans laid end to end, and 'offsets' (number of scans + 1) marking where each scan starts and stops within them.
+    Files that have been decoded before are read from the on-disk spectral cache (see spectral_cache.py) instead of being parsed again.
+    Otherwise the native indexedmzML reader (read_indexed_mzml) is used, with pyteomics as the fallback for anything it does not handle.
+    '''
+    mzml_path = os.path.join(directory, mzml_file)
+
+    #skip the XML/base64 decoding if this file (with the same size and modification time) is already in the spectral cache
+    with timed_stage('spectral cache read'):
+        spectra = read_cached_spectra(mzml_path)
+
+    if spectra is not None:
+        add_counts(files_from_cache=1, scans=len(spectra['offsets']) - 1, points=len(spectra['mz']))
+        return spectra
+
+    #msconvert output (indexedmzML, uncompressed float arrays) can be decoded directly without building any pyteomics objects
+    try:
+        spectra = read_indexed_mzml(mzml_path)
+
+    except OSError as e:
+        update_output(f'Error encountered when opening {mzml_file}: {e}\nTraceback: {traceback.format_exc()}\n')
+        raise Exception('mzML data extraction error.')
+
+    if spectra is not None:
+        add_counts(files_decoded=1, bytes_read=os.path.getsize(mzml_path), scans=len(spectra['offsets']) - 1, points=len(spectra['mz']))
+        with timed_stage('spectral cache write'):
+            write_cached_spectra(mzml_path, spectra)
+        return spectra
+
+    import pyteomics.mzml as mzml
+
+    mz_arrays = []
+    intensity_arrays = []
+
+    with timed_stage('decode'), mzml.read(mzml_path) as spectra:
+        i = 0
         for spectrum in spectra:
 
             #according to stack exchange, these are pre-defined lists from pyteomics              
             try:
                 mz = spectrum['m/z array']
                 intensity = spectrum['intensity array']
-                
-                #get min and max values from the mzml mz list
-                min_mz_mzml = np.min(mz)
-                max_mz_mzml = np.max(mz)   
 
             except Exception as e:
                 update_output(f'Error encounter when extract m/z and intensity arrays from spectrum number {i+1} in {mzml_file}: {e}.\nTraceback: {traceback.format_exc()}\n')
-                QApplication.processEvents()  # Allow the GUI to update 
                 raise Exception('mzML data extraction error.') 
-            
+
             # Check for inconsistent data
             if len(mz) != len(intensity):
-                update_output(f'Inconsistent lengths of m/z and intensity values when integrating {mzml_file}\n')
-                QApplication.processEvents()  # Allow the GUI to update     
+                update_output(f'Inconsistent lengths of m/z and intensity values in spectrum number {i+1} of {mzml_file}\n')
                 raise ValueError('Value error!')
-            
-            #Filter out values in the common_mz_grid are are within the mz values taken from the mzml file, then define a new set of mz_values 
-            mask = (common_mz_grid < min_mz_mzml) | (common_mz_grid > max_mz_mzml)
-            new_mz_values = common_mz_grid[mask]
-            
-            # Append the new values to the mz array from the mzml file with correponding intensity of zero
-            mz = np.append(mz, new_mz_values)
-            intensity = np.append(intensity, np.zeros(len(new_mz_values)))
-
-            #Sort the arrays based on increasing mz
-            sort_indices = np.argsort(mz)
-            mz = mz[sort_indices]
-            intensity = intensity[sort_indices]
-                    
-            #now interpolate using
-            try:
-                interp_intensity = np.interp(common_mz_grid, mz, intensity)
-            
-            except ValueError as ve:
-                update_output(f'ValueError encountered during interpolation of the spectra within {mzml_file}: {ve}\nTraceback: {traceback.format_exc()}\n')
-                QApplication.processEvents()  # Allow the GUI to update      
-                raise ValueError('Interpolation error')
-                
-            except Exception as e:
-                update_output(f'Unexpected error encountered during interpolation of the spectra within {mzml_file}: {e}\nTraceback: {traceback.format_exc()}\n')
-                QApplication.processEvents()  # Allow the GUI to update      
-                raise Exception('Interpolation error')
-            
-            #Define integration bounds as the indicies within the common m/z grid 
-            try:
-                lower_bound = np.round(integration_bounds[0],2)
-                upper_bound = np.round(integration_bounds[1],2)
-                filter = (common_mz_grid >= lower_bound) & (common_mz_grid <= upper_bound)
 
-                #only take mz and intensity data from within the integration bounds
-                mz_interval = common_mz_grid[filter]
-                interp_intensity_interval = interp_intensity[filter]
-                
-                # Integrate within specified bounds using NumPy trapz, and append each integration to the integrations list; its not a trap, I swear. 
-                integration = np.trapz(interp_intensity_interval, x = mz_interval)
-                integrations.append(integration)
+            mz_arrays.append(np.asarray(mz, dtype=float))
+            intensity_arrays.append(np.asarray(intensity, dtype=float))
+            i += 1
 
-                i+=1
+    if len(mz_arrays) == 0:
+        update_output(f'No spectra could be found in {mzml_file}\n')
+        raise ValueError('Value error!')
 
-            except ValueError as ve:
-                update_output(f'ValueError encountered during integration of the spectra within {mzml_file}: {ve}\nTraceback: {traceback.format_exc()}\n')
-                QApplication.processEvents()  # Allow the GUI to update      
-                raise ValueError('Integration error')    
-                    
-            except Exception as e:
-                update_output(f'Error encountered during integration of the spectra within {mzml_file}: {e}\nTraceback: {traceback.format_exc()}\n')
-                QApplication.processEvents()  # Allow the GUI to update      
-                raise Exception('Integration error')
+    spectra = pack_spectra(mz_arrays, intensity_arrays)
+    add_counts(files_decoded=1, bytes_read=os.path.getsize(mzml_path), scans=len(spectra['offsets']) - 1, points=len(spectra['mz']))
+    with timed_stage('spectral cache write'):
+        write_cached_spectra(mzml_path, spectra)
 
-    # Calculate the average integration value. Doing it this way because we need to get standard deviations
-    avg_integration = np.mean(integrations)
-    std_dev = np.std(integrations)
-    
-    return [avg_integration, std_dev] 
+    return spectra
+
+def decode_numpress_slof(encoded):
+    '''Decodes an MS-Numpress short logged float (slof) array. Usage is: the encoded bytes (after base64 and zlib).
+    The first 8 bytes are the fixed point (a big-endian double), followed by one little-endian unsigned short per value that holds log(value + 1) * fixed point.
+    '''
+    if len(encoded) < 8:
+        return np.empty(0)
+
+    fixed_point = np.frombuffer(encoded[:8], dtype='>f8')[0]
+    return np.expm1(np.frombuffer(encoded[8:8 + (len(encoded) - 8) // 2 * 2], dtype='<u2') / fixed_point)
+
+def decode_numpress_linear(encoded):
+    '''Decodes an MS-Numpress linear prediction array. Usage is: the encoded bytes (after base64 and zlib).
+    The first 8 bytes are the fixed point (a big-endian double), followed by the first two values as little-endian 4 byte integers (value * fixed point).
+    Every further value is stored as its difference to the straight line through the two values before it, written as a head half-byte and then 0-8 half-bytes of the number (least significant first).
+    The values are decoded as array operations: the start of every number is found by pointer doubling over the half-bytes (see below), then all differences are read at once and summed back up.
+    '''
+    if len(encoded) < 8:
+        return np.empty(0)
+
+    fixed_point = np.frombuffer(encoded[:8], dtype='>f8')[0]
+    first_values = np.frombuffer(encoded[8:8 + min(len(encoded) - 8, 8) // 4 * 4], dtype='<u4').astype(np.int64)
+    if len(encoded) <= 16:
+        return first_values / fixed_point
+
+    #the half-bytes, high half first, with 8 zeros after the end so that reading past the last number stays in the array
+    packed = np.frombuffer(encoded[16:], dtype=np.uint8)
+    half_bytes = np.zeros(2 * len(packed) + 8, dtype=np.uint8)
+    half_bytes[0:2 * len(packed):2] = packed >> 4
+    half_bytes[1:2 * len(packed):2] = packed & 0xf
+    num_half_bytes = 2 * len(packed)
+
+    #heads 0-8 are followed by 8 - head half-bytes (the missing high ones are 0), heads 9-15 by 16 - head half-bytes (the missing high ones are 0xf, i.e. a negative number)
+    heads = half_bytes[:num_half_bytes].astype(np.int64)
+    lengths = np.where(heads <= 8, 8 - heads, 16 - heads)
+
+    #jump[i] is where the number after one starting at half-byte i starts (num_half_bytes past the end). Every round doubles the numbers found so far by following them
+    #and squares the jump table, so the starts of all n numbers are found in log2(n) rounds, in order.
+    jump = np.append(np.minimum(np.arange(num_half_bytes) + 1 + lengths, num_half_bytes), num_half_bytes)
+    starts = np.zeros(1, dtype=np.int64)
+    while starts[-1] < num_half_bytes:
+        starts = np.concatenate([starts, jump[starts]])
+        jump = jump[jump]
+
+    #the half-byte that pads an odd count is a zero head that would need 8 half-bytes past the end, so only numbers that fit are kept
+    starts = starts[starts < num_half_bytes]
+    starts = starts[starts + 1 + lengths[starts] <= num_half_bytes]
+    if len(starts) == 0:
+        return first_values / fixed_point
+
+    number_lengths = lengths[starts]
+    positions = np.arange(8)
+    digits = np.where(positions[None, :] < number_lengths[:, None], half_bytes[starts[:, None] + 1 + positions[None, :]], 0).astype(np.uint32)
+    numbers = np.bitwise_or.reduce(digits << (4 * positions.astype(np.uint32))[None, :], axis=1)
+
+    #negative numbers: the high half-bytes that were left out are all 0xf
+    negative = heads[starts] > 8
+    numbers[negative] |= (np.uint32(0xffffffff) << (4 * number_lengths[negative]).astype(np.uint32)) & np.uint32(0xffffffff)
+    differences = numbers.view(np.int32).astype(np.int64)
+
+    #value[i] = 2 * value[i-1] - value[i-2] + difference[i], i.e. the steps between values are a running sum of the differences and the values a running sum of the steps
+    steps = (first_values[1] - first_values[0]) + np.cumsum(differences)
+    return np.concatenate([first_values, first_values[1] + np.cumsum(steps)]) / fixed_point
+
+def decode_binary_array(binary, dtype, compression):
+    '''Decodes the text of a <binary> element into a float array. Usage is: the base64 text, the numpy dtype of the floats, and the compression accession (see _compressions).'''
+    zlib_compressed, numpress = _compressions[compression]
+
+    encoded = base64.b64decode(binary)
+    if zlib_compressed and len(encoded) > 0:
+        encoded = zlib.decompress(encoded)
+
+    if numpress == 'linear':
+        return decode_numpress_linear(encoded)
+    if numpress == 'slof':
+        return decode_numpress_slof(encoded)
+
+    return np.frombuffer(encoded, dtype=dtype).astype(float)
+
+def read_indexed_mzml(mzml_path):
+    '''Fast reader for indexedmzML files. Usage is: path to mzml file.
+    The offset index at the end of the file is used to jump straight to each spectrum, and the m/z and intensity arrays are decoded with base64 and np.frombuffer
+    (after zlib and MS-Numpress decoding, if the file was written with one of the compressed conversion profiles, see MSCONVERT_PROFILES).
+    Returns the same dictionary as load_spectra, or None if the file is not indexed or uses an encoding that this reader does not handle (the caller should then fall back to pyteomics).
+    '''
+    with open(mzml_path, 'rb') as opf:
+        if os.fstat(opf.fileno()).st_size == 0:
+            return None
+
+        with mmap.mmap(opf.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+            #locating the spectra (offset index) counts as opening the file, reading the arrays out of them as decoding
+            with timed_stage('file open'):
+
+                #the offset of the index list is written in the last few lines of the file
+                index_list_offset = _index_list_offset_pattern.search(data, max(len(data) - 4096, 0))
+                if index_list_offset is None:
+                    return None
+
+                spectrum_index = _spectrum_index_pattern.search(data, int(index_list_offset.group(1)))
+                if spectrum_index is None:
+                    return None
+
+                spectrum_offsets = [int(offset) for offset in _offset_pattern.findall(spectrum_index.group(1))]
+
+            mz_arrays = []
+            intensity_arrays = []
+
+            with timed_stage('decode'):
+                for spectrum_offset in spectrum_offsets:
+
+                    #each spectrum runs from its offset up to its closing tag
+                    if data[spectrum_offset:spectrum_offset + 9] != b'<spectrum':
+                        return None
+
+                    spectrum_end = data.find(b'</spectrum>', spectrum_offset)
+                    if spectrum_end == -1:
+                        return None
+
+                    spectrum = data[spectrum_offset:spectrum_end]
+                    arrays = {}
+
+                    for binary_data_array in _binary_data_array_pattern.finditer(spectrum):
+                        binary_data_array = binary_data_array.group(1)
+                        accessions = set(_accession_pattern.findall(binary_data_array))
+
+                        array_name = [_array_names[accession] for accession in accessions if accession in _array_names]
+                        if len(array_name) == 0:
+                            continue #some other array that we don't need
+
+                        dtype = [_float_dtypes[accession] for accession in accessions if accession in _float_dtypes]
+                        compression = [accession for accession in accessions if accession in _compressions]
+                        if len(dtype) != 1 or len(compression) != 1:
+                            return None #integer arrays and other compressions (e.g. MS-Numpress pic) are left to pyteomics
+
+                        binary = _binary_pattern.search(binary_data_array)
+                        if binary is None:
+                            return None
+
+                        arrays[array_name[0]] = decode_binary_array(binary.group(1) or b'', dtype[0], compression[0])
+
+                    #every spectrum needs both arrays, and they need to be as long as the spectrum says they are
+                    if 'mz' not in arrays or 'intensity' not in arrays or len(arrays['mz']) != len(arrays['intensity']):
+                        return None
+
+                    array_length = _default_array_length_pattern.search(spectrum)
+                    if array_length is not None and int(array_length.group(1)) != len(arrays['mz']):
+                        return None
+
+                    mz_arrays.append(arrays['mz'])
+                    intensity_arrays.append(arrays['intensity'])
+
+    if len(mz_arrays) == 0:
+        return None
+
+    return pack_spectra(mz_arrays, intensity_arrays)
+
+def read_scan_start_times(mzml_path):
+    '''Returns the scan start time (minutes) of every spectrum in an mzml file, in the order of the spectra. Usage is: path to mzml file.
+    The times are read straight from the cvParams, so this works the same for every encoding of the arrays.
+    '''
+    with open(mzml_path, 'rb') as opf:
+        if os.fstat(opf.fileno()).st_size == 0:
+            return np.empty(0)
+
+        with mmap.mmap(opf.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            times = []
+            for cv_param in _scan_start_time_pattern.findall(data):
+                value = _value_pattern.search(cv_param)
+                unit_name = _unit_name_pattern.search(cv_param)
+                time_value = float(value.group(1)) if value is not None else np.nan
+                times.append(time_value / 60. if unit_name is not None and unit_name.group(1) == b'second' else time_value)
+
+    return np.array(times, dtype=float)
+
+def pack_spectra(mz_arrays, intensity_arrays):
+    '''Lays the m/z and intensity arrays of each scan end to end. Usage is:
+    list of m/z arrays and list of intensity arrays (one of each per scan).
+    Every scan is sorted by increasing m/z. Returns a dictionary with the flat 'mz' and 'intensity' arrays and the scan 'offsets'.
+    '''
+    offsets = np.zeros(len(mz_arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(mz) for mz in mz_arrays])
+
+    mz = np.concatenate(mz_arrays) if len(mz_arrays) else np.empty(0)
+    intensity = np.concatenate(intensity_arrays) if len(intensity_arrays) else np.empty(0)
+
+    #Sort each scan by increasing mz; profile data from msconvert is already sorted, so this is usually skipped
+    scan_index = np.repeat(np.arange(len(mz_arrays)), np.diff(offsets))
+    if np.any((np.diff(mz) < 0) & (np.diff(scan_index) == 0)):
+        sort_indices = np.lexsort((mz, scan_index))
+        mz = mz[sort_indices]
+        intensity = intensity[sort_indices]
+
+    return {'mz': mz, 'intensity': intensity, 'offsets': offsets}
+
+def slice_spectra(spectra, first_scan, last_scan):
+    '''Returns the scans first_scan up to (not including) last_scan of a dictionary of spectra from load_spectra, in the same layout. The arrays are views, not copies.'''
+    offsets = spectra['offsets']
+    start, stop = offsets[first_scan], offsets[last_scan]
+    return {'mz': spectra['mz'][start:stop], 'intensity': spectra['intensity'][start:stop], 'offsets': offsets[first_scan:last_scan + 1] - start}
+
+def average_spectra(spectra, common_mz_grid, mzml_file='', update_output=None):
+    '''Averages the scans returned by load_spectra on a common m/z grid, without holding every interpolated scan in memory at once. Usage is:
+    dictionary of spectra from load_spectra, the common m/z grid, and the name of the mzml file (only used for error messages).
+    The scans are interpolated a block at a time (at most RAW_DATA_STREAM_POINTS grid points) and each block is folded into a running mean and sum of squared deviations (Welford's method, one block at a time),
+    so memory use depends on the size of the grid but not on the number of scans. Returns the mean and the (population) standard deviation of every grid point.
+    '''
+    num_scans = len(spectra['offsets']) - 1
+    block_scans = max(1, RAW_DATA_STREAM_POINTS // max(len(common_mz_grid), 1))
+
+    count = 0
+    mean = np.zeros(len(common_mz_grid))
+    sum_squares = np.zeros(len(common_mz_grid))
 
-def extract_RawData(mzml_directory, parent_mz, output_csv_file, update_output=None):
+    for first_scan in range(0, num_scans, block_scans):
+        last_scan = min(first_scan + block_scans, num_scans)
+        block = interpolate_spectra(slice_spectra(spectra, first_scan, last_scan), common_mz_grid, mzml_file, update_output=update_output)
+
+        block_count = last_scan - first_scan
+        block_mean = np.mean(block, axis=0)
+        block -= block_mean
+        block_sum_squares = np.sum(np.square(block, out=block), axis=0)
+
+        #combine the running statistics with those of the block
+        delta = block_mean - mean
+        total = count + block_count
+        mean += delta * (block_count / total)
+        sum_squares += block_sum_squares + np.square(delta) * (count * block_count / total)
+        count = total
+
+    if count == 0: #no scans - same as the mean of an empty array
+        return np.full(len(common_mz_grid), np.nan), np.full(len(common_mz_grid), np.nan)
+
+    return mean, np.sqrt(sum_squares / count)
+
+def interpolate_spectra(spectra, common_mz_grid, mzml_file='', update_output=None):
+    '''Interpolates every (sorted) scan returned by load_spectra onto a common m/z grid in a single vectorized step. Usage is:
+    dictionary of spectra from load_spectra, the common m/z grid, and the name of the mzml file (only used for error messages).
+    Grid points outside the m/z range of a scan are given an intensity of zero. Returns a 2D array with one row per scan and one column per grid point.
+    '''
+    try:
+        mz = spectra['mz']
+        intensity = spectra['intensity']
+        offsets = spectra['offsets']
+        num_scans = len(offsets) - 1
+        scan_lengths = np.diff(offsets)
+        scan_index = np.repeat(np.arange(num_scans), scan_lengths)
+
+        #Shift every scan (and a copy of the grid for each scan) onto its own stretch of the m/z axis so that a single np.interp call covers all scans at once
+        span = max(common_mz_grid[-1], np.max(mz, initial=0.)) - min(common_mz_grid[0], np.min(mz, initial=0.)) + 1.
+        scan_shift = np.arange(num_scans) * span
+        shifted_grid = common_mz_grid[None, :] + scan_shift[:, None]
+        interp_intensities = np.interp(shifted_grid.ravel(), mz + scan_shift[scan_index], intensity).reshape(shifted_grid.shape)
+
+        #Grid points outside of the m/z range of each scan (and empty scans) have no signal; this replaces the old zero padding of the grid
+        empty = scan_lengths == 0
+        min_mz_mzml = np.where(empty, np.inf, mz[np.minimum(offsets[:-1], len(mz) - 1)])
+        max_mz_mzml = np.where(empty, -np.inf, mz[np.maximum(offsets[1:] - 1, 0)])
+        first_column = np.searchsorted(common_mz_grid, min_mz_mzml, side='left')
+        last_column = np.searchsorted(common_mz_grid, max_mz_mzml, side='right')
+        columns = np.arange(len(common_mz_grid))
+        interp_intensities[(columns[None, :] < first_column[:, None]) | (columns[None, :] >= last_column[:, None])] = 0.
+
+        return interp_intensities
+
+    except Exception as e:
+        update_output(f'Unexpected error encountered during interpolation of the spectra within {mzml_file}: {e}\nTraceback: {traceback.format_exc()}\n')
+        raise Exception('Interpolation error')
+
+def extract_RawData(mzml_directory, parent_mz, output_csv_file, update_output=None, progress_callback=None, cancel_event=None, output_format='csv', include_stdev=False):
     '''Extracts the mass spectra from mzml files and averages them across all scans. Interpolation on a common mz grid for all mzml files provided is used. Usage is:
-    directory containing mzml files, m/z of the parent ion (needed for interpolation), and the name of .csv file to output results to.
+    directory containing mzml files, m/z of the parent ion (needed for interpolation), the name of the file to output results to, and the output format (see RAW_DATA_FORMATS):
+    'csv' writes every 0.02 Da grid point, 'sparse' writes a .csv without the m/z points that are zero at every wavelength, and 'npz' writes a binary numpy .npz file with one array per column ('mz', then one per wavelength, e.g. '400nm').
+    'mmap' writes a (wavelength x m/z) .npy matrix with its axes in a .json next to it, which can be sliced without loading the whole file (see raw_data_store.py).
+    Each averaged spectrum is written to disk as soon as its file is done, so memory use does not grow with the number of wavelengths, and the scans are averaged as they are interpolated (see average_spectra), so it does not grow with the number of scans either.
+    With include_stdev, the standard deviation across the scans of every m/z point is written too: as a '400nm stdev' array (etc.) in the .npz, or to a second .csv (or .npy) with the same layout ending in _stdev.
+    progress_callback (optional) is called as progress_callback(files done, total files) after each file, and the export stops before the next file once cancel_event (a threading.Event) is set.
+    Returns the name of the output file, or None if the export was cancelled or could not be written.
     '''
 
-    # Redirect print outputs to the GUI output window
-    sys.stdout = TextRedirect(textWritten=update_output)
+    if output_format not in RAW_DATA_FORMATS:
+        update_output(f'Unknown raw data format: {output_format}. Please use one of: {", ".join(RAW_DATA_FORMATS)}.\n')
+        raise ValueError(f'Unknown raw data format: {output_format}')
    
     #Set up interpolation grid - different from before because we don't want to print the mass spectrum in 0.01 Da increments. 
     min_mz = 0.
@@ -160,158 +864,196 @@ def extract_RawData(mzml_directory, parent_mz, output_csv_file, update_output=No
     common_mz_grid = np.round(np.linspace(min_mz, max_mz, int((max_mz - min_mz) / 0.02 + 1)),2) #0.02 Da incremenets for mz grid
 
     #Get a list of mzML files in the given directory
-    mzml_files = [f for f in os.listdir(mzml_directory) if f.endswith('.mzML')]
+    mzml_files = sorted([f for f in os.listdir(mzml_directory) if f.endswith('.mzML')])
 
-    #initialize dictionary to write data to
-    data_dict = {}
-    
-    for mzml_file in mzml_files:
+    #The averaged spectra are streamed to a temporary file as each wavelength finishes: straight into the .npz for the binary format, or into a memory-mapped (wavelength x m/z) array that the .csv is written from in chunks of rows.
+    temp_file = f'{output_csv_file}.{os.getpid()}.tmp'
+    stdev_temp_file = f'{output_csv_file}.{os.getpid()}.stdev.tmp'
+    stdev_output_file = f'{os.path.splitext(output_csv_file)[0]}_stdev{os.path.splitext(output_csv_file)[1]}'
+    wavelength_titles = [] #titles to be written to raw data file
+    wavelengths = [] #wavelengths in nm (for the metadata of the mmap format)
+    nonzero_mz = np.zeros(len(common_mz_grid), dtype=bool) #m/z points that are not zero at every wavelength (needed for the sparse format)
+    stdev_store = None #(wavelength x m/z) stdev spectra for the .csv formats
+
+    if output_format == 'npz':
+        column_store = zipfile.ZipFile(temp_file, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1, allowZip64=True)
+        write_npz_column(column_store, 'mz', common_mz_grid)
+    else:
+        column_store = np.lib.format.open_memmap(temp_file, mode='w+', dtype=float, shape=(len(mzml_files), len(common_mz_grid)))
+        if include_stdev:
+            stdev_store = np.lib.format.open_memmap(stdev_temp_file, mode='w+', dtype=float, shape=(len(mzml_files), len(common_mz_grid)))
+
+    try:
+        for files_done, mzml_file in enumerate(mzml_files):
+
+            #stop between files if the user has cancelled the export
+            if cancel_event is not None and cancel_event.is_set():
+                update_output(f'The raw data export was cancelled after {files_done} of {len(mzml_files)} mzml files. No raw data file has been written.\n')
+                return
+            
+            #get wavelength from mzml file name
+            try:
+                wavelength = re.findall(r'\d+', mzml_file.split('Laser')[-1])[-1]
+                wl_title = f'{wavelength}nm' #title to be written to raw data file
+
+            except ValueError as ve:
+                update_output(f'Could not extract the wavelength from the .mzml file name. This is what the code has found: {wavelength}.\nDoes the filename contain the text: "Laser"?\n')
+                update_output(f'Error: {ve}\nTraceback: {traceback.format_exc()}\n')       
+                raise ValueError('ValueError')    
+
+            #Open up the .mzml file, extract the mass spectrum, and interpolate all scans at once
+            spectra = load_spectra(mzml_directory, mzml_file, update_output=update_output)
+            wavelengths.append(float(wavelength))
+
+            # Step 16: Calculate the averaged spectrum (and its stdev) across each scan for this mzML file, and write it out
+            with timed_stage('interpolation'):
+                averaged_spectrum, stdev_spectrum = average_spectra(spectra, common_mz_grid, mzml_file, update_output=update_output)
+            wavelength_titles.append(wl_title)
+
+            with timed_stage('output write'):
+                if output_format == 'npz':
+                    write_npz_column(column_store, wl_title, averaged_spectrum)
+                    if include_stdev:
+                        write_npz_column(column_store, f'{wl_title} stdev', stdev_spectrum)
+                else:
+                    column_store[files_done] = averaged_spectrum
+                    nonzero_mz |= averaged_spectrum != 0
+                    if include_stdev:
+                        stdev_store[files_done] = stdev_spectrum
+
+            if progress_callback is not None:
+                progress_callback(files_done + 1, len(mzml_files))
+
+        # Step 17: Write the output file
+        try: 
+            with timed_stage('output write'):
+                if output_format == 'npz':
+                    column_store.close()
+                    os.replace(temp_file, output_csv_file)
+
+                elif output_format == 'mmap':
+                    #the temporary memory-mapped matrix already is the output - it only has to be released (so it can be moved on Windows) and described
+                    column_store.flush()
+                    column_store = None
+                    os.replace(temp_file, output_csv_file)
+
+                    if include_stdev:
+                        stdev_store.flush()
+                        stdev_store = None
+                        os.replace(stdev_temp_file, stdev_output_file)
+                        update_output(f'The standard deviation of each spectrum has been written to {stdev_output_file}\n')
+
+                    write_raw_data_metadata(output_csv_file, wavelengths, wavelength_titles, min_mz, max_mz, len(common_mz_grid), parent_mz, mzml_files, stdev_file=stdev_output_file if include_stdev else None)
+
+                else:
+                    mz_rows = np.flatnonzero(nonzero_mz) if output_format == 'sparse' else np.arange(len(common_mz_grid))
+                    write_raw_data_csv(output_csv_file, common_mz_grid, column_store, wavelength_titles, mz_rows)
+                    if include_stdev:
+                        write_raw_data_csv(stdev_output_file, common_mz_grid, stdev_store, wavelength_titles, mz_rows)
+                        update_output(f'The standard deviation of each spectrum has been written to {stdev_output_file}\n')
+
+            update_output(f'Data succesfully written to {output_csv_file}\n\n')
+            return output_csv_file
         
-        #initialize list to store interpolated intensities - this needs to be re-initialized for each new wavelength (i.e., each mzml file)
-        interpolated_intensity_values = []
+        except PermissionError:
+            update_output('Close the .csv file with the same name as the one where the raw data is being written and then rerun the code.\n')
+            return
 
-        #get wavelength from mzml file name
-        try:
-            wavelength = re.findall(r'\d+', mzml_file.split('Laser')[-1])[-1]
-            wl_title = f'{wavelength}nm' #title to be written to raw data file
+    finally:
+        #the memory map has to be released before the temporary file can be deleted on Windows
+        if output_format == 'npz':
+            column_store.close()
+        else:
+            del column_store, stdev_store
 
-        except ValueError as ve:
-            update_output(f'Could not extract the wavelength from the .mzml file name. This is what the code has found: {wavelength}.\nDoes the filename contain the text: "Laser"?\n')
-            update_output(f'Error: {ve}\nTraceback: {traceback.format_exc()}\n')       
-            QApplication.processEvents()  # Allow the GUI to update 
-            raise ValueError('ValueError')    
+        for file in (temp_file, stdev_temp_file):
+            if os.path.exists(file):
+                os.remove(file)
 
-        #Open up the .mzml file, extract the mass spectrum, and perform the interpolation
-        i = 0
-        with mzml.read(os.path.join(mzml_directory, mzml_file)) as spectra:
-            for spectrum in spectra:
-                #according to stack exchange, these are pre-defined lists from pyteomics
-                try:
-                    mz = spectrum['m/z array']
-                    intensity = spectrum['intensity array']
-                
-                except Exception as e:
-                    update_output(f'Error encounter when extract m/z and intensity arrays from spectrum number {i+1} in {mzml_file}: {e}.\nTraceback: {traceback.format_exc()}\n')
-                    QApplication.processEvents()  # Allow the GUI to update 
-                    raise Exception('mzML data extraction error.')                            
-                
-                #get min and max values from the mzml mz list
-                min_mz_mzml = np.min(mz)
-                max_mz_mzml = np.max(mz)
-                
-                #Check for inconsistent data
-                if len(mz) != len(intensity):
-                    update_output(f'Inconsistent data in {mzml_file}.\n The m/z and intensity arrays extracted from the .mzML file must be the same length!\n')
-                    QApplication.processEvents()  # Allow the GUI to update 
-                    raise ValueError(f'ValueError')
-                
-                #Create filter based on a common mz grid
-                mask = (common_mz_grid < min_mz_mzml) | (common_mz_grid > max_mz_mzml) # the "|" denotes "or"
-
-                # Filter common_mz_grid based on the mask
-                new_mz_values = common_mz_grid[mask]
-                
-                # Append the new values to mz with correponding intensity of zero
-                mz = np.append(mz, new_mz_values)
-                intensity = np.append(intensity, np.zeros(len(new_mz_values)))
-
-                #Sort the arrays based on increasing mz
-                sort_indices = np.argsort(mz)
-                mz = mz[sort_indices]
-                intensity = intensity[sort_indices]
-                        
-                #now interpolate
-                try:
-                    interp_intensity = np.interp(common_mz_grid, mz, intensity)
-                    interpolated_intensity_values.append(interp_intensity)
-                    i += 1            
-
-                except ValueError as ve:
-                    update_output(f'ValueError encountered during interpolation of the spectra within {mzml_file}: {ve}\nTraceback: {traceback.format_exc()}\n')
-                    QApplication.processEvents()  # Allow the GUI to update      
-                    raise ValueError('Interpolation error')
-                    
-                except Exception as e:
-                    update_output(f'Unexpected error encountered during interpolation of the spectra within {mzml_file}: {e}\nTraceback: {traceback.format_exc()}\n')
-                    QApplication.processEvents()  # Allow the GUI to update      
-                    raise Exception('Interpolation error')
-
-        # Step 16: Calculate the averaged spectrum across each scan for this mzML file
-        averaged_spectrum = np.mean(interpolated_intensity_values, axis=0)
-        data_dict[wl_title] = averaged_spectrum
-    
-    # Step 17: Create a DataFrame with the common m/z grid as the first column
-    df = pd.DataFrame(data_dict)
-    df.insert(0, "m/z", common_mz_grid)
-
-    # Step 18: Write the DataFrame to a CSV file
-    try: 
-        df.to_csv(output_csv_file, index=False)
-        update_output(f'Data succesfully written to {output_csv_file}\n\n')
-        QApplication.processEvents()  # Allow the GUI to update  
-        return
-    
-    except PermissionError:
-        'Close the .csv file with the same name as the one where the raw data is being written and then rerun the code.\n'
-        return
+def write_npz_column(npz_file, name, column):
+    '''Adds one array to an open .npz (zip) file without holding the other columns in memory. Usage is: zipfile.ZipFile opened for writing, name of the column, 1D array.'''
+    with npz_file.open(f'{name}.npy', 'w', force_zip64=True) as file:
+        np.lib.format.write_array(file, np.ascontiguousarray(column), allow_pickle=False)
+
+def write_raw_data_csv(output_csv_file, common_mz_grid, spectra_store, wavelength_titles, mz_rows):
+    '''Writes averaged spectra to a .csv, RAW_DATA_CSV_CHUNK_ROWS m/z points at a time, with the m/z as the first column and one column per wavelength. Usage is:
+    name of .csv file, m/z grid, (wavelength x m/z) array of averaged spectra (can be memory-mapped), list of wavelength titles, and indices of the m/z points to write.
+    '''
+    import pandas as pd
+
+    with open(output_csv_file, 'w', newline='') as file:
+        for chunk_start in range(0, max(len(mz_rows), 1), RAW_DATA_CSV_CHUNK_ROWS):
+            chunk_rows = mz_rows[chunk_start:chunk_start + RAW_DATA_CSV_CHUNK_ROWS]
+
+            df = pd.DataFrame(np.asarray(spectra_store[:, chunk_rows]).T, columns=wavelength_titles)
+            df.insert(0, "m/z", common_mz_grid[chunk_rows])
+            df.to_csv(file, index=False, header=(chunk_start == 0))
+
+def PE_calc_matrix(W, Par, dPar, Frag, dFrag, P=None, dP=None):
+    '''Calculates the photofragmentation efficiency and its propagated stdev for every wavelength and fragment at once. Usage is:
+    Wavelength, base peak integration, base peak integration stdev, fragment peak integration, fragment peak integration stdev, Power, Power stdev.
+    The arguments are numpy arrays that broadcast together, e.g. one row per wavelength with W, P, dP, Par, and dPar as columns of shape (wavelengths, 1) and Frag, dFrag of shape (wavelengths, fragments).
+    The efficiency is normalized to laser power unless P is None (dP is then ignored).
+    Returns (efficiency, stdev, valid): valid is False wherever the efficiency can't be calculated (zero power, Par + Frag of zero, or a result that is not finite), and the efficiency and stdev are NaN there.
+    '''
+    W, Par, dPar, Frag, dFrag = (np.asarray(value, dtype=float) for value in (W, Par, dPar, Frag, dFrag))
+    dW = 2 #bandwidth of OPO - assuming that it is +/- 2 nm
+
+    #every cell is calculated, and the ones that divide by zero are masked out afterwards
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        log_ratio = np.log(Par / (Frag + Par))
+
+        if P is None:
+            valid = (Par + Frag) != 0
+            efficiency = -1 * log_ratio
+
+            term1 = np.square(-1 * (Frag / (Par + Frag) / Par) * dPar)
+            term2 = np.square((1 / (Par + Frag)) * dFrag)
+            PE_stdev = np.sqrt(term1+term2)
+
+        else:
+            P, dP = np.asarray(P, dtype=float), np.asarray(dP, dtype=float)
+            valid = (P != 0) & ((Par + Frag) != 0)
+            efficiency = -(W / P) * log_ratio
+
+            term1 = np.square((log_ratio / -P) * dW)
+            term2 = np.square(((W * log_ratio) / np.square(P)) * dP)
+            term3 = np.square(-1 * ((1 / (Par + Frag) / P / Par * W * Frag)) * dPar)
+            term4 = np.square((W * 1 / (Par + Frag) / P) * dFrag)
+            PE_stdev = np.sqrt(term1+term2+term3+term4)
+
+    valid = valid & np.isfinite(efficiency) & np.isfinite(PE_stdev)
+    efficiency = np.where(valid, efficiency, np.nan)
+    PE_stdev = np.where(valid, PE_stdev, np.nan)
+
+    return efficiency, PE_stdev, valid
 
 def PE_calc(W, P, dP, Par, dPar, Frag, dFrag, update_output=None):
     '''Calculates photofragmentation efficiency with normlaization to laser power. Useage is:
     Wavelength, Power, Power stdev, base peak integration, base peak integration stdev, fragment peak integration, fragment peak integration stdev
+    Single values only - see PE_calc_matrix for every wavelength and fragment at once.
     '''
 
     # Check for division by zero
     if P == 0 or Par + Frag == 0:
         update_output(f'Division by zero error for wavelenth {W}nm. Power (P) is {P}, Parent integration is {Par} and Fragment integration is {Frag}.\n The sum of base peak integration (Par) and fragment peak integration (Frag) must be non-zero.\nTraceback: {traceback.format_exc()}\n')
-        QApplication.processEvents()  # Allow the GUI to update   
         raise ValueError('Value Error')
-   
-    dW = 2 #bandwidth of OPO - assuming that it is +/- 2 nm
-        
-    #calculate photofragmentation efficiency
-    efficiency = -(W / P) * np.log(Par / (Frag + Par))
 
-    #calculate standard deviatian in photofragmentation efficiency
-    try:
-        term1 = np.square((np.log(Par / (Par + Frag)) / -P) * dW)
-        term2 = np.square(((W * np.log(Par / (Par + Frag))) / np.square(P)) * dP)
-        term3 = np.square(-1 * ((1 / (Par + Frag) / P / Par * W * Frag)) * dPar)
-        term4 = np.square((W * 1 / (Par + Frag) / P) * dFrag)
+    efficiency, PE_stdev, _ = PE_calc_matrix(W, Par, dPar, Frag, dFrag, P=P, dP=dP)
 
-        PE_stdev = np.sqrt(term1+term2+term3+term4)
-
-        return [efficiency, PE_stdev]    
-    
-    except Exception as e:
-        update_output(f'Error encountered during calculation of photogfragmentaion efficiency at wavelength {W}nm: {e}\nTraceback: {traceback.format_exc()}\n')
-        QApplication.processEvents()  # Allow the GUI to update      
-        raise Exception('Photofragmentation efficiency calculation error')
+    return [efficiency[()], PE_stdev[()]]
 
 def PE_calc_noNorm(W, P, dP, Par, dPar, Frag, dFrag, update_output=None): 
     '''Calculates photofragmentation efficiency without normlaization to laser power. Useage is:
     Wavelength, Power, Power stdev, base peak integration, base peak integration stdev, fragment peak integration, fragment peak integration stdev
-    Note that W, P, and dP are dummy variables - kept it like this for functionality within main().
+    Note that W, P, and dP are dummy variables - kept it like this for functionality within main(). Single values only - see PE_calc_matrix for every wavelength and fragment at once.
     '''
     
     # Check for division by zero
     if Par + Frag == 0:
         update_output(f'Division by zero error for wavelenth {W}nm. Power (P) is {P}, Parent integration is {Par} and Fragment integration is {Frag}.\n The sum of base peak integration (Par) and fragment peak integration (Frag) must be non-zero.\nTraceback: {traceback.format_exc()}\n')
-        QApplication.processEvents()  # Allow the GUI to update     
         raise ValueError('Value Error')
 
-    #calculate photofragmentation efficiency
-    efficiency = -1 * np.log(Par / (Frag + Par))
-
-    #calculate standard deviatian in photofragmentation efficiency
-    try:
-        term1 = np.square(-1 * (Frag / (Par + Frag) / Par) * dPar)
-        term2 = np.square((1 / (Par + Frag)) * dFrag)
+    efficiency, PE_stdev, _ = PE_calc_matrix(W, Par, dPar, Frag, dFrag)
 
-        PE_stdev = np.sqrt(term1+term2)
-        
-        return [efficiency, PE_stdev]
-
-    except Exception as e:
-        update_output(f'Error encountered during calculation of photogfragmentaion efficiency at wavelength {W}nm: {e}\nTraceback: {traceback.format_exc()}\n')
-        QApplication.processEvents()  # Allow the GUI to update      
-        raise Exception('Photofragmentation efficiency calculation error')
+    return [efficiency[()], PE_stdev[()]]
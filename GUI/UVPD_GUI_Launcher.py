@@ -1,7 +1,14 @@
+import time
+launcher_start_time = time.perf_counter() #used to report how long the GUI takes to open
+
 from io import StringIO
 from datetime import datetime
 
 import importlib
+import importlib.util
+import importlib.metadata
+import json
+import hashlib
 from pathlib import Path
 import platform
 import os
@@ -9,7 +16,8 @@ import sys
 import shutil 
 import subprocess
 import stat
-import time
+import threading
+import traceback
 
 # Before the GUI launches, check that the user has the required packages to run the MobCal-MPI GUI
 #The most troublesome package is Git, which also requires GitHub desktop to be on the user's machine. First, we check if it is installed.
@@ -123,7 +131,8 @@ def add_to_path(new_path):
         os.environ['PATH'] = new_path + path_separator + os.environ['PATH']
 
 def check_git():
-    '''Checks if GitHub Desktop and Git are installed on the Users PC and adds it to PATH, and if it isn't, promts them to instal it before continuing'''
+    '''Checks if GitHub Desktop and Git are installed on the Users PC and adds it to PATH, and if it isn't, promts them to instal it before continuing.
+    Returns the paths that were added to PATH (GitHub Desktop directory, Git executable), so they can be cached.'''
     
     #Check for GitHub Desktop
     git_desktop_path = find_github_desktop()
@@ -149,13 +158,14 @@ def check_git():
         #If GitHub is found, add it to the system's PATH
         add_to_path(git_path)
 
+    return git_desktop_path, git_path
+
 #Now with those functions set up, we can check for the required python modules 
 
 def check_python_packages(required_packages):
+    #find_spec only locates the package, so nothing heavy (PyQt6, pandas, ...) is imported just to check that it is there
     for package in required_packages:
-        try:
-            importlib.import_module(package)
-        except ModuleNotFoundError:
+        if importlib.util.find_spec(package) is None:
             offer_package_install(package)
 
 def offer_package_install(package):
@@ -168,19 +178,85 @@ def offer_package_install(package):
     else:
         sys.exit('Exiting: Required package not installed.')
 
+#check if msconvert is available in the systems PATH
+def check_msconvert():
+    '''Returns the path of the msconvert executable, or None if it is not in the system PATH'''
+    return shutil.which('msconvert')
+
+#The checks above (registry and filesystem probing for Git, looking up packages) give the same answer on every launch unless something changes.
+#Their results are cached, and the cache is only used while the PATH, the Python installation, and the installed versions of the required packages are the same.
+#msconvert is not cached: finding it is a single PATH lookup, and ProteoWizard is often installed, updated, or removed without the PATH changing.
+ENVIRONMENT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.uvpd_analysis_cache', 'environment.json')
+REQUIRED_PACKAGES = ['PyQt6', 'pyteomics', 'numpy', 'lxml', 'pandas']
+
+def environment_fingerprint(system_path, required_packages):
+    '''Returns a hash of everything the cached environment checks depend on: the PATH, the Python version and executable, and the version of each required package'''
+    package_versions = []
+    for package in required_packages:
+        try:
+            package_versions.append(f'{package}={importlib.metadata.version(package)}')
+        except importlib.metadata.PackageNotFoundError:
+            package_versions.append(f'{package}=None')
+
+    fingerprint = '|'.join([system_path, sys.version, sys.executable, platform.system()] + package_versions)
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+def load_environment_cache(fingerprint):
+    '''Returns the cached results of the environment checks, or None if there are none for this fingerprint (or a cached path no longer exists)'''
+    try:
+        with open(ENVIRONMENT_CACHE_FILE, 'r') as file:
+            environment = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(environment, dict) or environment.get('fingerprint') != fingerprint:
+        return None
+
+    #an uninstalled program invalidates the cache even if the PATH has not changed
+    for key in ('git_desktop_path', 'git_path'):
+        if not isinstance(environment.get(key), str) or not os.path.exists(environment[key]):
+            return None
+
+    return environment
+
+def save_environment_cache(environment):
+    '''Writes the results of the environment checks to the cache. Failing to write the cache is not a problem - the checks just run again next time.'''
+    try:
+        os.makedirs(os.path.dirname(ENVIRONMENT_CACHE_FILE), exist_ok=True)
+        with open(ENVIRONMENT_CACHE_FILE, 'w') as file:
+            json.dump(environment, file)
+    except OSError:
+        pass
+
 if __name__ == '__main__':
-    #Check that github desktop is installed
-    check_git()
+    system_path = os.environ.get('PATH', '') #before Git / GitHub Desktop are added to it
+    environment = load_environment_cache(environment_fingerprint(system_path, REQUIRED_PACKAGES))
+    environment_cached = environment is not None
 
-    #check that all required python modules are installed
-    required_packages = ['PyQt6', 'pyteomics', 'numpy', 'lxml', 'pandas']
-    check_python_packages(required_packages)
+    if environment_cached:
+        add_to_path(environment['git_desktop_path'])
+        add_to_path(environment['git_path'])
+
+    else:
+        #Check that github desktop is installed
+        git_desktop_path, git_path = check_git()
+
+        #check that all required python modules are installed
+        check_python_packages(REQUIRED_PACKAGES)
+
+        #the fingerprint is taken again in case packages were installed above
+        save_environment_cache({'fingerprint': environment_fingerprint(system_path, REQUIRED_PACKAGES), 'git_desktop_path': git_desktop_path, 'git_path': git_path})
+
+    # Check if msconvert is available (on every launch - see above)
+    if check_msconvert() is None:
+        print('The msconvert executable is not available on your machine. Please install ProteoWizard and/or make sure the directory that contains msconvert it is in your system PATH. Please see the readme on the main GitHub page.')
+        sys.exit(1)
 
 #import python libraries once it is verified that they are installed
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QCheckBox, QTextEdit, QFileDialog, QTextEdit, QMessageBox
-from PyQt6.QtGui import QTextCursor
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QCheckBox, QTextEdit, QFileDialog, QTextEdit, QMessageBox, QSpinBox, QProgressBar, QComboBox, QTableWidget, QTableWidgetItem
+from PyQt6.QtCore import Qt, QObject, QThread, QTimer, QPointF, QRectF, pyqtSignal
+from PyQt6.QtGui import QTextCursor, QPainter, QPen, QColor, QPolygonF
 from PyQt6 import QtWidgets
-import numpy as np
 
 #The GUI is likely to the updated throughout the years, so its best practice to implement some update functionality - users may not check GitHub frequently. 
 def get_latest_commit_sha(repo_url, branch='HEAD'):
@@ -240,6 +316,303 @@ class TextRedirect(StringIO):
         # Invoke the stored callback function to notify external components with the written text
         self.update_output(text)
 
+# Define a worker that runs the analysis pipeline off of the GUI thread. Everything it reports goes back to the GUI through signals.
+class AnalysisWorker(QObject):
+    log = pyqtSignal(str)                  # text for the output window
+    progress = pyqtSignal(str, int, int)   # stage of the pipeline, files done, total files
+    result = pyqtSignal(object)            # dictionary with the msconvert results and the files written by the run (None if the run crashed)
+    finished = pyqtSignal()                # emitted last, whatever happened
+
+    def __init__(self, settings, mode='analysis'):
+        super().__init__()
+        self.settings = settings
+        self.mode = mode #'analysis', 'batch' (every dataset under the directory), or 'watch' (integrate the mzml files as they are written)
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        '''Asks the pipeline to stop cleanly between files'''
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            self.result.emit(self.run_pipeline())
+
+        except Exception as e: #anything unexpected is reported instead of killing the thread
+            self.log.emit(f'Unexpected error encountered during the analysis: {e}\nTraceback: {traceback.format_exc()}\n')
+            self.result.emit(None)
+
+        finally:
+            self.finished.emit()
+
+    def run_pipeline(self):
+        '''msconvert (if requested), photofragmentation efficiency calculation, and raw data export (if requested) - see run_analysis in Python/pipeline.py,
+        run_batch in Python/batch.py for every dataset under the directory, or watch_directory in Python/watch.py to integrate the mzml files while they are being acquired'''
+        if self.mode == 'batch':
+            from Python.batch import run_batch
+            return run_batch(**self.settings, update_output=self.log.emit, progress_callback=self.progress.emit, cancel_event=self.cancel_event)
+
+        if self.mode == 'watch':
+            from Python.watch import watch_directory
+            return watch_directory(**self.settings, update_output=self.log.emit, progress_callback=self.progress.emit, cancel_event=self.cancel_event)
+
+        from Python.pipeline import run_analysis
+
+        return run_analysis(**self.settings, update_output=self.log.emit, progress_callback=self.progress.emit, cancel_event=self.cancel_event)
+
+# Define a worker that runs one function of the analysis code off of the GUI thread (reading the spectra for window tuning, or proposing windows), reporting through signals like AnalysisWorker
+class SpectraWorker(QObject):
+    log = pyqtSignal(str)             # text for the output window
+    progress = pyqtSignal(int, int)   # files done, total files
+    result = pyqtSignal(object)       # what the function returned (None if it failed or was cancelled)
+    finished = pyqtSignal()           # emitted last, whatever happened
+
+    def __init__(self, function, *args):
+        super().__init__()
+        self.function = function #called as function(*args, update_output=..., progress_callback=..., cancel_event=...)
+        self.args = args
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            self.result.emit(self.function(*self.args, update_output=self.log.emit, progress_callback=self.progress.emit, cancel_event=self.cancel_event))
+
+        except Exception as e: #anything unexpected is reported instead of killing the thread
+            self.log.emit(f'Unexpected error encountered while reading the spectra: {e}\nTraceback: {traceback.format_exc()}\n')
+            self.result.emit(None)
+
+        finally:
+            self.finished.emit()
+
+# Define a widget that draws the averaged mass spectrum with the integration windows as shaded bands that can be dragged with the mouse
+class SpectrumView(QWidget):
+    windows_changed = pyqtSignal()   # emitted every time a window is moved
+
+    EDGE_PIXELS = 5 #how close (in pixels) the mouse has to be to the edge of a band to grab the edge instead of the whole band
+
+    def __init__(self, mz, intensity, windows):
+        super().__init__()
+        self.mz = mz
+        self.intensity = intensity
+        self.windows = windows #[[lower, upper], ...] - the base peak window first, then the fragment windows
+        self.drag = None       #(window, part being dragged: 0 = lower edge, 1 = upper edge, None = the whole band, m/z where the drag started, window when the drag started)
+        self.reset_view()
+        self.setMouseTracking(True)
+        self.setMinimumHeight(250)
+
+    def reset_view(self):
+        '''Shows the whole m/z range of the spectrum'''
+        self.view = [float(self.mz[0]), float(self.mz[-1])]
+        self.update()
+
+    def to_x(self, mz):
+        return (mz - self.view[0]) / (self.view[1] - self.view[0]) * (self.width() - 1)
+
+    def to_mz(self, x):
+        return self.view[0] + x / max(self.width() - 1, 1) * (self.view[1] - self.view[0])
+
+    def paintEvent(self, event):
+        import numpy as np
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor('white'))
+        width, height = self.width(), self.height()
+
+        #integration windows: the base peak in red, the fragments in blue
+        for j, (lower, upper) in enumerate(self.windows):
+            colour = QColor(220, 60, 60, 70) if j == 0 else QColor(60, 100, 220, 70)
+            left, right = self.to_x(lower), self.to_x(upper)
+            painter.fillRect(QRectF(left, 0, right - left, height), colour)
+            colour.setAlpha(255)
+            painter.setPen(QPen(colour, 1))
+            painter.drawLine(QPointF(left, 0), QPointF(left, height))
+            painter.drawLine(QPointF(right, 0), QPointF(right, height))
+            painter.drawText(QPointF(left + 2, 12), 'Base' if j == 0 else str(j))
+
+        #the spectrum, drawn as the highest intensity within each column of pixels so that no peak is lost however far it is zoomed out
+        first, last = np.searchsorted(self.mz, self.view)
+        if last - first > 1:
+            columns = ((self.mz[first:last] - self.view[0]) / (self.view[1] - self.view[0]) * (width - 1)).astype(int)
+            column_starts = np.flatnonzero(np.concatenate([[True], np.diff(columns) > 0]))
+            peaks = np.maximum.reduceat(self.intensity[first:last], column_starts)
+            top = max(float(np.max(peaks)), 1e-12)
+            y = height - 20 - peaks / top * (height - 40)
+            painter.setPen(QPen(QColor('black'), 1))
+            painter.drawPolyline(QPolygonF([QPointF(float(x), float(y_value)) for x, y_value in zip(columns[column_starts], y)]))
+
+        painter.setPen(QPen(QColor('black'), 1))
+        painter.drawText(QPointF(2, height - 4), f'{self.view[0]:.2f}')
+        painter.drawText(QPointF(width - 60, height - 4), f'{self.view[1]:.2f} m/z')
+        painter.end()
+
+    def grab_at(self, x):
+        '''Returns the window and the part of it (0 = lower edge, 1 = upper edge, None = the whole band) under the mouse, or None'''
+        for j, window in enumerate(self.windows):
+            for part in (0, 1):
+                if abs(x - self.to_x(window[part])) <= self.EDGE_PIXELS:
+                    return j, part
+
+        for j, (lower, upper) in enumerate(self.windows):
+            if self.to_x(lower) < x < self.to_x(upper):
+                return j, None
+
+        return None
+
+    def mousePressEvent(self, event):
+        grabbed = self.grab_at(event.position().x())
+        if grabbed is not None and event.button() == Qt.MouseButton.LeftButton:
+            j, part = grabbed
+            self.drag = (j, part, self.to_mz(event.position().x()), list(self.windows[j]))
+
+    def mouseMoveEvent(self, event):
+        x = event.position().x()
+
+        #without a drag, the cursor shows what would be grabbed
+        if self.drag is None:
+            grabbed = self.grab_at(x)
+            if grabbed is None:
+                self.setCursor(Qt.CursorShape.ArrowCursor)
+            else:
+                self.setCursor(Qt.CursorShape.OpenHandCursor if grabbed[1] is None else Qt.CursorShape.SizeHorCursor)
+            return
+
+        j, part, start_mz, (lower, upper) = self.drag
+        mz = self.to_mz(x)
+        if part is None:
+            shift = round(mz - start_mz, 2)
+            self.windows[j] = [round(lower + shift, 2), round(upper + shift, 2)]
+        elif part == 0:
+            self.windows[j] = [round(min(mz, upper - 0.01), 2), upper]
+        else:
+            self.windows[j] = [lower, round(max(mz, lower + 0.01), 2)]
+
+        self.update()
+        self.windows_changed.emit()
+
+    def mouseReleaseEvent(self, event):
+        self.drag = None
+
+    def wheelEvent(self, event):
+        '''Zooms in and out around the m/z under the mouse'''
+        factor = 0.8 if event.angleDelta().y() > 0 else 1.25
+        centre = self.to_mz(event.position().x())
+        lower = max(centre - (centre - self.view[0]) * factor, float(self.mz[0]))
+        upper = min(centre + (self.view[1] - centre) * factor, float(self.mz[-1]))
+        if upper - lower > 0.1:
+            self.view = [lower, upper]
+            self.update()
+
+    def mouseDoubleClickEvent(self, event):
+        self.reset_view()
+
+# Define a window to tune the integration windows by dragging them over the averaged spectrum, with the photofragmentation efficiency table recalculated as they move
+class WindowTuningWindow(QWidget):
+    def __init__(self, tuning_data, base_peak_range, fragment_ion_ranges, apply_windows):
+        super().__init__()
+        self.tuning_data = tuning_data
+        self.apply_windows = apply_windows #called with the base peak and fragment ion text for the main window
+
+        #without a base peak window, start with one around the most intense peak
+        if base_peak_range is None:
+            top_mz = float(tuning_data['display_mz'][tuning_data['display_intensity'].argmax()])
+            base_peak_range = [round(top_mz - 1., 2), round(top_mz + 1., 2)]
+
+        self.spectrum_view = SpectrumView(tuning_data['display_mz'], tuning_data['display_intensity'], [list(base_peak_range)] + [list(window) for window in fragment_ion_ranges])
+        self.spectrum_view.windows_changed.connect(self.schedule_recalculation)
+
+        self.help_label = QLabel('Drag the edges of a window (or the whole band) to move it. Scroll to zoom, double-click to show the whole spectrum. '
+                                 'The table is recalculated from spectra held in memory, integrating on the raw profile points.')
+        self.help_label.setWordWrap(True)
+
+        self.add_button = QPushButton('Add fragment window')
+        self.add_button.clicked.connect(self.add_fragment_window)
+        self.remove_button = QPushButton('Remove last fragment window')
+        self.remove_button.clicked.connect(self.remove_fragment_window)
+        self.apply_button = QPushButton('Apply windows to the main window')
+        self.apply_button.clicked.connect(self.apply_to_main_window)
+
+        self.windows_label = QLabel('')
+        self.windows_label.setWordWrap(True)
+        self.timing_label = QLabel('')
+        self.table = QTableWidget()
+
+        #while a window is dragged, the table is recalculated at most once per timer interval
+        self.recalculation_timer = QTimer(self)
+        self.recalculation_timer.setSingleShot(True)
+        self.recalculation_timer.setInterval(30)
+        self.recalculation_timer.timeout.connect(self.recalculate)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.add_button)
+        button_layout.addWidget(self.remove_button)
+        button_layout.addWidget(self.apply_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.help_label)
+        layout.addWidget(self.spectrum_view, stretch=2)
+        layout.addLayout(button_layout)
+        layout.addWidget(self.windows_label)
+        layout.addWidget(self.timing_label)
+        layout.addWidget(self.table, stretch=1)
+        self.setLayout(layout)
+
+        self.setGeometry(350, 200, 1000, 750)
+        self.setWindowTitle('Tune integration windows')
+        self.recalculate()
+
+    def window_text(self):
+        '''Returns the base peak and fragment ion windows as the text of the main window fields'''
+        base_peak_range, *fragment_ion_ranges = self.spectrum_view.windows
+        return f'{base_peak_range[0]},{base_peak_range[1]}', ','.join(f'({lower},{upper})' for lower, upper in fragment_ion_ranges)
+
+    def schedule_recalculation(self):
+        if not self.recalculation_timer.isActive():
+            self.recalculation_timer.start()
+
+    def recalculate(self):
+        '''Recalculates the photofragmentation efficiency table for the current windows and shows it'''
+        from Python.window_tuning import window_tuning_table
+        base_peak_text, fragment_text = self.window_text()
+        self.windows_label.setText(f'Base peak: {base_peak_text}    Fragments: {fragment_text or "none"}')
+
+        base_peak_range, *fragment_ion_ranges = self.spectrum_view.windows
+        start_time = time.perf_counter()
+        PE_data, column_names, messages = window_tuning_table(self.tuning_data, base_peak_range, fragment_ion_ranges)
+        calculation_time = time.perf_counter() - start_time
+
+        #the cells are reused while the windows move, and only created when the table grows
+        self.table.setRowCount(PE_data.shape[0])
+        self.table.setColumnCount(PE_data.shape[1])
+        self.table.setHorizontalHeaderLabels(column_names)
+        for row in range(PE_data.shape[0]):
+            for column in range(PE_data.shape[1]):
+                item = self.table.item(row, column)
+                if item is None:
+                    self.table.setItem(row, column, QTableWidgetItem(f'{PE_data[row, column]:.6f}'))
+                else:
+                    item.setText(f'{PE_data[row, column]:.6f}')
+
+        nan_note = f' {len(messages)} wavelengths have values that could not be calculated (nan).' if messages else ''
+        self.timing_label.setText(f'{PE_data.shape[0]} wavelengths x {len(self.spectrum_view.windows)} windows recalculated in {1000 * calculation_time:.1f} ms.{nan_note}')
+
+    def add_fragment_window(self):
+        '''Adds a fragment window in the middle of the part of the spectrum that is shown'''
+        lower, upper = self.spectrum_view.view
+        centre, half_width = (lower + upper) / 2, max(min((upper - lower) / 50, 1.), 0.05)
+        self.spectrum_view.windows.append([round(centre - half_width, 2), round(centre + half_width, 2)])
+        self.spectrum_view.update()
+        self.recalculate()
+
+    def remove_fragment_window(self):
+        if len(self.spectrum_view.windows) > 1:
+            self.spectrum_view.windows.pop()
+            self.spectrum_view.update()
+            self.recalculate()
+
+    def apply_to_main_window(self):
+        if len(self.spectrum_view.windows) < 2:
+            QMessageBox.warning(self, 'No fragment windows', 'At least one fragment window is needed for the analysis. Please add one first.')
+            return
+        self.apply_windows(*self.window_text())
+
 # Define a GUI class that inherits properties from PyQT6 QWidget
 class GUI(QWidget):
     def __init__(self):
@@ -272,12 +645,54 @@ class GUI(QWidget):
         # Extract mzML from .wiff Flag
         self.extract_mzml_checkbox = QCheckBox('Extract mzML files from .wiff?')
 
+        # Conversion profile - how msconvert writes the arrays of the mzML files
+        self.conversion_profile_label = QLabel('mzML conversion profile (used when extracting from .wiff):')
+        self.conversion_profile_combo_box = QComboBox()
+        self.conversion_profile_combo_box.addItem('Default (uncompressed 64-bit arrays, largest files)', 'default')
+        self.conversion_profile_combo_box.addItem('Compact (32-bit intensities, zlib compressed)', 'compact')
+        self.conversion_profile_combo_box.addItem('Numpress (MS-Numpress + zlib, smallest files, intensities kept to ~0.01%)', 'numpress')
+
         # PowerNorm Flag
         self.power_norm_checkbox = QCheckBox('Normalize to Laser Power? (Requires power data file)')
 
         # PrintRawData Flag
         self.print_raw_data_checkbox = QCheckBox('Print Raw Data?')
 
+        # Raw data standard deviation Flag
+        self.raw_data_stdev_checkbox = QCheckBox('Also print the standard deviation across the scans of each raw data point?')
+
+        # Per-scan integral export Flag
+        self.scan_integrals_checkbox = QCheckBox('Save the integral of every scan (with scan start times) for quality control?')
+
+        # Raw data format
+        self.raw_data_format_label = QLabel('Raw data format:')
+        self.raw_data_format_combo_box = QComboBox()
+        self.raw_data_format_combo_box.addItem('.csv (every 0.02 Da m/z point)', 'csv')
+        self.raw_data_format_combo_box.addItem('Sparse .csv (m/z points that are zero at every wavelength are left out)', 'sparse')
+        self.raw_data_format_combo_box.addItem('Binary numpy .npz (one array per column)', 'npz')
+        self.raw_data_format_combo_box.addItem('Memory-mapped .npy matrix with a .json of its axes (fast slicing, see Python/raw_data_store.py)', 'mmap')
+
+        # Batch Flag - analyze every dataset (e.g. one directory per CV) under the directory
+        self.batch_checkbox = QCheckBox('Batch: analyze every dataset under the directory? (e.g. one directory per CV, combined into one table)')
+
+        # Watch Flag - integrate the mzml files as they are written during an acquisition
+        self.watch_checkbox = QCheckBox('Watch: integrate each mzML file as soon as it is written? (runs until every wavelength in the power data file is done, or Cancel)')
+
+        # Raw integration Flag
+        self.raw_integration_checkbox = QCheckBox('Integrate on raw profile points? (Unchecked uses the 0.01 Da interpolation grid)')
+
+        # Number of worker processes used to integrate the mzml files
+        self.workers_label = QLabel('Number of worker processes (1 = process the mzml files one after another):')
+        self.workers_spin_box = QSpinBox()
+        self.workers_spin_box.setRange(1, os.cpu_count() or 1)
+        self.workers_spin_box.setValue(1)
+
+        # Number of bootstrap resamples for confidence intervals of the photofragmentation efficiency
+        self.bootstrap_label = QLabel('Bootstrap resamples for confidence intervals (0 = off, e.g. 1000):')
+        self.bootstrap_spin_box = QSpinBox()
+        self.bootstrap_spin_box.setRange(0, 100000)
+        self.bootstrap_spin_box.setValue(0)
+
         # Power Data File Name
         self.power_data_label = QLabel('Power Data .csv file (Directory and/or Filename):')
         self.power_data_line_edit = QLineEdit()
@@ -292,6 +707,32 @@ class GUI(QWidget):
         self.run_button = QPushButton('Analyze spectra')
         self.run_button.clicked.connect(self.run)
 
+        # Propose Button - fill the base peak and fragment ion fields from the peaks of the spectrum summed over every wavelength
+        self.propose_button = QPushButton('Propose windows from the summed spectrum')
+        self.propose_button.clicked.connect(self.propose_windows)
+
+        # Tune Button - drag the integration windows over the averaged spectrum and see the photofragmentation efficiencies change
+        self.tune_button = QPushButton('Tune windows interactively (reads every mzML file once)')
+        self.tune_button.clicked.connect(self.tune_windows)
+
+        # Cancel Button - stops the analysis between files
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_analysis)
+
+        # Progress bar, with throughput and estimated time remaining
+        self.progress_bar = QProgressBar()
+        self.progress_label = QLabel('')
+
+        # The worker thread (and the worker that runs in it) while an analysis is running
+        self.analysis_thread = None
+        self.analysis_worker = None
+
+        # The same while the spectra are read for window tuning (or to propose windows), and the tuning window once it is open
+        self.tuning_thread = None
+        self.tuning_worker = None
+        self.tuning_window = None
+
         # Layout
         layout = QVBoxLayout()
         layout.addWidget(self.directory_label)
@@ -305,8 +746,23 @@ class GUI(QWidget):
         layout.addWidget(self.fragment_ion_line_edit)
 
         layout.addWidget(self.extract_mzml_checkbox)
+        layout.addWidget(self.conversion_profile_label)
+        layout.addWidget(self.conversion_profile_combo_box)
+        layout.addWidget(self.batch_checkbox)
+        layout.addWidget(self.watch_checkbox)
         layout.addWidget(self.power_norm_checkbox)
         layout.addWidget(self.print_raw_data_checkbox)
+        layout.addWidget(self.raw_data_stdev_checkbox)
+        layout.addWidget(self.raw_data_format_label)
+        layout.addWidget(self.raw_data_format_combo_box)
+        layout.addWidget(self.raw_integration_checkbox)
+        layout.addWidget(self.scan_integrals_checkbox)
+
+        layout.addWidget(self.workers_label)
+        layout.addWidget(self.workers_spin_box)
+
+        layout.addWidget(self.bootstrap_label)
+        layout.addWidget(self.bootstrap_spin_box)
 
         layout.addWidget(self.power_data_label)
         layout.addWidget(self.power_data_line_edit)
@@ -314,7 +770,13 @@ class GUI(QWidget):
         layout.addWidget(self.output_label)
         layout.addWidget(self.output_text_edit)
 
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.progress_label)
+
+        layout.addWidget(self.propose_button)
+        layout.addWidget(self.tune_button)
         layout.addWidget(self.run_button)
+        layout.addWidget(self.cancel_button)
 
         self.setLayout(layout)
 
@@ -338,252 +800,258 @@ class GUI(QWidget):
     #Function that executes the code when the run button is clicked    
     def run(self):
         
-        start_time = time.time()
-
         # Redirect print output to QTextEdit
         sys.stdout = TextRedirect(textWritten=self.update_output)
 
         #print date and time to keep track of output from multiple runs. 
         now = datetime.now().replace(microsecond=0)
         print(f'{now}\n-------------\n')
-        QApplication.processEvents()  # Allow the GUI to update 
 
-        ########################################
-        '''Directory Input and error handling'''
-        ########################################
+        ##############################################################
+        '''Input error handling (shared with the command line tool)'''
+        ##############################################################
 
-        directory = self.directory_line_edit.text()
+        #The checks themselves live in Python/pipeline.py. Each raises a ValueError with a message for the user.
+        #(imported here rather than at startup, since it pulls in numpy and the rest of the analysis code)
+        from Python.pipeline import parse_base_peak_range, parse_fragment_ion_ranges, check_power_data_file
 
-        if not os.path.isdir(directory):
-            print('The directory specified does not exist. Please provide a valid file path.\n')
-            QApplication.processEvents()  # Allow the GUI to update 
-            return
+        power_data_file_name = self.power_data_line_edit.text().strip() #remove any trailing whitespaces from the filename
 
-        ########################################
-        '''Base peak input and error handling'''
-        ########################################
         try:
-            base_peak_input = self.base_peak_line_edit.text().replace(' ','').strip() #strip any whitespace within, before, or after the input
+            directory = self.directory_line_edit.text()
+            if not os.path.isdir(directory):
+                raise ValueError('The directory specified does not exist. Please provide a valid file path.\n')
 
-            #check that base peak range is not empty
-            if not base_peak_input:
-                print('The field for the base peak range is empty! Please populate it with two comma separated values.\n')
-                QApplication.processEvents()  # Allow the GUI to update 
-                return
+            base_peak_range = parse_base_peak_range(self.base_peak_line_edit.text())
+            fragment_ion_ranges = parse_fragment_ion_ranges(self.fragment_ion_line_edit.text())
 
-            #check that there is at least one comma in the base peak range
-            if ',' not in base_peak_input:
-                print('No commas were found in the base peak range input. This needs to be two, comma separated numbers!\n')
-                return
-            
-            try: 
-                base_peak_range = list(map(float, base_peak_input.split(','))) #if there is at least 1 comma in the function, this shouldn't fail unless there are non-numeric characters
-            except ValueError:
-                print('Base peak input contains non-numeric characters!\n') #will throw value error because you cant float, for example, a100
-                QApplication.processEvents()  # Allow the GUI to update 
-                return
+            # Check the power data file, if the photofragmentation efficiency is normalized to laser power
+            if self.power_norm_checkbox.isChecked():
+                check_power_data_file(power_data_file_name)
 
-            #check that base peak range contains only two comma separated values
-            if len(base_peak_range) != 2:
-                print(f'You have specified {len(base_peak_range)} comma separated values for the base peak range.\nThe input for the base peak range can only be exactly two numbers separated by a comma (upper and lower limit of the m/z that surrounds the parent ion peak).\n')
-                QApplication.processEvents()  # Allow the GUI to update 
-                return
-                                   
-        except Exception as e: #for any other case that I can't think of
-            print(f'Error parsing the input for the base peak: {e}\nTraceback: {traceback.format_exc()}\n')
-            QApplication.processEvents()  # Allow the GUI to update 
-            return 
-
-        ############################################
-        '''Fragment peak input and error handling'''
-        ############################################
+            # If the power_norm flag is unchecked, overwrite the contents of that input with None (will also work if no file is given)
+            else:
+                power_data_file_name = None
 
-        fragment_ion_input = self.fragment_ion_line_edit.text().replace(' ','').strip() #strip any whitespace within, before, or after the input
+        except ValueError as ve:
+            print(f'{ve}\n')
+            return
 
-        #check that fragment peak range is not empty
-        if not fragment_ion_input:
-            print('The field for the fragment peak range is empty! Please populate it using the proper format.\n')
-            QApplication.processEvents()  # Allow the GUI to update 
+        except Exception as e: #for any other case that I can't think of
+            print(f'Error parsing the input: {e}\nTraceback: {traceback.format_exc()}\n')
             return
-        
-        else:
-            try:
-                # Check if the input contains any commas
-                if ',' not in fragment_ion_input:
-                    print('No commas were found in the fragment peak range input. Please use the specified format!\n')
-                    QApplication.processEvents()  # Allow the GUI to update 
-                    return
-                
-                if '(' not in fragment_ion_input or ')' not in fragment_ion_input:
-                    print('No brackets were found in the fragment peak range input. Please use the specified format!\n')
-                    QApplication.processEvents()  # Allow the GUI to update 
-                    return                
-                
-                # Check if the input is in the form (number,number),(number,number),...
-                try: 
-                    fragment_ion_ranges = [list(map(float, pair.strip('()').split(','))) for pair in fragment_ion_input.split('),(')]
-                
-                except ValueError as ve:
-                    print(f'Error parsing fragment ion input: {ve}\nFragment peak input likely contains non-numeric characters\n') #will throw value error because you cant float, for example, a100
-                    QApplication.processEvents()  # Allow the GUI to update 
-                    return
-                
-            except Exception as e:
-                print(f'Other error when parsing fragment ion input: {e}\nTraceback: {traceback.format_exc()}\n')
-                QApplication.processEvents()  # Allow the GUI to update 
-                return
-                
-            # Check if each bracket in the fragment ion input has exactly two numbers
-            if any(len(pair) != 2 for pair in fragment_ion_ranges):
-                print('The input for each fragment ion (ie. the contents within each bracket) can only be exactly two numbers separated by a comma (upper and lower limit of the m/z that surrounds the fragment ion peak).\n')
-                return
-        
+
         #######################################
         '''Define radio buttons (checkboxes)'''
         #######################################
         
         extract_mzml_from_wiff_flag = self.extract_mzml_checkbox.isChecked() #Checkbox for extracting .wiff files
-        power_norm_flag = self.power_norm_checkbox.isChecked()               #Checkbox for normalizing photofragmentation efficiency to laser power
+        conversion_profile = self.conversion_profile_combo_box.currentData() #How msconvert writes the arrays of the mzML files
         print_raw_data_flag = self.print_raw_data_checkbox.isChecked()       #Checkbox for printing the mass spectra used to calculate photofragmentation efficiency 
-        
-        ############################################
-        '''Fragment peak input and error handling'''
-        ############################################        
-        
-        power_data_file_name = self.power_data_line_edit.text().strip() #remove any trailing whitespaces from the filename
-
-        #function to check if entires in the .csv are numeric
-        def is_numeric_list(row):
-            try:
-                # Try to convert each entry in the row to a float
-                float_entries = [float(entry) for entry in row]
-                return True
-            except ValueError:
-                return False
-        
-        # Check if the file exists
-        if power_norm_flag:
-            if not os.path.isfile(power_data_file_name):
-                print('The power data file could not be found. Please eheck that you have specified the directory and file name (with its extension!) properly.')
-                QApplication.processEvents()  # Allow the GUI to update 
-                return
-            
-            else:
-                # Check if the file has a .csv extension
-                if not power_data_file_name.lower().endswith('.csv'):
-                    print('The power data file specified is not a .csv. Please ensure it is a comma separated value file (.csv).\n')
-                    QApplication.processEvents()  # Allow the GUI to update 
-                    return
-                
-                else:
-                    #Check that the .csv is the correct format before starting the calculation. 
-                    try:
-                        # Read the first row of the CSV to check the number of columns
-                        with open(power_data_file_name, 'r') as file:
-                            first_row = file.readline().strip().split(',')
-                        
-                            # Check if the .csv contains three columns
-                            if len(first_row) != 3:
-                                print(f'The power data file .csv contains {len(first_row)} columns! Each row must only contain three numeric values with the following format:\nWavelength(nm), Laser power, and the StDev of the laser power.')
-                                QApplication.processEvents()  # Allow the GUI to update 
-                                return
-                            
-                            # Read the remaining rows to check if all entries are numeric
-                            else:
-                                
-                                for line in file:
-                                    row = line.strip().split(',')
-                                    if len(row) != 3 or not is_numeric_list(row):
-                                        print(f'This line in the .csv file: {line}\ndoes not meet the required format. Each row must only contain three numeric values with the following format:\nWavelength(nm), Laser power, and the StDev of the laser power.')
-                                        QApplication.processEvents()  # Allow the GUI to update 
-                                        return
-                    except Exception as e:
-                        print(f'Error encounters when attempting to open {power_data_file_name}:\n {e}\nTraceback: {traceback.format_exc()}')
-                        QApplication.processEvents()  # Allow the GUI to update 
-                        return
-
-        # If the power_norm flag is unchecked, overwrite the contents of that input with None (will also work if no file is given)
-        else:
-            power_data_file_name = None 
+        raw_data_format = self.raw_data_format_combo_box.currentData()       #File format of the printed mass spectra
+        raw_data_stdev_flag = self.raw_data_stdev_checkbox.isChecked()       #Checkbox for printing the standard deviation of the mass spectra too
+        raw_integration_flag = self.raw_integration_checkbox.isChecked()     #Checkbox for integrating on the raw profile points instead of the interpolation grid
+        workers = self.workers_spin_box.value()                              #Number of worker processes used to integrate the mzml files
+        bootstrap_resamples = self.bootstrap_spin_box.value()                #Number of bootstrap resamples (0 = no confidence intervals)
+        scan_integrals_flag = self.scan_integrals_checkbox.isChecked()       #Checkbox for saving the integral of every scan
+        batch_flag = self.batch_checkbox.isChecked()                         #Checkbox for analyzing every dataset under the directory
+        watch_flag = self.watch_checkbox.isChecked()                         #Checkbox for integrating the mzml files as they are written
+
+        if batch_flag and watch_flag:
+            print('Batch and Watch can not be used together. Please uncheck one of them.\n')
+            return
 
         ###################################
         '''Preparing for code deployment'''
         ###################################           
 
-        start = time.time() #get the time to determine overall calculation time. 
-        mzml_directory = os.path.join(directory, 'mzml_directory') #directory for mzml files to be written to / where they are stored
+        # The analysis runs in a worker thread so that the GUI stays responsive and the run can be cancelled
+        settings = {
+            'directory': directory,
+            'base_peak_range': base_peak_range,
+            'fragment_ion_ranges': fragment_ion_ranges,
+            'power_data_file_name': power_data_file_name,
+            'extract_mzml_from_wiff': extract_mzml_from_wiff_flag,
+            'conversion_profile': conversion_profile,
+            'print_raw_data': print_raw_data_flag,
+            'raw_data_format': raw_data_format,
+            'raw_data_stdev': raw_data_stdev_flag,
+            'integration_method': 'raw' if raw_integration_flag else 'grid',
+            'workers': workers,
+            'bootstrap_resamples': bootstrap_resamples,
+            'export_scan_integrals': scan_integrals_flag,
+        }
+        self.start_analysis(settings, mode='batch' if batch_flag else 'watch' if watch_flag else 'analysis')
+
+    def start_analysis(self, settings, mode='analysis'):
+        '''Starts the analysis pipeline (or a batch or watch, see AnalysisWorker) in a QThread and connects its signals to the output window, progress bar, and run/cancel buttons'''
+        self.analysis_thread = QThread()
+        self.analysis_worker = AnalysisWorker(settings, mode=mode)
+        self.analysis_worker.moveToThread(self.analysis_thread)
+
+        self.analysis_thread.started.connect(self.analysis_worker.run)
+        self.analysis_worker.log.connect(self.update_output)
+        self.analysis_worker.progress.connect(self.update_progress)
+        self.analysis_worker.finished.connect(self.analysis_thread.quit)
+        self.analysis_worker.finished.connect(self.analysis_worker.deleteLater)
+        self.analysis_thread.finished.connect(self.analysis_thread.deleteLater)
+        self.analysis_thread.finished.connect(self.analysis_finished)
+
+        self.run_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.progress_bar.setValue(0)
+        self.progress_label.setText('')
+        self.progress_stage = None
+
+        self.analysis_thread.start()
+
+    def cancel_analysis(self):
+        '''Asks the worker to stop - it finishes the file it is working on first'''
+        if self.analysis_worker is not None:
+            self.analysis_worker.cancel()
+            self.cancel_button.setEnabled(False)
+            self.update_output('Cancelling... the analysis will stop once the current file is finished.\n')
+
+    def update_progress(self, stage, done, total):
+        '''Updates the progress bar, along with the throughput and estimated time remaining for the current stage'''
         
-        # Convert contents of each wiff file into an mzml (if requested)
-        if extract_mzml_from_wiff_flag:
-            print('Starting extraction of .wiff files. You may see a command prompt interface show up.\n\n')
-            QApplication.processEvents()  # Allow the GUI to update  
-            # List .wiff Files in the Directory and 
-            wiff_files = [f for f in os.listdir(directory) if f.endswith('.wiff')]
-
-            if len(wiff_files) == 0:
-                print(f'There are no .wiff files present in {directory} to extract! Please specify a directory that contains .wiff files if you wish to extract them.\n')
-                QApplication.processEvents()  # Allow the GUI to update  
-                return
+        #the timer restarts for each stage of the pipeline (msconvert, integration, raw data export)
+        if stage != self.progress_stage:
+            self.progress_stage = stage
+            self.progress_stage_start = time.time()
+
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+
+        elapsed_time = time.time() - self.progress_stage_start
+        if done > 0 and elapsed_time > 0:
+            throughput = done / elapsed_time
+            eta = (total - done) / throughput
+            self.progress_label.setText(f'{stage}: {done}/{total} files, {throughput:.2f} files/s, about {eta:.0f} s remaining')
+        else:
+            self.progress_label.setText(f'{stage}: {done}/{total} files')
 
-            # Create a directory to write the extracted .mzml files to
-            try:
-                os.mkdir(mzml_directory) #make thte mzml directory
+    def analysis_finished(self):
+        '''Resets the buttons once the worker thread has stopped'''
+        self.analysis_thread = None
+        self.analysis_worker = None
+        self.run_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+
+        # Reset print output redirection
+        sys.stdout = sys.__stdout__
 
-            except FileExistsError:
-                print(f'The user has requested to extract .mzml files from .wiff files, but the directory already exists.\nTo prevent overwriting files / combining incorrect data, please either:\n1. Uncheck the Extract mzml from wiff option, or\n2. Delete the exisitng mzml directory, and re-run the code with the Extract mzml from wiff option checked.\n')
-                QApplication.processEvents()  # Allow the GUI to update
+    def tune_windows(self):
+        '''Reads every mzml file of the directory once (in a worker thread), then opens the window tuning window with the windows from the main window fields'''
+        from Python.pipeline import parse_base_peak_range, parse_fragment_ion_ranges, check_power_data_file
+
+        mzml_directory = os.path.join(self.directory_line_edit.text(), 'mzml_directory')
+        if not os.path.isdir(mzml_directory):
+            self.update_output(f'{mzml_directory} does not exist. Window tuning reads the mzML files that have already been converted - please run the analysis with "Extract mzML files from .wiff?" first.\n')
+            return
+
+        power_data_file_name = None
+        if self.power_norm_checkbox.isChecked():
+            power_data_file_name = self.power_data_line_edit.text().strip()
+            try:
+                check_power_data_file(power_data_file_name)
+            except ValueError as ve:
+                self.update_output(f'{ve}\n')
                 return
-            
-            except Exception as e:
-                print(f'A permission error has been encountered when trying to make {mzml_directory}.\nError: {e}\nTraceback: {traceback.format_exc()}\n')
-
-            for wiff_file in wiff_files:
-                wiff_stime = time.time() #define a time when the .wiff extraction starts
-                try:
-                    convert_wiff_to_mzml(wiff_file, directory, mzml_directory, update_output=self.update_output)
-                    elapsed_time = np.round((time.time() - wiff_stime),1)
-                    print(f'The wiff file:\n{wiff_file}\nhas been successfully extracted in {elapsed_time}s.')
-                    QApplication.processEvents()  # Allow the GUI to update
-                
-                except Exception as e:
-                    #print(f'There was a problem extracting {wiff_file}. Please see the error below:\n{e}\n') #I don't really know how this can break, so we're using a broad exception. Surprise me, users!
-                    print(f'{e}\n')
-                    QApplication.processEvents()  # Allow the GUI to update
-                    return
 
-        # Execute the main function, which computes photofragmentation efficiency and writes the data to a file
-        main(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file_name, update_output=self.update_output)
+        #the windows in the fields are the starting point; without them, the tuning window starts with a base peak window around the most intense peak and no fragment windows
+        try:
+            base_peak_range = parse_base_peak_range(self.base_peak_line_edit.text())
+        except ValueError:
+            base_peak_range = None
 
-        # Redirect print output to QTextEdit again because something in main.py is killing this functionality
-        sys.stdout = TextRedirect(textWritten=self.update_output)
+        try:
+            fragment_ion_ranges = parse_fragment_ion_ranges(self.fragment_ion_line_edit.text())
+        except ValueError:
+            fragment_ion_ranges = []
 
-        # Prints mass spectra to a .csv if user requests raw data via the checkbox
-        if print_raw_data_flag:
-            print('User has requested generation of raw data. Exporting mass spectra now...\n\n')
-            QApplication.processEvents()  # Allow the GUI to update
+        self.tuning_windows = (base_peak_range, fragment_ion_ranges)
 
-            rawdata_file_name = os.path.join(directory,'Raw_data.csv')
-            
-            #mechanism to prevent overwriting existing output files
-            index = 0
+        from Python.window_tuning import load_tuning_data
+        self.start_spectra_worker(SpectraWorker(load_tuning_data, mzml_directory, power_data_file_name), 'Reading spectra for window tuning', self.open_tuning_window)
 
-            while os.path.exists(rawdata_file_name):
-                index += 1
-                rawdata_file_name = os.path.join(directory,f'Raw_data_{index}.csv')
+    def propose_windows(self):
+        '''Sums the spectra of every mzml file (in a worker thread) and fills the base peak and fragment ion fields with the windows proposed from the summed spectrum'''
+        from Python.pipeline import parse_base_peak_range
 
-            parent_mz = (np.round(np.average(base_peak_range), 2))  # get parent mass - needed for the upper end of mz window for interpolation
-            extract_RawData(mzml_directory, parent_mz, rawdata_file_name, update_output=self.update_output)
-            
-        run_time = np.round((time.time() - start_time)/60,1)
+        mzml_directory = os.path.join(self.directory_line_edit.text(), 'mzml_directory')
+        if not os.path.isdir(mzml_directory):
+            self.update_output(f'{mzml_directory} does not exist. Windows are proposed from the mzML files that have already been converted - please run the analysis with "Extract mzML files from .wiff?" first.\n')
+            return
 
-        print(f'UVPD photofragmentation efficiency calculation has completed in {run_time} minutes.\n\n')
-        QApplication.processEvents()  # Allow the GUI to update
+        #a base peak range in the field picks the parent peak; otherwise it is the most intense peak
+        try:
+            parent_mz = sum(parse_base_peak_range(self.base_peak_line_edit.text())) / 2
+        except ValueError:
+            parent_mz = None
+
+        from Python.peak_proposal import propose_windows_for_directory
+        self.start_spectra_worker(SpectraWorker(propose_windows_for_directory, mzml_directory, parent_mz), 'Summing spectra to propose windows', self.apply_proposed_windows)
+
+    def start_spectra_worker(self, worker, stage, handle_result):
+        '''Runs a SpectraWorker in a QThread, with its progress shown under the given stage name and its result passed to handle_result'''
+        self.tuning_thread = QThread()
+        self.tuning_worker = worker
+        self.tuning_worker.moveToThread(self.tuning_thread)
+
+        self.tuning_thread.started.connect(self.tuning_worker.run)
+        self.tuning_worker.log.connect(self.update_output)
+        self.tuning_worker.progress.connect(lambda done, total: self.update_progress(stage, done, total))
+        self.tuning_worker.result.connect(handle_result)
+        self.tuning_worker.finished.connect(self.tuning_thread.quit)
+        self.tuning_worker.finished.connect(self.tuning_worker.deleteLater)
+        self.tuning_thread.finished.connect(self.tuning_thread.deleteLater)
+        self.tuning_thread.finished.connect(self.tuning_finished)
+
+        self.tune_button.setEnabled(False)
+        self.propose_button.setEnabled(False)
+        self.progress_stage = None
+        self.tuning_thread.start()
+
+    def apply_proposed_windows(self, windows):
+        '''Fills the base peak and fragment ion fields with the proposed windows'''
+        if windows is None:
+            return
 
-        # Reset print output redirection
-        sys.stdout = sys.__stdout__
+        from Python.peak_proposal import windows_text
+        base_peak_text, fragment_text = windows_text(*windows)
+        self.base_peak_line_edit.setText(base_peak_text)
+        self.fragment_ion_line_edit.setText(fragment_text)
+        self.update_output('The proposed windows have been filled in. Please check them (e.g. with "Tune windows interactively") before running the analysis.\n\n')
+
+    def open_tuning_window(self, tuning_data):
+        '''Opens the window tuning window once the spectra have been read'''
+        if tuning_data is None:
+            return
+
+        base_peak_range, fragment_ion_ranges = self.tuning_windows
+        self.tuning_window = WindowTuningWindow(tuning_data, base_peak_range, fragment_ion_ranges, self.apply_tuned_windows)
+        self.tuning_window.show()
+
+    def apply_tuned_windows(self, base_peak_text, fragment_text):
+        '''Copies the windows from the tuning window into the base peak and fragment ion fields'''
+        self.base_peak_line_edit.setText(base_peak_text)
+        self.fragment_ion_line_edit.setText(fragment_text)
+        self.update_output(f'The windows from the tuning window have been applied.\nBase peak: {base_peak_text}\nFragment ions: {fragment_text}\n\n')
+
+    def tuning_finished(self):
+        '''Resets the tune and propose buttons once the spectra have been read'''
+        self.tuning_thread = None
+        self.tuning_worker = None
+        self.tune_button.setEnabled(True)
+        self.propose_button.setEnabled(True)
+
+    def report_startup_time(self, start_time, environment_cached):
+        '''Prints the time from launching the GUI to the window being shown'''
+        startup_time = time.perf_counter() - start_time
+        cache_note = 'cached environment checks' if environment_cached else 'environment checks were run and cached'
+        self.update_output(f'The GUI opened in {startup_time:.2f} s ({cache_note}).\n\n')
 
-        return
-    
     def check_for_update(self):
         
         # Get the current working directory and define the temporary directory path
@@ -641,6 +1109,12 @@ class GUI(QWidget):
         choice_prompt = 'Are you sure you wish to exit?'
         choice = QtWidgets.QMessageBox.question(self, choice_title, choice_prompt, QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if choice == QMessageBox.StandardButton.Yes:
+
+            #let a running analysis stop cleanly (it finishes the current file first) before exiting
+            if self.analysis_thread is not None:
+                self.analysis_worker.cancel()
+                self.analysis_thread.quit()
+                self.analysis_thread.wait()
            
             #close application
             sys.exit(0)
@@ -652,23 +1126,11 @@ class GUI(QWidget):
 #The bit that actually starts the GUI
 if __name__ == '__main__': #always and forever. 
 
-    #check if msconvert is available in the systems PATH
-    def check_msconvert():
-        try:
-            subprocess.run(['msconvert'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            return True
-        except subprocess.CalledProcessError:
-            return False       
-        
-    # Check if msconvert is available
-    if not check_msconvert():
-        print('The msconvert executable is not available on your machine. Please install ProteoWizard and/or make sure the directory that contains msconvert it is in your system PATH. Please see the readme on the main GitHub page.')
-        sys.exit(1)
-
     #check if functions that do the legwork are where they should be. These are the locations if downloaded/cloned from Github. 
+    #They are only located here - numpy and the rest of the analysis code are imported when the analysis is first run, so that the GUI opens quickly.
     try: 
-        from Python.workflows import convert_wiff_to_mzml, extract_RawData
-        from Python.main import main
+        if any(importlib.util.find_spec(f'Python.{module}') is None for module in ('pipeline', 'main', 'workflows', 'spectral_cache', 'results_manifest')):
+            raise ModuleNotFoundError('Python')
 
     except (ModuleNotFoundError, ImportError):
         print('The required files located within the /Python directory cannot be found. Please redownload/reclone the code from GitHub and do not remove any files - only execute the code from the UVPD_GUI.py.')
@@ -678,5 +1140,8 @@ if __name__ == '__main__': #always and forever.
     app = QApplication(sys.argv)
     gui = GUI()
     gui.show()
-    gui.check_for_update()
+
+    #once the window is up (the first pass of the event loop), report how long it took to open, then check for updates
+    QTimer.singleShot(0, lambda: gui.report_startup_time(launcher_start_time, environment_cached))
+    QTimer.singleShot(0, gui.check_for_update)
     sys.exit(app.exec())
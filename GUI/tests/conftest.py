@@ -0,0 +1,52 @@
+import os, sys
+import pytest
+
+#The tests import the analysis code the same way the GUI does (from Python.workflows import ...), so the GUI directory needs to be on the path
+GUI_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if GUI_DIRECTORY not in sys.path:
+    sys.path.insert(0, GUI_DIRECTORY)
+
+#The example data set that ships with the repository: 101 wavelengths (400-600nm), 25 scans each, written by msconvert with the default conversion profile
+EXAMPLE_DIRECTORY = os.path.join(os.path.dirname(GUI_DIRECTORY), 'ExampleData_afterAnalysis')
+EXAMPLE_MZML_DIRECTORY = os.path.join(EXAMPLE_DIRECTORY, 'mzml_directory')
+EXAMPLE_BASE_PEAK_RANGE = [239.0, 242.0]
+EXAMPLE_FRAGMENT_ION_RANGES = [[54.5, 57.0], [114.5, 116.0]]
+
+#Small synthetic datasets (see write_synthetic_dataset in benchmark.py) for tests that need known spectra, other encodings, or a laser power file
+SYNTHETIC_DATASET = {'wavelengths': 6, 'scans': 10, 'points_per_scan': 400, 'fragment_windows': 4}
+
+def example_mzml_files():
+    '''Returns the names of the example mzml files, sorted by wavelength.'''
+    return sorted(f for f in os.listdir(EXAMPLE_MZML_DIRECTORY) if f.endswith('.mzML'))
+
+@pytest.fixture(autouse=True)
+def isolated_spectral_cache(tmp_path_factory):
+    '''Keeps the decoded spectra of every test in a cache directory of its own (and out of the in-memory cache), so that no test reads what another one wrote.'''
+    from Python import spectral_cache, workflows
+
+    cache_directory = spectral_cache.SPECTRAL_CACHE_DIRECTORY
+    spectral_cache.configure_spectral_cache(directory=str(tmp_path_factory.mktemp('spectral_cache')))
+    workflows.clear_spectra_cache()
+    yield
+    workflows.clear_spectra_cache()
+    spectral_cache.configure_spectral_cache(directory=cache_directory)
+
+@pytest.fixture
+def synthetic_dataset(tmp_path):
+    '''Writes a small synthetic dataset into tmp_path and returns its directory (containing the mzml_directory and power_data.csv), base peak range, fragment ion ranges, and power data file.'''
+    from Python.benchmark import write_synthetic_dataset
+
+    mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file = write_synthetic_dataset(str(tmp_path), **SYNTHETIC_DATASET)
+    return os.path.dirname(mzml_directory), base_peak_range, fragment_ion_ranges, power_data_file
+
+def write_mzml(directory, mzml_file, scans=5, points_per_scan=200, **settings):
+    '''Writes a small synthetic indexedmzML file (see write_synthetic_mzml in benchmark.py) into directory, and returns its path.'''
+    from Python.benchmark import write_synthetic_mzml
+
+    mzml_path = os.path.join(str(directory), mzml_file)
+    write_synthetic_mzml(mzml_path, scans=scans, points_per_scan=points_per_scan, **settings)
+    return mzml_path
+
+def quiet(text):
+    '''update_output for tests that do not look at the messages.'''
+    pass
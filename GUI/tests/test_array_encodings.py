@@ -0,0 +1,103 @@
+import os, base64, struct, zlib
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_MZML_DIRECTORY, example_mzml_files, quiet
+from Python.workflows import decode_numpress_linear, decode_numpress_slof, decode_binary_array, read_indexed_mzml
+from Python.benchmark import encode_numpress_linear, encode_numpress_slof, write_synthetic_dataset
+from Python.main import main
+
+_no_compression, _zlib = b'MS:1000576', b'MS:1000574'
+_numpress_linear_zlib, _numpress_slof_zlib = b'MS:1002746', b'MS:1002748'
+
+#Encodings worked out by hand from the MS-Numpress specification: the fixed point (big-endian double), the first two values (value * fixed point, little-endian 4 byte integers),
+#then a head half-byte and the half-bytes (least significant first) of the difference of every further value from the straight line through the two before it
+_known_linear_encodings = [
+    #differences 0 (head 8), 5 (head 7, 5), and -110 = 0xffffff92 (head 14, 2, 9)
+    (struct.pack('>d', 100.) + struct.pack('<II', 100, 200) + bytes([0x87, 0x5e, 0x29]), [1., 2., 3., 4.05, 4.]),
+    #an odd number of half-bytes is padded with a zero half-byte
+    (struct.pack('>d', 100.) + struct.pack('<II', 100, 200) + bytes([0x87, 0x50]), [1., 2., 3., 4.05]),
+    #a difference that needs all 8 half-bytes (head 0)
+    (struct.pack('>d', 1.) + struct.pack('<II', 0, 0) + bytes([0x08, 0x76, 0x54, 0x32, 0x10]), [0., 0., 0x12345678]),
+    #-1 = 0xffffffff keeps a single 0xf half-byte (head 15)
+    (struct.pack('>d', 1.) + struct.pack('<II', 10, 10) + bytes([0xff]), [10., 10., 9.]),
+    #one or two values are only the first values
+    (struct.pack('>d', 2.) + struct.pack('<I', 5), [2.5]),
+    (struct.pack('>d', 2.) + struct.pack('<II', 5, 7), [2.5, 3.5]),
+    (b'', []),
+]
+
+#slof stores log(value + 1) * fixed point as little-endian unsigned shorts after the fixed point
+_known_slof_encodings = [
+    (struct.pack('>d', 1000.) + struct.pack('<HHH', 0, 1000, 2000), [0., np.e - 1, np.e**2 - 1]),
+    (b'', []),
+]
+
+def example_scans():
+    '''Returns the m/z and intensity arrays of every scan of the first example file.'''
+    spectra = read_indexed_mzml(os.path.join(EXAMPLE_MZML_DIRECTORY, example_mzml_files()[0]))
+    offsets = spectra['offsets']
+    return [(spectra['mz'][offsets[i]:offsets[i + 1]], spectra['intensity'][offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
+
+@pytest.mark.parametrize('encoded, expected', _known_linear_encodings)
+def test_decode_numpress_linear_known(encoded, expected):
+    np.testing.assert_allclose(decode_numpress_linear(encoded), expected, rtol=0, atol=1e-12)
+
+@pytest.mark.parametrize('encoded, expected', _known_slof_encodings)
+def test_decode_numpress_slof_known(encoded, expected):
+    np.testing.assert_allclose(decode_numpress_slof(encoded), expected, rtol=1e-12)
+
+def test_decode_zlib():
+    mz, intensity = example_scans()[0]
+
+    binary = base64.b64encode(zlib.compress(mz.astype('<f8').tobytes()))
+    np.testing.assert_array_equal(decode_binary_array(binary, '<f8', _zlib), mz)
+
+    #32-bit intensities (the compact profile) come back as 64-bit floats of the same values
+    binary = base64.b64encode(zlib.compress(intensity.astype('<f4').tobytes()))
+    decoded = decode_binary_array(binary, '<f4', _zlib)
+    assert decoded.dtype == np.float64
+    np.testing.assert_array_equal(decoded, intensity.astype(np.float32))
+
+    #an empty array is written without any zlib stream
+    assert len(decode_binary_array(b'', '<f8', _zlib)) == 0
+    np.testing.assert_array_equal(decode_binary_array(base64.b64encode(mz.astype('<f8').tobytes()), '<f8', _no_compression), mz)
+
+def test_decode_numpress_example_scans():
+    #every scan of an example file, encoded as msconvert does with the numpress profile, decodes to within the precision of the encoding
+    for mz, intensity in example_scans():
+        decoded_mz = decode_binary_array(base64.b64encode(zlib.compress(encode_numpress_linear(mz))), '<f8', _numpress_linear_zlib)
+        np.testing.assert_allclose(decoded_mz, mz, rtol=0, atol=2e-9 * np.max(mz))
+
+        decoded_intensity = decode_binary_array(base64.b64encode(zlib.compress(encode_numpress_slof(intensity))), '<f8', _numpress_slof_zlib)
+        np.testing.assert_allclose(decoded_intensity, intensity, rtol=2e-4, atol=1e-6)
+
+def test_numpress_matches_pyteomics(tmp_path):
+    mzml = pytest.importorskip('pyteomics.mzml')
+    pytest.importorskip('pynumpress') #pyteomics decodes MS-Numpress arrays with pynumpress
+
+    mzml_directory = write_synthetic_dataset(str(tmp_path), wavelengths=1, scans=5, points_per_scan=200, fragment_windows=2, encoding='numpress')[0]
+    mzml_path = os.path.join(mzml_directory, os.listdir(mzml_directory)[0])
+    spectra = read_indexed_mzml(mzml_path)
+
+    with mzml.read(mzml_path) as reader:
+        for scan, spectrum in enumerate(reader):
+            start, stop = spectra['offsets'][scan], spectra['offsets'][scan + 1]
+            np.testing.assert_allclose(spectra['mz'][start:stop], spectrum['m/z array'], rtol=1e-12)
+            np.testing.assert_allclose(spectra['intensity'][start:stop], spectrum['intensity array'], rtol=1e-12)
+
+@pytest.mark.parametrize('encoding, tolerance', [('compact', 1e-6), ('numpress', 1e-4)])
+def test_photofragmentation_efficiency_matches_uncompressed(tmp_path, encoding, tolerance):
+    tables = []
+    for dataset_encoding in ('default', encoding):
+        mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file = write_synthetic_dataset(str(tmp_path / dataset_encoding), wavelengths=6, scans=10, points_per_scan=400,
+                                                                                                         fragment_windows=4, encoding=dataset_encoding)
+        output_file = main(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file, update_output=quiet, use_manifest=False)
+        tables.append(np.loadtxt(output_file, delimiter=',', skiprows=1))
+
+    assert tables[0].shape == tables[1].shape
+    assert np.all(np.isfinite(tables[0]))
+
+    #the efficiencies differ by no more than the precision that the encoding gives up, relative to the largest value of each column
+    scale = np.max(np.abs(tables[0]), axis=0)
+    assert np.max(np.abs(tables[1] - tables[0]) / scale) < tolerance
@@ -0,0 +1,87 @@
+import os
+import numpy as np
+import pytest
+
+from conftest import SYNTHETIC_DATASET, write_mzml, quiet
+from Python.batch import find_datasets, dataset_cv, read_efficiency_table, write_combined_table, run_batch
+from Python.benchmark import write_synthetic_dataset
+
+def make_datasets(root_directory, names):
+    '''Writes a synthetic dataset (with a power data file of its own) into a directory for each name, and returns the base peak range and fragment ion ranges they share.'''
+    for seed, name in enumerate(names):
+        _, base_peak_range, fragment_ion_ranges, _ = write_synthetic_dataset(os.path.join(root_directory, name), seed=seed, **SYNTHETIC_DATASET)
+    return base_peak_range, fragment_ion_ranges
+
+def test_find_datasets(tmp_path):
+    for name in ('CV_-5', 'CV_10'):
+        (tmp_path / 'day1' / name / 'mzml_directory').mkdir(parents=True)
+        write_mzml(tmp_path / 'day1' / name / 'mzml_directory', 'scan_Laser_On-400.mzML')
+    (tmp_path / 'day1' / 'CV_10' / 'mzml_directory' / 'nested' / 'mzml_directory').mkdir(parents=True) #never searched
+    (tmp_path / 'empty' / 'mzml_directory').mkdir(parents=True)
+    (tmp_path / 'empty' / 'mzml_directory' / 'notes.txt').write_text('no mzml files here')
+    (tmp_path / 'raw').mkdir()
+    (tmp_path / 'raw' / 'scan_Laser_On-400.wiff').write_bytes(b'')
+
+    assert find_datasets(str(tmp_path)) == [str(tmp_path / 'day1' / 'CV_-5'), str(tmp_path / 'day1' / 'CV_10')]
+    assert find_datasets(str(tmp_path), extract_mzml_from_wiff=True) == [str(tmp_path / 'day1' / 'CV_-5'), str(tmp_path / 'day1' / 'CV_10'), str(tmp_path / 'raw')]
+
+@pytest.mark.parametrize('name, cv', [('CV_-21', -21.), ('cv=3.5', 3.5), ('peptide CV 12', 12.), ('run_CV-4_CV_7/', 7.), ('no_voltage', np.nan)])
+def test_dataset_cv(name, cv):
+    assert dataset_cv(name) == cv or (np.isnan(cv) and np.isnan(dataset_cv(name)))
+
+def test_run_batch_combines_datasets(tmp_path):
+    names = ['CV_10', 'CV_-5', 'no_voltage', 'CV_0']
+    base_peak_range, fragment_ion_ranges = make_datasets(str(tmp_path), names)
+
+    #a dataset without a power data file of its own fails; it is reported and left out of the combined table, and the batch carries on
+    (tmp_path / 'broken' / 'mzml_directory').mkdir(parents=True)
+    write_mzml(tmp_path / 'broken' / 'mzml_directory', 'scan_Laser_On-400.mzML')
+
+    messages = []
+    results = run_batch(str(tmp_path), base_peak_range, fragment_ion_ranges, 'power_data.csv', workers=2, update_output=messages.append)
+
+    assert sorted(results['datasets']) == sorted(str(tmp_path / name) for name in names + ['broken'])
+    assert results['datasets'][str(tmp_path / 'broken')] is None
+    assert any(message.startswith(f'A problem was encountered when analyzing {tmp_path / "broken"}') for message in messages)
+    assert any(message.startswith('No photofragmentation efficiency was written for 1 datasets') for message in messages)
+
+    csv_file, npz_file = results['combined']
+    with np.load(npz_file) as npz:
+        combined = dict(npz)
+
+    #rows by CV, with the dataset without a CV last
+    assert combined['directories'].tolist() == ['CV_-5', 'CV_0', 'CV_10', 'no_voltage']
+    np.testing.assert_array_equal(combined['cv'][:3], [-5., 0., 10.])
+
+    #every dataset's own table is in the combined one
+    for row, name in enumerate(combined['directories']):
+        column_names, table = read_efficiency_table(results['datasets'][str(tmp_path / name)]['photofragmentation_efficiency'])
+        np.testing.assert_array_equal(combined['wavelengths'], table[:, 0])
+        np.testing.assert_array_equal(combined['values'][row], table[:, [column_names.index(column) for column in combined['columns']]])
+
+    #the .csv holds the total PE of each dataset
+    total_pe = np.loadtxt(csv_file, delimiter=',', skiprows=1, usecols=range(2, 2 + len(combined['wavelengths'])))
+    np.testing.assert_allclose(total_pe, combined['values'][:, :, combined['columns'].tolist().index('Total PE')], atol=1e-6)
+
+def test_combined_table_with_other_windows(tmp_path):
+    #two datasets integrated with different fragment windows (and wavelengths) only share their common columns
+    efficiency_files = []
+    for name, columns, wavelengths in [('CV_1', ['Total PE', 'Total PE stdev', 'PE mz 55.0', 'PE mz 55.0 stdev'], [400., 402.]),
+                                       ('CV_2', ['Total PE', 'Total PE stdev', 'PE mz 90.0', 'PE mz 90.0 stdev'], [402., 404.])]:
+        (tmp_path / name).mkdir()
+        table = np.column_stack([wavelengths] + [np.full(len(wavelengths), i + 1.) for i in range(len(columns))])
+        efficiency_file = tmp_path / name / 'photofragmentation_efficiency.csv'
+        np.savetxt(efficiency_file, table, delimiter=',', fmt='%.6f', header=','.join(['Wavelength'] + columns), comments='')
+        efficiency_files.append(str(efficiency_file))
+
+    datasets = [str(tmp_path / 'CV_1'), str(tmp_path / 'CV_2'), str(tmp_path / 'CV_3')]
+    csv_file, npz_file = write_combined_table(str(tmp_path), datasets, efficiency_files + [None], update_output=quiet)
+
+    with np.load(npz_file) as combined:
+        assert combined['columns'].tolist() == ['Total PE', 'Total PE stdev']
+        np.testing.assert_array_equal(combined['wavelengths'], [400., 402., 404.])
+        np.testing.assert_array_equal(combined['values'][:, :, 0], [[1., 1., np.nan], [np.nan, 1., 1.]])
+
+    #a second batch does not overwrite the first
+    assert write_combined_table(str(tmp_path), datasets, efficiency_files + [None])[0] == str(tmp_path / 'batch_photofragmentation_efficiency_1.csv')
+    assert write_combined_table(str(tmp_path), datasets, [None] * 3) is None
@@ -0,0 +1,62 @@
+import os
+import numpy as np
+
+from conftest import quiet
+from Python import bootstrap
+from Python.bootstrap import bootstrap_efficiencies
+from Python.workflows import PE_calc_matrix
+from Python.main import main
+
+def dataset_scans(synthetic_dataset):
+    '''Integrates a synthetic dataset with main, and returns the integrals of every scan, the number of scans of each wavelength, the wavelengths, and the laser power.'''
+    directory, base_peak_range, fragment_ion_ranges, power_data_file = synthetic_dataset
+    scan_data = {}
+    main(os.path.join(directory, 'mzml_directory'), base_peak_range, fragment_ion_ranges, power_data_file, update_output=quiet, scan_data=scan_data)
+
+    laser_power = np.loadtxt(power_data_file, delimiter=',')[:, 1]
+    scan_counts = [len(integrations) for integrations in scan_data['integrations']]
+    return np.concatenate(scan_data['integrations']), scan_counts, np.asarray(scan_data['wavelengths'], dtype=float), laser_power
+
+def point_estimate(scan_integrations, scan_counts, wavelengths, laser_power):
+    '''The photofragmentation efficiency of the averages of the scans (total PE first), as in the efficiency table.'''
+    means = np.array([np.mean(integrations, axis=0) for integrations in np.split(scan_integrations, np.cumsum(scan_counts)[:-1])])
+    fragment_integrations = np.column_stack([np.sum(means[:, 1:], axis=1), means[:, 1:]])
+    return PE_calc_matrix(wavelengths[:, None], means[:, 0:1], 0., fragment_integrations, 0., P=laser_power[:, None], dP=0.)[0]
+
+def test_seed_makes_the_bootstrap_reproducible(synthetic_dataset, monkeypatch):
+    scans = dataset_scans(synthetic_dataset)
+
+    first = bootstrap_efficiencies(*scans, resamples=200, seed=7)
+    np.testing.assert_array_equal(np.array(bootstrap_efficiencies(*scans, resamples=200, seed=7)), np.array(first))
+    assert not np.array_equal(np.array(bootstrap_efficiencies(*scans, resamples=200, seed=8)), np.array(first))
+
+    #the resamples are drawn in chunks, which does not change them
+    monkeypatch.setattr(bootstrap, 'BOOTSTRAP_CHUNK_VALUES', 3 * scans[0].size)
+    np.testing.assert_allclose(np.array(bootstrap_efficiencies(*scans, resamples=200, seed=7)), np.array(first), rtol=1e-12)
+
+def test_interval_contains_the_point_estimate(synthetic_dataset):
+    scan_integrations, scan_counts, wavelengths, laser_power = dataset_scans(synthetic_dataset)
+    estimate = point_estimate(scan_integrations, scan_counts, wavelengths, laser_power)
+
+    lower, upper, stdev = bootstrap_efficiencies(scan_integrations, scan_counts, wavelengths, laser_power, resamples=500, seed=0)
+
+    assert lower.shape == upper.shape == stdev.shape == estimate.shape
+    assert np.all(lower <= estimate) and np.all(estimate <= upper)
+    assert np.all(lower < upper) and np.all(stdev > 0)
+
+    #a wider confidence level gives a wider interval from the same resamples
+    wide_lower, wide_upper, _ = bootstrap_efficiencies(scan_integrations, scan_counts, wavelengths, laser_power, resamples=500, confidence=99., seed=0)
+    assert np.all(wide_lower <= lower) and np.all(upper <= wide_upper)
+
+def test_interval_of_identical_scans():
+    #every resample of a wavelength with one scan (or identical scans) is the same, so the interval is the point estimate; no laser power means no interval
+    scan_integrations = np.array([[1e5, 2e3, 1e3], [8e4, 1e3, 4e3], [8e4, 1e3, 4e3]])
+    scan_counts, wavelengths, laser_power = [1, 2], np.array([400., 402.]), np.array([5., 0.])
+
+    lower, upper, stdev = bootstrap_efficiencies(scan_integrations, scan_counts, wavelengths, laser_power, resamples=50, seed=0)
+    estimate = point_estimate(scan_integrations, scan_counts, wavelengths, laser_power)
+
+    np.testing.assert_allclose(lower[0], estimate[0], rtol=1e-12)
+    np.testing.assert_allclose(upper[0], estimate[0], rtol=1e-12)
+    np.testing.assert_allclose(stdev[0], 0., atol=1e-12 * np.max(estimate[0]))
+    assert np.all(np.isnan(lower[1])) and np.all(np.isnan(upper[1])) and np.all(np.isnan(stdev[1]))
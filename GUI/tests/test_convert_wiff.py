@@ -0,0 +1,151 @@
+import os, sys, json, stat, threading
+import pytest
+
+from conftest import EXAMPLE_MZML_DIRECTORY, example_mzml_files, quiet
+from Python.workflows import convert_wiff_files, MSCONVERT_PROFILES
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='the stand-in msconvert is a script with a #! line')
+
+#Stand-in for msconvert: called as msconvert <wiff file> -o <output directory> <options>, it copies the example .mzML of the same name into the output directory.
+#Each call is logged (with its start and end time) to STUB_LOG_DIRECTORY. Files whose name contains 'fail' get half of an .mzML written and exit with code 3, like a conversion that crashed.
+_stub_msconvert = '''#!{python}
+import os, sys, json, time, shutil
+wiff_path, output_directory, options = sys.argv[1], sys.argv[3], sys.argv[4:]
+mzml_file = os.path.splitext(os.path.basename(wiff_path))[0] + '.mzML'
+start_time = time.time()
+time.sleep(0.3)
+
+with open(os.path.join(os.environ['STUB_MZML_DIRECTORY'], mzml_file.replace('fail_', '')), 'rb') as opf:
+    data = opf.read()
+
+with open(os.path.join(output_directory, mzml_file), 'wb') as opf:
+    opf.write(data if 'fail' not in mzml_file else data[:len(data) // 2])
+
+with open(os.path.join(os.environ['STUB_LOG_DIRECTORY'], mzml_file + '.json'), 'w') as opf:
+    json.dump({{'options': options, 'start': start_time, 'end': time.time()}}, opf)
+
+if 'fail' in mzml_file:
+    print('stand-in msconvert: conversion failed')
+    sys.exit(3)
+'''
+
+@pytest.fixture
+def msconvert_on_path(tmp_path, monkeypatch):
+    '''Puts the stand-in msconvert on PATH, and returns the directory its calls are logged to.'''
+    bin_directory = tmp_path / 'bin'
+    bin_directory.mkdir()
+    msconvert = bin_directory / 'msconvert'
+    msconvert.write_text(_stub_msconvert.format(python=sys.executable))
+    msconvert.chmod(msconvert.stat().st_mode | stat.S_IXUSR)
+
+    log_directory = tmp_path / 'msconvert_calls'
+    log_directory.mkdir()
+    monkeypatch.setenv('PATH', f'{bin_directory}{os.pathsep}{os.environ.get("PATH", "")}')
+    monkeypatch.setenv('STUB_MZML_DIRECTORY', EXAMPLE_MZML_DIRECTORY)
+    monkeypatch.setenv('STUB_LOG_DIRECTORY', str(log_directory))
+    return log_directory
+
+def make_wiff_files(directory, mzml_files):
+    '''Writes empty .wiff and .wiff.scan files for the given mzml files, and returns the names of the .wiff files.'''
+    directory.mkdir(exist_ok=True)
+    wiff_files = []
+    for mzml_file in mzml_files:
+        wiff_file = f'{os.path.splitext(mzml_file)[0]}.wiff'
+        (directory / wiff_file).write_bytes(b'')
+        (directory / f'{wiff_file}.scan').write_bytes(b'')
+        wiff_files.append(wiff_file)
+    return wiff_files
+
+def logged_calls(log_directory):
+    calls = {}
+    for log_file in os.listdir(log_directory):
+        with open(os.path.join(log_directory, log_file)) as opf:
+            calls[log_file[:-len('.json')]] = json.load(opf)
+    return calls
+
+def test_converts_concurrently(tmp_path, msconvert_on_path):
+    directory = tmp_path / 'data'
+    mzml_directory = directory / 'mzml_directory'
+    wiff_files = make_wiff_files(directory, example_mzml_files()[:4])
+
+    progress = []
+    results = convert_wiff_files(str(directory), str(mzml_directory), wiff_files, workers=4, update_output=quiet, progress_callback=lambda done, total: progress.append((done, total)),
+                                 conversion_profile='compact')
+
+    assert [result['wiff_file'] for result in results] == wiff_files
+    assert all(result['status'] == 'converted' and result['returncode'] == 0 for result in results)
+    assert sorted(os.listdir(mzml_directory)) == example_mzml_files()[:4]
+    for mzml_file in example_mzml_files()[:4]:
+        assert (mzml_directory / mzml_file).read_bytes() == open(os.path.join(EXAMPLE_MZML_DIRECTORY, mzml_file), 'rb').read()
+    assert progress[-1] == (4, 4)
+
+    #the conversions overlapped in time, and were all given the options of the conversion profile
+    calls = logged_calls(msconvert_on_path)
+    assert all(call['options'] == MSCONVERT_PROFILES['compact'] for call in calls.values())
+    assert max(call['start'] for call in calls.values()) < min(call['end'] for call in calls.values())
+
+def test_skips_converted_files(tmp_path, msconvert_on_path):
+    directory = tmp_path / 'data'
+    mzml_directory = directory / 'mzml_directory'
+    wiff_files = make_wiff_files(directory, example_mzml_files()[:3])
+
+    convert_wiff_files(str(directory), str(mzml_directory), wiff_files[:2], workers=2, update_output=quiet)
+    for log_file in os.listdir(msconvert_on_path):
+        os.remove(os.path.join(msconvert_on_path, log_file))
+
+    messages = []
+    results = convert_wiff_files(str(directory), str(mzml_directory), wiff_files=None, workers=2, update_output=messages.append)
+
+    assert [result['status'] for result in results] == ['skipped', 'skipped', 'converted']
+    assert list(logged_calls(msconvert_on_path)) == [example_mzml_files()[2]]
+    assert '2 of 3 .wiff files have already been converted and will be skipped.\n' in messages
+
+    #a .wiff file that is newer than its .mzML (e.g. it was acquired again) is converted again
+    os.utime(directory / wiff_files[0], ns=(os.stat(mzml_directory / example_mzml_files()[0]).st_mtime_ns + 10**9,) * 2)
+    results = convert_wiff_files(str(directory), str(mzml_directory), wiff_files, workers=2, update_output=quiet)
+    assert [result['status'] for result in results] == ['converted', 'skipped', 'skipped']
+
+def test_failed_conversion_leaves_nothing_behind(tmp_path, msconvert_on_path):
+    directory = tmp_path / 'data'
+    mzml_directory = directory / 'mzml_directory'
+    wiff_files = make_wiff_files(directory, [example_mzml_files()[0], f'fail_{example_mzml_files()[1]}'])
+
+    messages = []
+    results = convert_wiff_files(str(directory), str(mzml_directory), wiff_files, workers=2, update_output=messages.append)
+
+    assert [result['status'] for result in results] == ['converted', 'failed']
+    assert results[1]['returncode'] == 3
+    assert 'stand-in msconvert: conversion failed' in results[1]['error']
+    assert results[1]['error'] in messages
+
+    #neither the half written .mzML nor the temporary directory it was written to are left in mzml_directory
+    assert os.listdir(mzml_directory) == [example_mzml_files()[0]]
+
+    #so the failed file is converted again next time, and the one that worked is not
+    assert [result['status'] for result in convert_wiff_files(str(directory), str(mzml_directory), wiff_files, update_output=quiet)] == ['skipped', 'failed']
+
+def test_missing_msconvert(tmp_path, monkeypatch):
+    directory = tmp_path / 'data'
+    mzml_directory = directory / 'mzml_directory'
+    wiff_files = make_wiff_files(directory, example_mzml_files()[:1])
+    monkeypatch.setenv('PATH', str(tmp_path / 'empty'))
+
+    results = convert_wiff_files(str(directory), str(mzml_directory), wiff_files, update_output=quiet)
+
+    assert results[0]['status'] == 'failed'
+    assert results[0]['returncode'] is None
+    assert 'msconvert (Part of proteowizard) could not be found' in results[0]['error']
+    assert os.listdir(mzml_directory) == []
+
+def test_cancelled_conversions_are_not_started(tmp_path, msconvert_on_path):
+    directory = tmp_path / 'data'
+    mzml_directory = directory / 'mzml_directory'
+    wiff_files = make_wiff_files(directory, example_mzml_files()[:3])
+
+    cancel_event = threading.Event()
+    cancel_event.set()
+    results = convert_wiff_files(str(directory), str(mzml_directory), wiff_files, workers=1, update_output=quiet, cancel_event=cancel_event)
+
+    assert [result['status'] for result in results] == ['cancelled'] * 3
+    assert logged_calls(msconvert_on_path) == {}
+    assert os.listdir(mzml_directory) == []
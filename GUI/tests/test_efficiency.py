@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from Python.workflows import PE_calc_matrix, PE_calc, PE_calc_noNorm
+from Python.main import efficiency_table
+
+def reference_efficiency(W, P, dP, Par, dPar, Frag, dFrag):
+    '''The photofragmentation efficiency and its stdev as PE_calc worked them out one value at a time, before PE_calc_matrix.'''
+    dW = 2
+    efficiency = -(W / P) * np.log(Par / (Frag + Par))
+    term1 = np.square((np.log(Par / (Par + Frag)) / -P) * dW)
+    term2 = np.square(((W * np.log(Par / (Par + Frag))) / np.square(P)) * dP)
+    term3 = np.square(-1 * ((1 / (Par + Frag) / P / Par * W * Frag)) * dPar)
+    term4 = np.square((W * 1 / (Par + Frag) / P) * dFrag)
+    return efficiency, np.sqrt(term1 + term2 + term3 + term4)
+
+def reference_efficiency_noNorm(Par, dPar, Frag, dFrag):
+    efficiency = -1 * np.log(Par / (Frag + Par))
+    term1 = np.square(-1 * (Frag / (Par + Frag) / Par) * dPar)
+    term2 = np.square((1 / (Par + Frag)) * dFrag)
+    return efficiency, np.sqrt(term1 + term2)
+
+def random_integrations(seed=0, wavelengths=12, fragments=5):
+    rng = np.random.default_rng(seed)
+    W = np.arange(400., 400. + 2 * wavelengths, 2.)[:, None]
+    P, dP = rng.uniform(5., 10., (wavelengths, 1)), rng.uniform(0.1, 0.5, (wavelengths, 1))
+    Par, dPar = rng.uniform(1e5, 1e6, (wavelengths, 1)), rng.uniform(1e3, 1e4, (wavelengths, 1))
+    Frag, dFrag = rng.uniform(1e2, 1e5, (wavelengths, fragments)), rng.uniform(10., 1e3, (wavelengths, fragments))
+    return W, P, dP, Par, dPar, Frag, dFrag
+
+def test_matrix_matches_single_values():
+    W, P, dP, Par, dPar, Frag, dFrag = random_integrations()
+
+    efficiency, stdev, valid = PE_calc_matrix(W, Par, dPar, Frag, dFrag, P=P, dP=dP)
+    noNorm_efficiency, noNorm_stdev, noNorm_valid = PE_calc_matrix(W, Par, dPar, Frag, dFrag)
+
+    assert efficiency.shape == stdev.shape == valid.shape == Frag.shape
+    assert np.all(valid) and np.all(noNorm_valid)
+    for row, column in np.ndindex(Frag.shape):
+        values = (W[row, 0], P[row, 0], dP[row, 0], Par[row, 0], dPar[row, 0], Frag[row, column], dFrag[row, column])
+        np.testing.assert_allclose([efficiency[row, column], stdev[row, column]], reference_efficiency(*values), rtol=1e-12)
+        np.testing.assert_allclose([noNorm_efficiency[row, column], noNorm_stdev[row, column]], reference_efficiency_noNorm(*values[3:]), rtol=1e-12)
+
+        #the single value functions give the same numbers
+        np.testing.assert_allclose(PE_calc(*values), [efficiency[row, column], stdev[row, column]], rtol=1e-12)
+        np.testing.assert_allclose(PE_calc_noNorm(*values), [noNorm_efficiency[row, column], noNorm_stdev[row, column]], rtol=1e-12)
+
+def test_invalid_values_are_masked():
+    W, P, dP, Par, dPar, Frag, dFrag = random_integrations(wavelengths=5, fragments=3)
+    P[1] = 0.        #no laser power
+    P[2] = np.nan    #missing laser power
+    Par[3] = 0.      #no parent signal (the log of zero)
+    Frag[4, 1] = 0.  #a fragment without signal is a valid efficiency of zero
+
+    efficiency, stdev, valid = PE_calc_matrix(W, Par, dPar, Frag, dFrag, P=P, dP=dP)
+
+    expected_valid = np.ones(Frag.shape, dtype=bool)
+    expected_valid[1:4] = False
+    np.testing.assert_array_equal(valid, expected_valid)
+    assert np.all(np.isnan(efficiency[~valid])) and np.all(np.isnan(stdev[~valid]))
+    assert np.all(np.isfinite(efficiency[valid])) and np.all(np.isfinite(stdev[valid]))
+    assert efficiency[4, 1] == 0.
+
+    #without the normalization, only the parent signal matters
+    _, _, noNorm_valid = PE_calc_matrix(W, Par, dPar, Frag, dFrag)
+    np.testing.assert_array_equal(np.flatnonzero(~np.all(noNorm_valid, axis=1)), [3])
+
+    #Par + Frag of zero is invalid with or without the laser power
+    Frag[0, 0] = 0.
+    Par[0] = 0.
+    assert not np.any(PE_calc_matrix(W, Par, dPar, Frag, dFrag)[2][0])
+
+def test_single_value_functions_raise_on_division_by_zero():
+    messages = []
+    with pytest.raises(ValueError):
+        PE_calc(400., 0., 0.1, 1e5, 1e3, 1e4, 1e2, update_output=messages.append)
+    with pytest.raises(ValueError):
+        PE_calc_noNorm(400., 5., 0.1, 0., 1e3, 0., 1e2, update_output=messages.append)
+    assert len(messages) == 2 and all('Division by zero' in message for message in messages)
+
+def test_efficiency_table_writes_nan_and_reports():
+    W, P, dP, Par, dPar, Frag, dFrag = random_integrations(wavelengths=4, fragments=2)
+    P[2] = 0.
+    base_peaks = np.column_stack([Par[:, 0], dPar[:, 0]])
+    fragment_peaks = np.stack([Frag, dFrag], axis=2)
+
+    messages = []
+    PE_data, column_names = efficiency_table(W[:, 0], base_peaks, fragment_peaks, [55.0, 115.2], P[:, 0], dP[:, 0], update_output=messages.append)
+
+    assert column_names == ['Wavelength', 'Total PE', 'Total PE stdev', 'PE mz 55.0', 'PE mz 55.0 stdev', 'PE mz 115.2', 'PE mz 115.2 stdev']
+    assert np.all(np.isnan(PE_data[2, 1:])) and np.all(np.isfinite(np.delete(PE_data, 2, axis=0)))
+    assert len(messages) == 1 and messages[0].startswith('At 404.0nm, Total PE, PE mz 55.0, PE mz 115.2 could not be calculated')
+
+    #the total PE is the efficiency of the summed fragments, with their stdevs added in quadrature
+    total = reference_efficiency(W[0, 0], P[0, 0], dP[0, 0], Par[0, 0], dPar[0, 0], np.sum(Frag[0]), np.sqrt(np.sum(np.square(dFrag[0]))))
+    np.testing.assert_allclose(PE_data[0, 1:3], total, rtol=1e-12)
@@ -0,0 +1,153 @@
+import os
+import numpy as np
+import pytest
+
+from conftest import quiet
+from Python import workflows
+from Python.workflows import pack_spectra, build_cumulative_index, integrate_cumulative, integrate_scans, get_spectra, configure_spectra_memory_cache, clear_spectra_cache
+from Python.benchmark import write_synthetic_mzml
+
+PARENT_MZ = 250.
+WINDOWS = [[54.5, 57.], [114.53, 116.], [199.999, 240.004], [0., 300.], [120., 120.]]
+
+def random_scans(seed=0, num_scans=8):
+    '''Returns the m/z and intensity arrays of num_scans profile scans with a different number of points and m/z range each (one of them reaching past the end of the 0.01 Da grid).'''
+    rng = np.random.default_rng(seed)
+    mz_arrays, intensity_arrays = [], []
+    for scan in range(num_scans):
+        lower, upper = rng.uniform(40., 60.), rng.uniform(200., 320.)
+        mz = np.sort(rng.uniform(lower, upper, rng.integers(200, 2000)))
+        mz_arrays.append(mz)
+        intensity_arrays.append(rng.exponential(1000., len(mz)))
+    return mz_arrays, intensity_arrays
+
+def use_spectra(monkeypatch, mz_arrays, intensity_arrays):
+    '''Makes integrate_scans read the given scans instead of an mzml file.'''
+    spectra = build_cumulative_index(pack_spectra(mz_arrays, intensity_arrays))
+    monkeypatch.setattr(workflows, 'get_spectra', lambda directory, mzml_file, update_output=None: spectra)
+
+def baseline_grid_integrations(mz_arrays, intensity_arrays, integration_windows, parent_mz):
+    '''The integration before it was vectorized: every scan is zero padded, interpolated onto the 0.01 Da grid with its own np.interp call, and integrated with np.trapz.'''
+    common_mz_grid = np.round(np.linspace(0., parent_mz + 50., int((parent_mz + 50.) / 0.01 + 1)), 2)
+
+    integrations = []
+    for mz, intensity in zip(mz_arrays, intensity_arrays):
+        new_mz_values = common_mz_grid[(common_mz_grid < np.min(mz)) | (common_mz_grid > np.max(mz))]
+        mz = np.append(mz, new_mz_values)
+        intensity = np.append(intensity, np.zeros(len(new_mz_values)))
+        sort_indices = np.argsort(mz)
+        interp_intensity = np.interp(common_mz_grid, mz[sort_indices], intensity[sort_indices])
+
+        scan_integrations = []
+        for lower, upper in integration_windows:
+            window = (common_mz_grid >= np.round(lower, 2)) & (common_mz_grid <= np.round(upper, 2))
+            scan_integrations.append(np.trapz(interp_intensity[window], x=common_mz_grid[window]))
+        integrations.append(scan_integrations)
+
+    return np.array(integrations)
+
+def test_grid_matches_per_scan_interpolation(monkeypatch):
+    mz_arrays, intensity_arrays = random_scans()
+
+    #one scan out of order, as pack_spectra has to sort it
+    order = np.random.default_rng(1).permutation(len(mz_arrays[0]))
+    unsorted_mz_arrays, unsorted_intensity_arrays = [mz_arrays[0][order]] + mz_arrays[1:], [intensity_arrays[0][order]] + intensity_arrays[1:]
+    use_spectra(monkeypatch, unsorted_mz_arrays, unsorted_intensity_arrays)
+
+    integrations = integrate_scans('', 'synthetic.mzML', WINDOWS, PARENT_MZ, update_output=quiet, integration_method='grid')
+    expected = baseline_grid_integrations(mz_arrays, intensity_arrays, WINDOWS, PARENT_MZ)
+
+    assert integrations.shape == (len(mz_arrays), len(WINDOWS))
+    np.testing.assert_allclose(integrations, expected, rtol=1e-12, atol=1e-12 * np.max(np.abs(expected)))
+
+#A trapezoid profile: the intensity rises from 0 to 2 between m/z 100 and 101, stays at 2 until 102, and falls back to 0 at 103 (area 4)
+_trapezoid_mz = np.array([100., 101., 102., 103.])
+_trapezoid_intensity = np.array([0., 2., 2., 0.])
+
+@pytest.mark.parametrize('window, expected', [
+    ([100., 103.], 4.),        #edges on the first and last points
+    ([99., 104.], 4.),         #no signal outside of the scan
+    ([100.5, 102.5], 3.5),     #edges between points: 0.75 + 2 + 0.75
+    ([101.25, 101.75], 1.),    #both edges between the same two points
+    ([100., 100.5], 0.25),     #on the rising edge
+    ([102.5, 110.], 0.25),     #from the falling edge to past the end of the scan
+    ([101.5, 101.5], 0.),      #zero width
+    ([103., 110.], 0.),        #above the scan
+    ([50., 100.], 0.),         #below the scan
+])
+def test_raw_integration_of_known_profile(monkeypatch, window, expected):
+    #the same profile twice, the second time shifted by 0.5 and doubled, with a scan without any points in between
+    use_spectra(monkeypatch, [_trapezoid_mz, np.empty(0), _trapezoid_mz + 0.5], [_trapezoid_intensity, np.empty(0), 2. * _trapezoid_intensity])
+    shifted_expected = 2. * np.trapz(np.interp(np.linspace(*window, 100001), _trapezoid_mz + 0.5, _trapezoid_intensity, left=0., right=0.), np.linspace(*window, 100001))
+
+    integrations = integrate_scans('', 'synthetic.mzML', [window], PARENT_MZ, update_output=quiet, integration_method='raw')
+
+    assert integrations.shape == (3, 1)
+    assert integrations[0, 0] == pytest.approx(expected, rel=1e-12, abs=1e-12)
+    assert integrations[1, 0] == 0.
+    assert integrations[2, 0] == pytest.approx(shifted_expected, rel=1e-6, abs=1e-9)
+
+def test_raw_integration_of_several_windows(monkeypatch):
+    use_spectra(monkeypatch, [_trapezoid_mz], [_trapezoid_intensity])
+    windows = [[100., 103.], [100.5, 102.5], [103., 110.], [101.25, 101.75]]
+
+    integrations = integrate_scans('', 'synthetic.mzML', windows, PARENT_MZ, update_output=quiet, integration_method='raw')
+
+    np.testing.assert_allclose(integrations, [[4., 3.5, 0., 1.]], rtol=1e-12, atol=1e-12)
+
+def direct_trapezoid(mz, intensity, lower, upper):
+    '''Integrates one scan from lower to upper with np.trapz on its own points, with the interpolated intensity added at each edge.'''
+    lower, upper = np.clip([lower, upper], mz[0], mz[-1])
+    inside = (mz > lower) & (mz < upper)
+    x = np.concatenate([[lower], mz[inside], [upper]])
+    return np.trapz(np.interp(x, mz, intensity), x=x)
+
+def test_cumulative_matches_direct_trapezoid():
+    mz_arrays, intensity_arrays = random_scans(seed=2)
+    spectra = build_cumulative_index(pack_spectra(mz_arrays, intensity_arrays))
+
+    #windows with edges between points, on points, and past the ends of the scans
+    rng = np.random.default_rng(3)
+    windows = np.sort(rng.uniform(30., 330., size=(20, 2)), axis=1).tolist()
+    windows += [[mz_arrays[0][10], mz_arrays[0][150]], [0., 1000.]]
+
+    integrations = integrate_cumulative(spectra, windows)
+
+    for scan, (mz, intensity) in enumerate(zip(mz_arrays, intensity_arrays)):
+        expected = [direct_trapezoid(mz, intensity, lower, upper) for lower, upper in windows]
+        np.testing.assert_allclose(integrations[scan], expected, rtol=1e-9, atol=1e-9 * np.trapz(intensity, x=mz))
+
+    #a window from the first to the last point of a scan is the whole scan
+    np.testing.assert_allclose(integrations[:, -1], [np.trapz(intensity, x=mz) for mz, intensity in zip(mz_arrays, intensity_arrays)], rtol=1e-12)
+
+def test_memory_cache_keeps_a_running_total(tmp_path, monkeypatch):
+    points_per_scan, scans = 300, 4
+    mzml_files = []
+    for i in range(4):
+        mzml_file = f'synthetic_{i}.mzML'
+        write_synthetic_mzml(str(tmp_path / mzml_file), scans=scans, points_per_scan=points_per_scan, seed=i)
+        mzml_files.append(mzml_file)
+    file_points = scans * points_per_scan
+
+    #room for two files
+    monkeypatch.setattr(workflows, 'SPECTRA_MEMORY_CACHE_MAX_POINTS', workflows.SPECTRA_MEMORY_CACHE_MAX_POINTS)
+    configure_spectra_memory_cache(max_points=2 * file_points)
+
+    for mzml_file in mzml_files:
+        get_spectra(str(tmp_path), mzml_file)
+        assert workflows._spectra_memory_cache_points == sum(len(entry[1]['mz']) for entry in workflows._spectra_memory_cache.values())
+    assert [os.path.basename(path) for path in workflows._spectra_memory_cache] == mzml_files[2:]
+    assert workflows._spectra_memory_cache_points == 2 * file_points
+
+    #a changed file replaces its old entry instead of being counted twice
+    os.utime(tmp_path / mzml_files[3], ns=(os.stat(tmp_path / mzml_files[3]).st_mtime_ns + 10**9,) * 2)
+    get_spectra(str(tmp_path), mzml_files[3])
+    assert workflows._spectra_memory_cache_points == 2 * file_points
+
+    #lowering the limit shrinks the cache straight away, but the newest file is always kept
+    configure_spectra_memory_cache(max_points=0)
+    assert [os.path.basename(path) for path in workflows._spectra_memory_cache] == mzml_files[3:]
+    assert workflows._spectra_memory_cache_points == file_points
+
+    clear_spectra_cache()
+    assert workflows._spectra_memory_cache_points == 0
@@ -0,0 +1,95 @@
+import os
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_MZML_DIRECTORY, example_mzml_files
+from Python.workflows import read_indexed_mzml, load_spectra, read_scan_start_times
+
+def read_with_pyteomics(mzml_path):
+    '''Returns the m/z and intensity arrays and the scan start times (minutes) of every spectrum in an mzml file, as read by pyteomics.'''
+    mzml = pytest.importorskip('pyteomics.mzml')
+
+    mz_arrays, intensity_arrays, scan_start_times = [], [], []
+    with mzml.read(mzml_path) as spectra:
+        for spectrum in spectra:
+            mz_arrays.append(np.asarray(spectrum['m/z array'], dtype=float))
+            intensity_arrays.append(np.asarray(spectrum['intensity array'], dtype=float))
+            scan_start_times.append(float(spectrum['scanList']['scan'][0]['scan start time']))
+
+    return mz_arrays, intensity_arrays, np.array(scan_start_times)
+
+def copy_with_edit(mzml_file, destination, edit):
+    '''Writes a copy of an example mzml file to destination with edit (bytes -> bytes) applied, and returns its path.'''
+    with open(os.path.join(EXAMPLE_MZML_DIRECTORY, mzml_file), 'rb') as opf:
+        data = opf.read()
+
+    mzml_path = os.path.join(destination, mzml_file)
+    with open(mzml_path, 'wb') as opf:
+        opf.write(edit(data))
+
+    return mzml_path
+
+def without_index(data):
+    '''Turns an indexedmzML file into a plain mzML file: the <mzML> element without the index around it.'''
+    start = data.index(b'<mzML')
+    end = data.index(b'</mzML>') + len(b'</mzML>')
+    return b'<?xml version="1.0" encoding="utf-8"?>\n' + data[start:end] + b'\n'
+
+@pytest.mark.parametrize('mzml_file', example_mzml_files())
+def test_native_reader_matches_pyteomics(mzml_file):
+    mzml_path = os.path.join(EXAMPLE_MZML_DIRECTORY, mzml_file)
+    mz_arrays, intensity_arrays, scan_start_times = read_with_pyteomics(mzml_path)
+
+    spectra = read_indexed_mzml(mzml_path)
+    assert spectra is not None
+    assert len(spectra['offsets']) - 1 == len(mz_arrays)
+
+    for scan, (mz, intensity) in enumerate(zip(mz_arrays, intensity_arrays)):
+        start, stop = spectra['offsets'][scan], spectra['offsets'][scan + 1]
+        np.testing.assert_array_equal(spectra['mz'][start:stop], mz)
+        np.testing.assert_array_equal(spectra['intensity'][start:stop], intensity)
+
+    np.testing.assert_allclose(read_scan_start_times(mzml_path), scan_start_times)
+
+def test_native_reader_layout():
+    spectra = read_indexed_mzml(os.path.join(EXAMPLE_MZML_DIRECTORY, example_mzml_files()[0]))
+
+    assert spectra['offsets'][0] == 0
+    assert spectra['offsets'][-1] == len(spectra['mz']) == len(spectra['intensity'])
+    assert len(spectra['offsets']) - 1 == 25
+    assert np.all(np.diff(spectra['offsets']) > 0)
+    assert spectra['mz'].dtype == spectra['intensity'].dtype == np.float64
+
+def test_non_indexed_file_falls_back(tmp_path):
+    mzml_file = example_mzml_files()[0]
+    mzml_path = copy_with_edit(mzml_file, tmp_path, without_index)
+
+    assert read_indexed_mzml(mzml_path) is None
+
+    #load_spectra then reads the file with pyteomics, which gives the same spectra as the native reader does for the indexed file
+    pytest.importorskip('pyteomics.mzml')
+    spectra = load_spectra(str(tmp_path), mzml_file, update_output=lambda text: None)
+    expected = read_indexed_mzml(os.path.join(EXAMPLE_MZML_DIRECTORY, mzml_file))
+    for key in ('mz', 'intensity', 'offsets'):
+        np.testing.assert_array_equal(spectra[key], expected[key])
+
+@pytest.mark.parametrize('original, replacement', [
+    (b'accession="MS:1000576"', b'accession="MS:1002313"'), #MS-Numpress positive integer compression (same length, so the offsets stay valid)
+    (b'accession="MS:1000523"', b'accession="MS:1000519"'), #32-bit integer arrays instead of 64-bit floats
+])
+def test_unsupported_encoding_falls_back(tmp_path, original, replacement):
+    mzml_path = copy_with_edit(example_mzml_files()[0], tmp_path, lambda data: data.replace(original, replacement))
+
+    assert read_indexed_mzml(mzml_path) is None
+
+def test_stale_offsets_fall_back(tmp_path):
+    #a file edited without rewriting its index: the offsets no longer point at the spectra
+    mzml_path = copy_with_edit(example_mzml_files()[0], tmp_path, lambda data: data.replace(b'<spectrumList', b'<!-- edited -->\n<spectrumList', 1))
+
+    assert read_indexed_mzml(mzml_path) is None
+
+def test_empty_file_falls_back(tmp_path):
+    mzml_path = tmp_path / 'empty.mzML'
+    mzml_path.write_bytes(b'')
+
+    assert read_indexed_mzml(str(mzml_path)) is None
@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import pytest
+
+from conftest import quiet
+from Python.peak_proposal import propose_windows, propose_windows_for_directory, summed_spectrum, windows_text
+from Python.pipeline import parse_base_peak_range, parse_fragment_ion_ranges
+
+#(m/z, height relative to the parent) of the peaks of a summed spectrum, with two fragments that share a valley and one that is too small to propose
+PARENT_MZ = 240.5
+PEAKS = [(56., 0.05), (90., 0.02), (90.4, 0.015), (115.3, 0.01), (150., 5e-4), (180.2, 0.003), (PARENT_MZ, 1.)]
+
+def multi_peak_spectrum(seed=0):
+    rng = np.random.default_rng(seed)
+    mz = np.arange(40., 260., 0.02) + 0.01
+    intensity = 1e5 * sum(height * np.exp(-0.5 * np.square((mz - peak_mz) / 0.08)) for peak_mz, height in PEAKS) + rng.uniform(0., 5., len(mz))
+    return mz, intensity
+
+def contains(window, mz):
+    return window[0] <= mz <= window[1]
+
+def test_proposes_a_window_for_every_peak():
+    base_peak_range, fragment_ion_ranges = propose_windows(*multi_peak_spectrum())
+
+    assert contains(base_peak_range, PARENT_MZ)
+    assert base_peak_range[1] - base_peak_range[0] <= 2 * 3. + 0.2
+
+    #one window for each fragment that is large enough, in order of m/z, without overlaps, and rounded to 0.1 m/z (or split halfway at a shared valley)
+    fragment_mzs = [peak_mz for peak_mz, height in PEAKS if peak_mz < PARENT_MZ and height >= 1e-3]
+    assert len(fragment_ion_ranges) == len(fragment_mzs)
+    for window, fragment_mz in zip(fragment_ion_ranges, fragment_mzs):
+        assert contains(window, fragment_mz)
+    assert all(lower < upper for lower, upper in fragment_ion_ranges)
+    assert all(previous[1] <= window[0] for previous, window in zip(fragment_ion_ranges, fragment_ion_ranges[1:]))
+    assert fragment_ion_ranges[1][1] == fragment_ion_ranges[2][0] and 90. < fragment_ion_ranges[1][1] < 90.4
+    assert all(np.round(edge * 20, 6) % 1 == 0 for window in fragment_ion_ranges + [base_peak_range] for edge in window)
+
+    #the windows hold nearly all of the signal of their peaks
+    mz, intensity = multi_peak_spectrum()
+    peak = 1e5 * 0.05 * np.exp(-0.5 * np.square((mz - 56.) / 0.08))
+    inside = (mz >= fragment_ion_ranges[0][0]) & (mz <= fragment_ion_ranges[0][1])
+    assert np.trapz(peak[inside], x=mz[inside]) > 0.99 * np.trapz(peak, x=mz)
+
+def test_parent_can_be_chosen():
+    base_peak_range, fragment_ion_ranges = propose_windows(*multi_peak_spectrum(), parent_mz=115.)
+
+    #the fragments are the peaks below the chosen parent
+    assert contains(base_peak_range, 115.3)
+    assert [[contains(window, fragment_mz) for fragment_mz in (56., 90., 90.4)].index(True) for window in fragment_ion_ranges] == [0, 1, 2]
+
+def test_no_peaks():
+    mz = np.arange(40., 260., 0.02)
+    with pytest.raises(ValueError):
+        propose_windows(mz, np.zeros(len(mz)))
+    with pytest.raises(ValueError):
+        propose_windows(mz, np.ones(len(mz))) #flat: nothing stands out of the baseline
+
+def test_window_text_is_read_back_by_the_parsers():
+    base_peak_range, fragment_ion_ranges = propose_windows(*multi_peak_spectrum())
+    base_peak_text, fragment_text = windows_text(base_peak_range, fragment_ion_ranges)
+
+    assert parse_base_peak_range(base_peak_text) == base_peak_range
+    assert parse_fragment_ion_ranges(fragment_text) == fragment_ion_ranges
+    assert windows_text([239.7, 241.2], [[54.9, 57.], [114.6, 115.6]]) == ('239.7,241.2', '(54.9,57.0),(114.6,115.6)')
+
+def test_proposes_windows_for_a_directory(synthetic_dataset):
+    directory, base_peak_range, fragment_ion_ranges, _ = synthetic_dataset
+    mzml_directory = os.path.join(directory, 'mzml_directory')
+
+    mz, intensity = summed_spectrum(mzml_directory, update_output=quiet)
+    assert np.all(np.diff(mz) > 0) and np.all(intensity >= 0)
+
+    messages = []
+    proposed_base_peak_range, proposed_fragment_ion_ranges = propose_windows_for_directory(mzml_directory, update_output=messages.append)
+
+    #every peak of the synthetic spectra is inside a proposed window (its sparse baseline gives some small windows of its own too), and no window is empty or overlaps the next
+    assert contains(proposed_base_peak_range, PARENT_MZ)
+    for lower, upper in fragment_ion_ranges:
+        assert any(contains(window, 0.5 * (lower + upper)) for window in proposed_fragment_ion_ranges)
+    assert all(lower < upper for lower, upper in proposed_fragment_ion_ranges)
+    assert all(previous[1] <= window[0] for previous, window in zip(proposed_fragment_ion_ranges, proposed_fragment_ion_ranges[1:]))
+    assert messages[-1].startswith(f'Proposed windows ({len(proposed_fragment_ion_ranges)} fragments)')
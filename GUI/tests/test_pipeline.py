@@ -0,0 +1,23 @@
+import sys
+
+from Python.pipeline import run_analysis
+
+def test_run_analysis_leaves_stdout_alone(synthetic_dataset):
+    directory, base_peak_range, fragment_ion_ranges, power_data_file = synthetic_dataset
+    stdout = sys.stdout
+
+    messages = []
+    results = run_analysis(directory, base_peak_range, fragment_ion_ranges, power_data_file, workers=2, print_raw_data=True, raw_data_format='npz', update_output=messages.append)
+
+    #every message goes to update_output, and sys.stdout (which the GUI redirects on its own thread) is never replaced
+    assert sys.stdout is stdout
+    assert results['photofragmentation_efficiency'] is not None and results['raw_data'] is not None
+    assert any('has completed' in message for message in messages)
+
+def test_run_analysis_with_default_output(synthetic_dataset, capfd):
+    directory, base_peak_range, fragment_ion_ranges, power_data_file = synthetic_dataset
+
+    results = run_analysis(directory, base_peak_range, fragment_ion_ranges, power_data_file)
+
+    assert results['photofragmentation_efficiency'] is not None
+    assert 'UVPD photofragmentation efficiency calculation has completed' in capfd.readouterr().out
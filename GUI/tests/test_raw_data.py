@@ -0,0 +1,109 @@
+import os, json
+import numpy as np
+import pytest
+
+from conftest import quiet
+from Python import workflows
+from Python.workflows import pack_spectra, interpolate_spectra, average_spectra, extract_RawData, load_spectra
+from Python.raw_data_store import RAW_DATA_STORE_VERSION, open_raw_data, metadata_path, wavelength_spectrum, mz_slice, action_spectrum
+
+COMMON_MZ_GRID = np.round(np.linspace(0., 300., 15001), 2)
+
+def random_spectra(seed=0, num_scans=23):
+    rng = np.random.default_rng(seed)
+    mz_arrays, intensity_arrays = [], []
+    for scan in range(num_scans):
+        mz = np.sort(rng.uniform(rng.uniform(40., 60.), rng.uniform(200., 320.), rng.integers(100, 1000)))
+        mz_arrays.append(mz)
+        intensity_arrays.append(rng.exponential(1e4, len(mz)))
+    return pack_spectra(mz_arrays, intensity_arrays)
+
+@pytest.mark.parametrize('block_scans', [1, 4, 7, 23, 100])
+def test_blockwise_average_matches_numpy(monkeypatch, block_scans):
+    spectra = random_spectra()
+    interpolated = interpolate_spectra(spectra, COMMON_MZ_GRID)
+
+    #blocks that don't divide the 23 scans evenly, down to one scan at a time
+    monkeypatch.setattr(workflows, 'RAW_DATA_STREAM_POINTS', block_scans * len(COMMON_MZ_GRID))
+    mean, stdev = average_spectra(spectra, COMMON_MZ_GRID, update_output=quiet)
+
+    #the interpolation of a block differs from that of all scans at once in the last few digits (each scan is shifted along the m/z axis by a different amount)
+    scale = np.max(interpolated)
+    np.testing.assert_allclose(mean, np.mean(interpolated, axis=0), rtol=1e-9, atol=1e-12 * scale)
+    np.testing.assert_allclose(stdev, np.std(interpolated, axis=0, ddof=0), rtol=1e-9, atol=1e-9 * scale)
+
+def test_average_of_one_scan_and_of_none():
+    spectra = random_spectra(num_scans=1)
+    mean, stdev = average_spectra(spectra, COMMON_MZ_GRID, update_output=quiet)
+    np.testing.assert_array_equal(mean, interpolate_spectra(spectra, COMMON_MZ_GRID)[0])
+    np.testing.assert_array_equal(stdev, 0.)
+
+    #no scans at all gives nan, as np.mean and np.std of an empty array do
+    mean, stdev = average_spectra(pack_spectra([], []), COMMON_MZ_GRID, update_output=quiet)
+    assert np.all(np.isnan(mean)) and np.all(np.isnan(stdev))
+
+def test_exported_stdev_matches_numpy(synthetic_dataset, monkeypatch):
+    directory = synthetic_dataset[0]
+    mzml_directory = os.path.join(directory, 'mzml_directory')
+    monkeypatch.setattr(workflows, 'RAW_DATA_STREAM_POINTS', 3 * int((240.5 + 50.) / 0.02 + 1)) #3 scans at a time on the 0.02 Da grid up to the parent + 50
+
+    output_file = extract_RawData(mzml_directory, 240.5, os.path.join(directory, 'Raw_data.npz'), update_output=quiet, output_format='npz', include_stdev=True)
+
+    with np.load(output_file) as raw_data:
+        common_mz_grid = raw_data['mz']
+        for mzml_file in sorted(os.listdir(mzml_directory)):
+            wavelength = mzml_file.split('-')[-1].split('.')[0]
+            interpolated = interpolate_spectra(load_spectra(mzml_directory, mzml_file, update_output=quiet), common_mz_grid)
+            scale = np.max(interpolated)
+            np.testing.assert_allclose(raw_data[f'{wavelength}nm'], np.mean(interpolated, axis=0), rtol=1e-9, atol=1e-12 * scale)
+            np.testing.assert_allclose(raw_data[f'{wavelength}nm stdev'], np.std(interpolated, axis=0), rtol=1e-9, atol=1e-9 * scale)
+
+def test_mmap_store_round_trip(synthetic_dataset):
+    directory = synthetic_dataset[0]
+    mzml_directory = os.path.join(directory, 'mzml_directory')
+    mzml_files = sorted(os.listdir(mzml_directory))
+
+    npz_file = extract_RawData(mzml_directory, 240.5, os.path.join(directory, 'Raw_data.npz'), update_output=quiet, output_format='npz', include_stdev=True)
+    npy_file = extract_RawData(mzml_directory, 240.5, os.path.join(directory, 'Raw_data.npy'), update_output=quiet, output_format='mmap', include_stdev=True)
+    store = open_raw_data(npy_file)
+
+    with np.load(npz_file) as raw_data:
+        titles = [f'{wavelength:g}nm' for wavelength in store['wavelengths']]
+        expected = np.array([raw_data[title] for title in titles])
+        expected_stdev = np.array([raw_data[f'{title} stdev'] for title in titles])
+        np.testing.assert_array_equal(store['mz'], raw_data['mz'])
+
+    assert isinstance(store['spectra'], np.memmap)
+    np.testing.assert_array_equal(store['wavelengths'], [400., 402., 404., 406., 408., 410.])
+    assert store['metadata']['mzml_files'] == mzml_files and store['metadata']['wavelength_titles'] == titles
+    np.testing.assert_array_equal(store['spectra'], expected)
+    np.testing.assert_array_equal(store['stdev'], expected_stdev)
+
+    #one wavelength (the closest one that was measured), an m/z range at every wavelength, and the action spectrum of a window
+    mz, spectrum = wavelength_spectrum(store, 403.2)
+    np.testing.assert_array_equal(spectrum, expected[2])
+    np.testing.assert_array_equal(wavelength_spectrum(store, 410., stdev=True)[1], expected_stdev[5])
+
+    mz, block = mz_slice(store, 54.25, 56.)
+    columns = (store['mz'] >= 54.25) & (store['mz'] <= 56.)
+    np.testing.assert_array_equal(mz, store['mz'][columns])
+    np.testing.assert_array_equal(block, expected[:, columns])
+    assert mz[0] == 54.26 and mz[-1] == 56.
+
+    wavelengths, intensity = action_spectrum(store, 54.25, 56.)
+    np.testing.assert_allclose(intensity, np.trapz(expected[:, columns], x=store['mz'][columns], axis=1), rtol=1e-12)
+
+def test_mmap_store_checks_its_metadata(synthetic_dataset):
+    directory = synthetic_dataset[0]
+    npy_file = extract_RawData(os.path.join(directory, 'mzml_directory'), 240.5, os.path.join(directory, 'Raw_data.npy'), update_output=quiet, output_format='mmap')
+    assert open_raw_data(metadata_path(npy_file))['stdev'] is None
+
+    with open(metadata_path(npy_file)) as opf:
+        metadata = json.load(opf)
+
+    #metadata that does not describe the matrix, or that was written by another version, is refused
+    for key, value in (('mz_points', metadata['mz_points'] - 1), ('version', RAW_DATA_STORE_VERSION + 1)):
+        with open(metadata_path(npy_file), 'w') as opf:
+            json.dump(dict(metadata, **{key: value}), opf)
+        with pytest.raises(ValueError):
+            open_raw_data(npy_file)
@@ -0,0 +1,65 @@
+import os, json, threading
+import numpy as np
+
+from conftest import write_mzml, quiet
+from Python.main import main
+from Python.results_manifest import manifest_path
+
+def run(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file, **settings):
+    '''Runs main and returns the rows of the photofragmentation efficiency table and the messages.'''
+    messages = []
+    output_file = main(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file, update_output=messages.append, **settings)
+    return np.loadtxt(output_file, delimiter=',', skiprows=1), messages
+
+def integrated_files(messages):
+    return [message for message in messages if message.startswith('Integration for') and 'has completed' in message]
+
+def test_rerun_only_integrates_changed_files(synthetic_dataset):
+    directory, base_peak_range, fragment_ion_ranges, power_data_file = synthetic_dataset
+    mzml_directory = os.path.join(directory, 'mzml_directory')
+    mzml_files = sorted(os.listdir(mzml_directory))
+
+    first_table, messages = run(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file)
+    assert len(integrated_files(messages)) == len(mzml_files)
+    with open(manifest_path(mzml_directory)) as opf:
+        assert sorted(json.load(opf)['files']) == mzml_files
+
+    #nothing has changed, so everything is loaded from the manifest
+    table, messages = run(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file)
+    assert integrated_files(messages) == []
+    assert f'{len(mzml_files)} of {len(mzml_files)} mzml files were already integrated with these windows and will be loaded from the results manifest.\n' in messages
+    np.testing.assert_array_equal(table, first_table)
+
+    #one file is acquired again: only that file is integrated, and its row is the one a run without the manifest gives
+    write_mzml(mzml_directory, mzml_files[2], scans=10, points_per_scan=400, fragment_mzs=[55., 120.], seed=99)
+    mzml_path = os.path.join(mzml_directory, mzml_files[2])
+    os.utime(mzml_path, ns=(os.stat(mzml_path).st_mtime_ns + 10**9,) * 2)
+
+    table, messages = run(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file)
+    assert len(integrated_files(messages)) == 1 and integrated_files(messages)[0].startswith('Integration for 404.0nm')
+    np.testing.assert_allclose(table, run(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file, use_manifest=False)[0], rtol=1e-12)
+    assert not np.allclose(table[2], first_table[2])
+    np.testing.assert_array_equal(np.delete(table, 2, axis=0), np.delete(first_table, 2, axis=0))
+
+    #a new window means every file is integrated again
+    fragment_ion_ranges = fragment_ion_ranges + [[100., 101.]]
+    table, messages = run(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file)
+    assert len(integrated_files(messages)) == len(mzml_files)
+    np.testing.assert_allclose(table, run(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file, use_manifest=False)[0], rtol=1e-12)
+
+def test_cancelled_run_resumes(synthetic_dataset):
+    directory, base_peak_range, fragment_ion_ranges, power_data_file = synthetic_dataset
+    mzml_directory = os.path.join(directory, 'mzml_directory')
+
+    #stop after the first two files
+    cancel_event = threading.Event()
+    def progress_callback(done, total):
+        if done == 2:
+            cancel_event.set()
+
+    output_file = main(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file, update_output=quiet, progress_callback=progress_callback, cancel_event=cancel_event)
+    assert output_file is None
+
+    table, messages = run(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file)
+    assert len(integrated_files(messages)) == len(os.listdir(mzml_directory)) - 2
+    np.testing.assert_allclose(table, run(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file, use_manifest=False)[0], rtol=1e-12)
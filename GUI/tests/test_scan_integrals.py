@@ -0,0 +1,70 @@
+import os
+import numpy as np
+
+from conftest import write_mzml, quiet
+from Python.scan_integrals import collect_scan_integrals, write_scan_integrals, load_scan_integrals
+from Python.workflows import read_scan_start_times
+from Python.pipeline import run_analysis
+
+def test_write_and_load_round_trip(tmp_path):
+    #two wavelengths with a different number of scans, one without scan start times
+    scan_data = {'mzml_files': ['a_Laser_On-400.mzML', 'a_Laser_On-402.mzML'], 'wavelengths': np.array([400., 402.]),
+                 'integrations': [np.arange(12.).reshape(4, 3), -np.arange(6.).reshape(2, 3)], 'scan_start_times': [np.array([0.1, 0.2, 0.3, 0.4]), np.full(2, np.nan)]}
+    windows = [[239., 242.], [54.5, 57.], [114.5, 116.]]
+
+    messages = []
+    output_file = write_scan_integrals(str(tmp_path / 'scan_integrals.npz'), scan_data, windows, integration_method='raw', update_output=messages.append)
+    scans = load_scan_integrals(output_file)
+
+    assert scans['integrals'].shape == (2, 4, 3)
+    np.testing.assert_array_equal(scans['integrals'][0], scan_data['integrations'][0])
+    np.testing.assert_array_equal(scans['integrals'][1, :2], scan_data['integrations'][1])
+    assert np.all(np.isnan(scans['integrals'][1, 2:])) and np.all(np.isnan(scans['scan_start_times'][1]))
+    np.testing.assert_array_equal(scans['scan_start_times'][0], scan_data['scan_start_times'][0])
+    np.testing.assert_array_equal(scans['scan_counts'], [4, 2])
+    np.testing.assert_array_equal(scans['wavelengths'], [400., 402.])
+    np.testing.assert_array_equal(scans['windows'], windows)
+    assert scans['mzml_files'].tolist() == scan_data['mzml_files']
+    assert scans['integration_method'] == 'raw'
+    assert messages == [f'The integrals of 6 scans (2 wavelengths x up to 4 scans x 3 windows) have been written to {output_file}\n\n']
+
+def test_read_scan_start_times(tmp_path):
+    mzml_path = write_mzml(tmp_path, 'synthetic.mzML', scans=7)
+
+    #the synthetic files have a scan every 0.0118 minutes
+    np.testing.assert_allclose(read_scan_start_times(mzml_path), 0.0118 * np.arange(1, 8), rtol=1e-12)
+
+    #times in seconds are converted to minutes
+    with open(mzml_path, 'rb') as opf:
+        data = opf.read()
+    with open(mzml_path, 'wb') as opf:
+        opf.write(data.replace(b'unitName="minute"', b'unitName="second"'))
+    np.testing.assert_allclose(read_scan_start_times(mzml_path), 0.0118 * np.arange(1, 8) / 60., rtol=1e-12)
+
+    (tmp_path / 'empty.mzML').write_bytes(b'')
+    assert len(read_scan_start_times(str(tmp_path / 'empty.mzML'))) == 0
+
+def test_analysis_keeps_the_scans_of_its_one_pass(synthetic_dataset):
+    directory, base_peak_range, fragment_ion_ranges, power_data_file = synthetic_dataset
+    mzml_directory = os.path.join(directory, 'mzml_directory')
+    windows = [base_peak_range] + fragment_ion_ranges
+
+    messages = []
+    results = run_analysis(directory, base_peak_range, fragment_ion_ranges, power_data_file, export_scan_integrals=True, bootstrap_resamples=50, workers=2, update_output=messages.append)
+    assert results['bootstrap'] is not None
+
+    #each file is integrated once, and the scans kept are the ones an integration of the scans on their own gives
+    assert sum(message.startswith('Integration for') and 'has completed' in message for message in messages) == len(os.listdir(mzml_directory))
+    expected = collect_scan_integrals(mzml_directory, windows, 240.5, update_output=quiet)
+    scans = load_scan_integrals(results['scan_integrals'])
+    np.testing.assert_allclose(scans['integrals'], np.array(expected['integrations']), rtol=1e-12)
+    np.testing.assert_array_equal(scans['scan_start_times'], np.array(expected['scan_start_times']))
+    np.testing.assert_array_equal(scans['wavelengths'], expected['wavelengths'])
+
+    #a rerun loads the integrals of every scan from the results manifest, without integrating anything
+    messages = []
+    results = run_analysis(directory, base_peak_range, fragment_ion_ranges, power_data_file, export_scan_integrals=True, update_output=messages.append)
+    assert not any(message.startswith('Integration for') and 'has completed' in message for message in messages)
+    reloaded = load_scan_integrals(results['scan_integrals'])
+    np.testing.assert_array_equal(reloaded['integrals'], scans['integrals'])
+    np.testing.assert_array_equal(reloaded['scan_start_times'], scans['scan_start_times'])
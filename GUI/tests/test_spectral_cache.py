@@ -0,0 +1,72 @@
+import os
+import numpy as np
+
+from conftest import write_mzml, quiet
+from Python import spectral_cache
+from Python.spectral_cache import read_cached_spectra, configure_spectral_cache, spectral_cache_entries, cache_key
+from Python.workflows import load_spectra, read_indexed_mzml
+from Python.instrumentation import reset_stats, get_stats
+
+def assert_same_spectra(spectra, expected):
+    for key in ('mz', 'intensity', 'offsets'):
+        np.testing.assert_array_equal(spectra[key], expected[key])
+
+def test_second_read_comes_from_the_cache(tmp_path):
+    mzml_path = write_mzml(tmp_path, 'synthetic.mzML')
+    assert read_cached_spectra(mzml_path) is None
+
+    reset_stats()
+    first = load_spectra(str(tmp_path), 'synthetic.mzML', update_output=quiet)
+    second = load_spectra(str(tmp_path), 'synthetic.mzML', update_output=quiet)
+
+    assert get_stats()['counters']['files_decoded'] == 1
+    assert get_stats()['counters']['files_from_cache'] == 1
+    assert isinstance(second['mz'], np.memmap)
+    assert_same_spectra(second, first)
+
+def test_changed_file_is_not_read_from_the_cache(tmp_path):
+    mzml_path = write_mzml(tmp_path, 'synthetic.mzML', seed=1)
+    old_spectra = read_indexed_mzml(mzml_path)
+    load_spectra(str(tmp_path), 'synthetic.mzML', update_output=quiet)
+    old_key = cache_key(mzml_path)
+
+    #the file is written again with other spectra (e.g. converted again), with the same name and size
+    write_mzml(tmp_path, 'synthetic.mzML', seed=2)
+    os.utime(mzml_path, ns=(os.stat(mzml_path).st_mtime_ns + 10**9,) * 2)
+    assert cache_key(mzml_path) != old_key
+    assert read_cached_spectra(mzml_path) is None
+
+    spectra = load_spectra(str(tmp_path), 'synthetic.mzML', update_output=quiet)
+    assert_same_spectra(spectra, read_indexed_mzml(mzml_path))
+    assert not np.array_equal(spectra['intensity'], old_spectra['intensity'])
+
+    #and the new spectra are what is cached from then on
+    assert_same_spectra(read_cached_spectra(mzml_path), spectra)
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(spectral_cache, 'SPECTRAL_CACHE_MAX_BYTES', spectral_cache.SPECTRAL_CACHE_MAX_BYTES)
+    mzml_files = [f'synthetic_{i}.mzML' for i in range(4)]
+    for i, mzml_file in enumerate(mzml_files):
+        write_mzml(tmp_path, mzml_file, seed=i)
+
+    def load(i):
+        #entries are ordered by when they were last used, so give each one a clearly later time than the one before
+        load_spectra(str(tmp_path), mzml_files[i], update_output=quiet)
+        entry_directory = os.path.join(spectral_cache.SPECTRAL_CACHE_DIRECTORY, cache_key(os.path.join(tmp_path, mzml_files[i])))
+        os.utime(entry_directory, (1e9 + i, 1e9 + i))
+
+    load(0)
+    entry_bytes = spectral_cache_entries()[0][1]
+
+    #room for two entries: each new file pushes out the one that was used longest ago
+    configure_spectral_cache(max_bytes=2 * entry_bytes)
+    for i in range(1, len(mzml_files)):
+        load(i)
+
+    cached = [mzml_file for mzml_file in mzml_files if read_cached_spectra(os.path.join(tmp_path, mzml_file)) is not None]
+    assert cached == mzml_files[2:]
+    assert sum(size for _, size, _ in spectral_cache_entries()) <= 2 * entry_bytes
+
+    #a limit of 0 turns the cache off
+    configure_spectral_cache(max_bytes=0)
+    assert read_cached_spectra(os.path.join(tmp_path, mzml_files[3])) is None
@@ -0,0 +1,116 @@
+import os, shutil, threading, time
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_MZML_DIRECTORY, EXAMPLE_BASE_PEAK_RANGE, EXAMPLE_FRAGMENT_ION_RANGES, example_mzml_files, quiet
+from Python.watch import watch_directory, LIVE_TABLE_NAME
+
+POLL_INTERVAL = 0.05
+TIMEOUT = 60. #seconds before a test gives up on the watch and stops it
+
+class WatchThread(threading.Thread):
+    '''Runs watch_directory on directory in the background, with a cancel_event that stops it.'''
+    def __init__(self, directory, **settings):
+        super().__init__(daemon=True)
+        self.cancel_event = threading.Event()
+        self.directory = directory
+        self.settings = settings
+        self.results = None
+
+    def run(self):
+        self.results = watch_directory(str(self.directory), EXAMPLE_BASE_PEAK_RANGE, EXAMPLE_FRAGMENT_ION_RANGES, poll_interval=POLL_INTERVAL, update_output=quiet,
+                                       cancel_event=self.cancel_event, **self.settings)
+
+    def finish(self, timeout=TIMEOUT):
+        '''Waits for the watch to stop by itself, and returns its results. Fails the test (after stopping the watch) if it is still running after timeout seconds.'''
+        self.join(timeout)
+        if self.is_alive():
+            self.cancel_event.set()
+            self.join(TIMEOUT)
+            pytest.fail(f'The watch did not stop within {timeout} seconds')
+        return self.results
+
+def drop_file(mzml_file, mzml_directory, in_two_parts=False):
+    '''Copies an example mzml file into mzml_directory, optionally writing it in two parts as an acquisition would.'''
+    destination = os.path.join(mzml_directory, mzml_file)
+    if not in_two_parts:
+        shutil.copyfile(os.path.join(EXAMPLE_MZML_DIRECTORY, mzml_file), destination)
+        return
+
+    with open(os.path.join(EXAMPLE_MZML_DIRECTORY, mzml_file), 'rb') as opf:
+        data = opf.read()
+    with open(destination, 'wb') as opf:
+        opf.write(data[:len(data) // 2])
+        opf.flush()
+        time.sleep(5 * POLL_INTERVAL)
+        opf.write(data[len(data) // 2:])
+
+def live_table_rows(directory):
+    '''Returns the rows of the live table (an empty array before it has been written).'''
+    live_table = os.path.join(directory, LIVE_TABLE_NAME)
+    if not os.path.exists(live_table):
+        return np.empty((0, 0))
+    return np.atleast_2d(np.loadtxt(live_table, delimiter=',', skiprows=1))
+
+def wait_for(condition, timeout=TIMEOUT):
+    start_time = time.time()
+    while not condition():
+        if time.time() - start_time > timeout:
+            pytest.fail(f'Timed out after {timeout} seconds')
+        time.sleep(POLL_INTERVAL)
+
+def test_watch_integrates_files_as_they_arrive(tmp_path):
+    mzml_directory = tmp_path / 'mzml_directory'
+    mzml_files = example_mzml_files()[:3]
+
+    watch = WatchThread(tmp_path, expected_files=len(mzml_files))
+    watch.start()
+
+    for i, mzml_file in enumerate(mzml_files):
+        wait_for(lambda: mzml_directory.is_dir())
+        drop_file(mzml_file, mzml_directory, in_two_parts=i == 1)
+        wait_for(lambda: len(live_table_rows(tmp_path)) == i + 1)
+
+    results = watch.finish()
+
+    assert results['integrated'] == len(mzml_files)
+    assert results['failed'] == []
+    np.testing.assert_array_equal(live_table_rows(tmp_path)[:, 0], [400., 402., 404.])
+
+    #the final analysis loads the same integrations from the results manifest
+    final_table = np.loadtxt(results['results']['photofragmentation_efficiency'], delimiter=',', skiprows=1)
+    np.testing.assert_allclose(final_table, live_table_rows(tmp_path))
+
+def test_watch_stops_on_cancel(tmp_path):
+    watch = WatchThread(tmp_path)
+    watch.start()
+
+    mzml_directory = tmp_path / 'mzml_directory'
+    wait_for(lambda: mzml_directory.is_dir())
+    for mzml_file in example_mzml_files()[:2]:
+        drop_file(mzml_file, mzml_directory)
+    wait_for(lambda: len(live_table_rows(tmp_path)) == 2)
+
+    watch.cancel_event.set()
+    results = watch.finish()
+
+    assert results['integrated'] == 2
+    assert results['results'] is None
+
+def test_watch_counts_failed_files(tmp_path):
+    mzml_directory = tmp_path / 'mzml_directory'
+    mzml_directory.mkdir()
+
+    #a complete (closed) file that can't be read, and a file without a wavelength in its name
+    (mzml_directory / 'broken_Laser_On-406.mzML').write_bytes(b'<?xml version="1.0" encoding="utf-8"?>\n<mzML>not a spectrum</mzML>\n')
+    shutil.copyfile(os.path.join(EXAMPLE_MZML_DIRECTORY, example_mzml_files()[1]), mzml_directory / 'no_wavelength.mzML')
+
+    watch = WatchThread(tmp_path, expected_files=3)
+    watch.start()
+    drop_file(example_mzml_files()[0], mzml_directory)
+    results = watch.finish()
+
+    assert results['integrated'] == 1
+    assert results['failed'] == ['broken_Laser_On-406.mzML', 'no_wavelength.mzML']
+    assert results['results'] is None
+    assert len(live_table_rows(tmp_path)) == 1
@@ -0,0 +1,40 @@
+import os
+import numpy as np
+
+from conftest import quiet
+from Python.window_tuning import load_tuning_data, window_integrals, window_tuning_table
+from Python.workflows import integrate_windows
+from Python.main import main
+
+def test_window_integrals_match_raw_integration(synthetic_dataset):
+    directory, base_peak_range, fragment_ion_ranges, power_data_file = synthetic_dataset
+    mzml_directory = os.path.join(directory, 'mzml_directory')
+    tuning_data = load_tuning_data(mzml_directory, power_data_file, update_output=quiet)
+
+    windows = [base_peak_range] + fragment_ion_ranges + [[100.03, 100.07], [300., 310.]]
+    peaks = window_integrals(tuning_data, windows)
+
+    assert tuning_data['mzml_files'] == sorted(os.listdir(mzml_directory))
+    np.testing.assert_array_equal(tuning_data['scan_counts'], 10)
+    for i, mzml_file in enumerate(tuning_data['mzml_files']):
+        expected = np.array(integrate_windows(mzml_directory, mzml_file, windows, 240.5, update_output=quiet, integration_method='raw'))
+        np.testing.assert_allclose(peaks[i], expected, rtol=1e-9, atol=1e-9 * np.max(expected))
+
+def test_tuning_table_matches_a_raw_run(synthetic_dataset):
+    directory, base_peak_range, fragment_ion_ranges, power_data_file = synthetic_dataset
+    mzml_directory = os.path.join(directory, 'mzml_directory')
+    tuning_data = load_tuning_data(mzml_directory, power_data_file, update_output=quiet)
+
+    #a window moved while tuning gives the table a full run with the same windows writes
+    fragment_ion_ranges = [[fragment_ion_ranges[0][0] + 0.2, fragment_ion_ranges[0][1] - 0.1]] + fragment_ion_ranges[1:]
+    PE_data, column_names, messages = window_tuning_table(tuning_data, base_peak_range, fragment_ion_ranges)
+
+    output_file = main(mzml_directory, base_peak_range, fragment_ion_ranges, power_data_file, update_output=quiet, integration_method='raw', use_manifest=False)
+    with open(output_file) as opf:
+        assert opf.readline().strip().split(',') == column_names
+    np.testing.assert_allclose(PE_data, np.loadtxt(output_file, delimiter=',', skiprows=1), rtol=1e-5, atol=1e-6)
+    assert messages == []
+
+    #a window without any signal can't be calculated; it is reported rather than printed
+    PE_data, column_names, messages = window_tuning_table(tuning_data, [300., 301.], fragment_ion_ranges)
+    assert np.all(np.isnan(PE_data[:, 1:])) and len(messages) == len(tuning_data['mzml_files'])